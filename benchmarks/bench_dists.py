@@ -0,0 +1,63 @@
+"""Benchmark of scanning the installed distributions of a large generated
+site-packages directory.
+
+Usage: python -m benchmarks.bench_dists [--dists N] [--files N]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import unittest.mock
+
+from pigar.dist import installed_distributions
+
+
+def _generate_site_packages(root, dists, files):
+    for i in range(dists):
+        name = f"dist{i}"
+        dist_info = os.path.join(root, f"{name}-1.0.dist-info")
+        os.makedirs(dist_info)
+        os.makedirs(os.path.join(root, name))
+        records = [f"{name}/module{j}.py,sha256=x,1" for j in range(files)]
+        records.append(f"{name}-1.0.dist-info/RECORD,,")
+        with open(os.path.join(dist_info, "METADATA"), "w") as f:
+            f.write(f"Metadata-Version: 2.1\nName: {name}\nVersion: 1.0\n")
+        with open(os.path.join(dist_info, "top_level.txt"), "w") as f:
+            f.write(f"{name}\n")
+        with open(os.path.join(dist_info, "RECORD"), "w") as f:
+            f.write("\n".join(records) + "\n")
+
+
+def _timeit(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dists", type=int, default=1500)
+    parser.add_argument("--files", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        site = os.path.join(root, "site-packages")
+        cache_dir = os.path.join(root, "cache")
+        _generate_site_packages(site, args.dists, args.files)
+        with unittest.mock.patch.object(sys, "path", [site]):
+            dists, cold = _timeit(installed_distributions)
+            _, code_paths = _timeit(
+                lambda: [req.code_paths for req in dists.values()]
+            )
+            installed_distributions(cache_dir=cache_dir)
+            _, warm = _timeit(lambda: installed_distributions(cache_dir=cache_dir))
+
+    print(f"site-packages: {args.dists} distributions, {args.files} files each")
+    print(f"cold scan:            {cold * 1000:8.2f}ms")
+    print(f"all code paths:       {code_paths * 1000:8.2f}ms")
+    print(f"warm scan with cache: {warm * 1000:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
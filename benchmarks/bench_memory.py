@@ -0,0 +1,102 @@
+"""Peak RSS of collecting the imports and locations of a large generated tree.
+
+Usage: python -m benchmarks.bench_memory [--files N] [--imports N] [--names N]
+
+Each mode runs in a fresh process, so the peak RSS is not shared.
+"""
+import os
+import sys
+import time
+import resource
+import argparse
+import tempfile
+import subprocess
+import collections
+
+from pigar.core import _Locations
+from pigar.parser import ModuleList, iter_imports
+
+
+class _ListLocations(dict):
+    """The previous implementation, a list of line numbers per file."""
+
+    def add(self, file, lineno):
+        if file in self and lineno not in self[file]:
+            self[file].append(lineno)
+        else:
+            self[file] = [lineno]
+
+
+def _generate_tree(root, files, imports, names):
+    for i in range(files):
+        pkg = os.path.join(root, f"pkg{i % 100}")
+        os.makedirs(pkg, exist_ok=True)
+        with open(os.path.join(pkg, f"module{i}.py"), "w") as f:
+            for j in range(imports):
+                f.write(f"import name{(i + j) % names}.sub{j % 7}\n")
+
+
+def _collect(root, mode):
+    if mode == "list":
+        modules, locations_cls = [], _ListLocations
+    else:
+        modules, locations_cls = ModuleList(), _Locations
+    locations = collections.defaultdict(locations_cls)
+    for file_imports in iter_imports(root):
+        for module in file_imports.modules:
+            modules.append(module)
+            locations[module.name.split(".")[0]].add(module.file, module.lineno)
+    return modules, locations
+
+
+def _peak_rss_mib():
+    # Kilobytes on Linux, bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _run(root, mode):
+    start = time.perf_counter()
+    if mode != "none":
+        modules, _ = _collect(root, mode)
+        count = len(modules)
+    else:
+        count = 0
+    elapsed = time.perf_counter() - start
+    print(f"{mode} {count} {elapsed:.3f} {_peak_rss_mib():.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--imports", type=int, default=2000)
+    parser.add_argument("--names", type=int, default=100)
+    parser.add_argument("--run", nargs=2, metavar=("ROOT", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        _run(*args.run)
+        return
+
+    with tempfile.TemporaryDirectory() as root:
+        _generate_tree(root, args.files, args.imports, args.names)
+        results = {}
+        for mode in ("none", "list", "compact"):
+            output = subprocess.check_output(
+                [sys.executable, "-m", "benchmarks.bench_memory", "--run", root, mode],
+                text=True,
+            )
+            _, count, elapsed, rss = output.split()
+            results[mode] = (int(count), float(elapsed), float(rss))
+
+    base = results["none"][2]
+    print(f"tree: {args.files} files, {args.files * args.imports} imports")
+    for mode in ("list", "compact"):
+        count, elapsed, rss = results[mode]
+        print(
+            f"{mode:8} {count} modules in {elapsed:.2f}s, "
+            f"peak RSS {rss:.1f}MiB (+{rss - base:.1f}MiB over imports only)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Microbenchmark of reading code cells from a notebook with large outputs.
+
+Usage: python -m benchmarks.bench_notebook [--cells N] [--repeat N]
+"""
+import os
+import sys
+import time
+import base64
+import argparse
+
+import nbformat
+
+from pigar.notebook import read_code_cells
+
+
+def _generate_notebook(cells):
+    image = base64.b64encode(os.urandom(256 * 1024)).decode("ascii")
+    nb = nbformat.v4.new_notebook()
+    for i in range(cells):
+        cell = nbformat.v4.new_code_cell(
+            f'import mod{i}\nprint("{{[\\"{i}\\"]}}")\n%matplotlib inline\n'
+        )
+        cell.outputs = [
+            nbformat.v4.new_output(
+                "display_data", data={"image/png": image, "text/plain": "[{"}
+            )
+        ]
+        nb.cells.append(cell)
+        nb.cells.append(nbformat.v4.new_markdown_cell(f"# Section {i}"))
+    return nbformat.writes(nb).encode("utf-8")
+
+
+def _read_with_nbformat(raw):
+    nb = nbformat.reads(raw.decode("utf-8"), as_version=4)
+    return [cell.source for cell in nb.cells if cell.cell_type == "code"]
+
+
+def _bench(func, raw, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(raw)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cells", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    raw = _generate_notebook(args.cells)
+    if read_code_cells(raw) != _read_with_nbformat(raw):
+        sys.exit("different code cells")
+
+    size = len(raw) / 1024 / 1024
+    old = _bench(_read_with_nbformat, raw, args.repeat)
+    new = _bench(read_code_cells, raw, args.repeat)
+    print(f"notebook: {args.cells} code cells, {size:.1f}MiB")
+    print(f"nbformat:        {old * 1000:8.2f}ms")
+    print(f"read_code_cells: {new * 1000:8.2f}ms ({old / new:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
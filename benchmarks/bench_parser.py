@@ -0,0 +1,92 @@
+"""Microbenchmark of ImportsParser on a large generated file.
+
+Usage: python -m benchmarks.bench_parser [--repeat N]
+"""
+import ast
+import sys
+import time
+import argparse
+
+from pigar.parser import ImportsParser
+
+_TEMPLATE = '''
+import os{i}
+from pkg{i}.sub import name{i}
+
+
+class Class{i}(object):
+    """Class{i} docstring.
+
+    >>> import doctest_mod{i}
+    """
+
+    def method(self, a, b=({i}, [{i}, {{"k": {i}}}])):
+        """Method docstring."""
+        try:
+            import optional{i}
+        except ImportError:
+            optional{i} = None
+        result = [x * y + {i} for x in range(a) for y in range(b) if x % 3]
+        return {{k: (v, lambda z: z + k) for k, v in enumerate(result)}}
+
+
+def func{i}(data):
+    for item in data:
+        if item and item.value > {i} or not item.flag:
+            print(item.name, item.value * 2, str(item), sep=", ")
+        else:
+            exec("import dynamic{i}")
+    return sum(d.value for d in data if d is not None) / ({i} + 1)
+
+
+CONSTANTS{i} = {{"a": [1, 2, 3], "b": (4, 5, 6), "c": {{"d": "e" * {i}}}}}
+'''
+
+
+class _WalkImportsParser(ImportsParser):
+    """The previous implementation, visits every node by ast.walk."""
+
+    def visit(self, node):
+        for node in ast.walk(node):
+            method = "visit_" + node.__class__.__name__
+            getattr(self, method, lambda x: x)(node)
+
+
+def _generate_code(blocks):
+    return "".join(_TEMPLATE.format(i=i) for i in range(blocks)).encode("utf-8")
+
+
+def _bench(parser_cls, tree, repeat):
+    best = float("inf")
+    modules = None
+    for _ in range(repeat):
+        parser = parser_cls(lambda code, lineno: None, doc_str_enabled=True)
+        parser._fpath, parser._lineno = "bench.py", 0
+        start = time.perf_counter()
+        parser.visit(tree)
+        best = min(best, time.perf_counter() - start)
+        modules = parser.modules
+    return best, modules
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--blocks", type=int, default=2000)
+    argparser.add_argument("--repeat", type=int, default=5)
+    args = argparser.parse_args()
+
+    code = _generate_code(args.blocks)
+    tree = ast.parse(code)
+    lines = code.count(b"\n")
+    nodes = sum(1 for _ in ast.walk(tree))
+    print(f"Python {sys.version.split()[0]}, {lines} lines, {nodes} nodes")
+    walk_time, walk_modules = _bench(_WalkImportsParser, tree, args.repeat)
+    targeted_time, targeted_modules = _bench(ImportsParser, tree, args.repeat)
+    assert walk_modules == targeted_modules, "results differ"
+    print(f"ast.walk:  {walk_time * 1000:8.2f} ms")
+    print(f"targeted:  {targeted_time * 1000:8.2f} ms")
+    print(f"speedup:   {walk_time / targeted_time:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,25 +4,34 @@ import sys
 import io
 import json
 import codecs
+import re
 import glob
+import difflib
 import asyncio
 import multiprocessing
 
 from .version import version
 from .log import enable_pretty_logging, logger
 from .helpers import Color, print_table, lines_diff
-from .parser import DEFAULT_GLOB_EXCLUDE_PATTERNS
+from .parser import DEFAULT_GLOB_EXCLUDE_PATTERNS, list_project_files
+from .stdlib import TARGET_PYTHON_VERSIONS, parse_python_version
 from .core import (
     RequirementsAnalyzer,
     check_requirements_latest_versions,
     search_distributions_by_top_level_import_names,
     sync_distributions_index_from_pypi,
 )
-from .dist import DEFAULT_PYPI_INDEX_URL
+from .dist import (
+    DEFAULT_PYPI_INDEX_URL, canonicalize_name, installed_distributions
+)
+from .envsnapshot import EnvSnapshotError, dump_env_snapshot, load_env_snapshot
+from .targetenv import find_python_environment, site_packages_paths
 from ._vendor.pip._vendor.packaging.specifiers import Specifier
 
 import click
 
+_REQUIREMENT_NAME_regex = re.compile(r'[A-Za-z0-9][A-Za-z0-9._-]*')
+
 
 # Ref: https://click.palletsprojects.com/en/5.x/advanced/
 class AliasedGroup(click.Group):
@@ -60,6 +69,28 @@ def _click_prompt_choose_multiple_or_all(choices):
     return _value_proc
 
 
+def _target_environment(site_packages, python):
+    """Returns the paths to scan the installed distributions and the
+    Python version of the target environment, the paths are None if
+    the target environment is the running one."""
+    paths = []
+    python_version = None
+    if python is not None:
+        target = find_python_environment(python)
+        paths.extend(target.paths)
+        if target.python_version is not None:
+            python_version = '{0}.{1}'.format(*target.python_version)
+    if site_packages:
+        paths.extend(
+            p for p in site_packages_paths(list(site_packages))
+            if p not in paths
+        )
+    if python is None and not site_packages:
+        return None, None
+    logger.debug('scan installed distributions in: %s', paths)
+    return paths, python_version
+
+
 @click.group(
     cls=AliasedGroup,
     context_settings=dict(
@@ -147,7 +178,7 @@ def gohome():
     multiple=True,
     type=str,
     help=
-    'Exclude files and directories for searching that match the given glob.',
+    'Exclude files and directories for searching that match the given glob, the glob is relative to the project path, `**` matches any number of directories, and the glob without `/` matches names at any level.',
 )
 @click.option(
     '--follow-symbolic-links/--dont-follow-symbolic-links',
@@ -156,6 +187,82 @@ def gohome():
     show_default=True,
     help='Whether to follow all symbolic links to the final target.',
 )
+@click.option(
+    '--use-ignore-files/--dont-use-ignore-files',
+    'use_ignore_files',
+    default=True,
+    show_default=True,
+    help=
+    'Whether to skip the files ignored by `.gitignore` or `.pigarignore` files in the project, and the `.gitignore` files in its parent directories within the same git repository.',
+)
+@click.option(
+    '--files-from-git',
+    'files_from_git',
+    default=False,
+    is_flag=True,
+    help=
+    'Analyze the files tracked by git (read from the git index) instead of walking the project directory, the `.pigarignore` files still apply, it falls back to walking if the project is not in a git work tree.',
+)
+@click.option(
+    '-j',
+    '--jobs',
+    'jobs',
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=0),
+    help=
+    'The number of workers to parse files in parallel, 0 means the number of CPUs. Workers are processes, or threads on free-threaded Python builds.',
+)
+@click.option(
+    '--cache-dir',
+    'cache_dir',
+    default=None,
+    envvar='PIGAR_CACHE_DIR',
+    type=click.Path(file_okay=False),
+    help=
+    'The directory to cache the analysis results of unchanged files and the installed distributions across runs, the whole result is reused if nothing changed and no question was asked, the cache is disabled if not given.',
+)
+@click.option(
+    '--since',
+    'since',
+    default=None,
+    metavar='GIT_REF',
+    help=
+    'Only parse the files changed since the git ref, the imports of the other files are loaded from the manifest saved by a previous run with this option at the ref, all files are analyzed if there is no such manifest. It requires --cache-dir.',
+)
+@click.option(
+    '--site-packages',
+    'site_packages',
+    default=[],
+    multiple=True,
+    type=click.Path(file_okay=False, exists=True),
+    help=
+    'Scan the installed distributions in the given site-packages directory instead of the running environment, the directories listed in its .pth files are included. This option can be used multiple times.',
+)
+@click.option(
+    '--python',
+    'python',
+    default=None,
+    type=click.Path(dir_okay=False, exists=True),
+    help=
+    'Scan the installed distributions of the given Python interpreter (e.g. venv/bin/python) instead of the running environment, the site-packages directories are found from the layout of its installation without running it.',
+)
+@click.option(
+    '--env-snapshot',
+    'env_snapshot',
+    default=None,
+    type=click.Path(dir_okay=False, exists=True),
+    help=
+    'Load the installed distributions from the snapshot written by `pigar env export` instead of scanning the running environment.',
+)
+@click.option(
+    '--target-python',
+    'target_python',
+    default=None,
+    type=click.Choice(TARGET_PYTHON_VERSIONS),
+    help=
+    'The Python version(e.g. 3.12) to determine the stdlib modules for, it is the running Python version by default.',
+)
 @click.option(
     '--dry-run',
     'dry_run',
@@ -164,6 +271,14 @@ def gohome():
     help=
     'Don\'t actually write a requirements file, just print the file content.',
 )
+@click.option(
+    '--check',
+    'check',
+    default=False,
+    is_flag=True,
+    help=
+    'Don\'t write the requirements file, exit with a non-zero status and show the difference if it is not up to date, e.g. in a pre-commit hook. Nothing is asked, the distributions in the file are selected for the same module, the analysis stops as soon as a missing requirement is found.',
+)
 @click.option(
     '-i',
     '--index-url',
@@ -216,15 +331,65 @@ def gohome():
 def generate(
     requirement_file, with_referenced_comments, comparison_specifier,
     show_differences, visit_doc_string, exclude_glob, follow_symbolic_links,
-    dry_run, index_url, include_prereleases, question_answer, auto_select,
-    experimental_features, project_path
+    use_ignore_files, files_from_git, jobs, cache_dir, since, site_packages,
+    python, env_snapshot, target_python, dry_run, check, index_url,
+    include_prereleases, question_answer, auto_select, experimental_features,
+    project_path
 ):
     '''Generate requirements.txt for the given Python project.'''
     requirement_file = os.path.abspath(requirement_file)
     project_path = os.path.abspath(project_path)
 
+    # The result is not cached if any question is asked.
+    asked = False
+
+    def _read_requirement_file(path):
+        if not os.path.isfile(path):
+            return None
+        with codecs.open(path, 'rb', 'utf-8') as f:
+            return f.readlines()
+
+    old_requirement_file_content = None
+    # The names of the distributions in the requirements file to check.
+    selected_dists = None
+    stop_early = None
+    missing = []
+    if check:
+        old_requirement_file_content = _read_requirement_file(
+            requirement_file
+        )
+        if old_requirement_file_content is None:
+            print(Color.RED(f'{requirement_file} does not exist.'))
+            sys.exit(1)
+        if question_answer == 'ask':
+            question_answer = 'no'
+        old_lines = set(line.strip() for line in old_requirement_file_content)
+        selected_dists = set()
+        for line in old_lines:
+            match = _REQUIREMENT_NAME_regex.match(line)
+            if match is not None:
+                selected_dists.add(canonicalize_name(match.group(0)))
+
+        def stop_early(req):
+            # The editable requirements are probed only when they are written.
+            if req.editable:
+                return False
+            line = req.as_requirement(operator=comparison_specifier)
+            if line in old_lines:
+                return False
+            missing.append(line)
+            return True
+
     def _dists_filter(import_name, locations, distributions, best_match):
-        if auto_select:
+        nonlocal asked
+        if selected_dists is not None:
+            selected = [
+                dist for dist in distributions
+                if canonicalize_name(dist.name) in selected_dists
+            ]
+            if selected:
+                return selected
+        if auto_select or selected_dists is not None:
             if best_match:
                 return [best_match]
             return distributions
@@ -240,6 +405,7 @@ def generate(
             msg += f'(the best match may be '
             msg += Color.YELLOW(f'"{best_match.name}"')
             msg += ')'
+        asked = True
         choosed = click.prompt(
             msg,
             type=click.Choice(dist_names),
@@ -248,8 +414,34 @@ def generate(
         )
         return [dists_mapping[i] for i in choosed]
 
-    analyzer = RequirementsAnalyzer(project_path)
-    analyzer.analyze_requirements(
+    if since is not None and cache_dir is None:
+        raise click.BadParameter('requires --cache-dir', param_hint='--since')
+    installed_dists = None
+    if env_snapshot is not None and (site_packages or python):
+        raise click.BadParameter(
+            'can not be used with --site-packages or --python',
+            param_hint='--env-snapshot'
+        )
+    paths, python_version = _target_environment(site_packages, python)
+    if paths is not None:
+        installed_dists = installed_distributions(
+            cache_dir=cache_dir, paths=paths
+        )
+        # The stdlib modules of the target Python by default.
+        if target_python is None and python_version in TARGET_PYTHON_VERSIONS:
+            target_python = python_version
+    if env_snapshot is not None:
+        try:
+            with open(env_snapshot, 'r', encoding='utf-8') as f:
+                installed_dists = load_env_snapshot(f)
+        except EnvSnapshotError as e:
+            raise click.BadParameter(
+                f'{env_snapshot}: {e}', param_hint='--env-snapshot'
+            )
+    analyzer = RequirementsAnalyzer(
+        project_path, cache_dir=cache_dir, installed_dists=installed_dists
+    )
+    analyze_options = dict(
         visit_doc_str=visit_doc_string,
         ignores=exclude_glob,
         dists_filter=_dists_filter,
@@ -257,7 +449,63 @@ def generate(
         enable_requirement_annotations=(
             'requirement-annotations' in experimental_features
         ),
+        use_ignore_files=use_ignore_files,
+        files_from_git=files_from_git,
+        jobs=jobs,
+        cache_dir=cache_dir,
+        target_python_version=(
+            parse_python_version(target_python) if target_python else None
+        ),
+        since=since,
+        stop_early=stop_early,
     )
+    cached = False
+    # Listing all files for the result cache defeats --since.
+    if cache_dir is not None and since is None:
+        analyze_options['project_files'] = list_project_files(
+            project_path,
+            exclude_patterns=exclude_glob,
+            followlinks=follow_symbolic_links,
+            use_ignore_files=use_ignore_files,
+            files_from_git=files_from_git,
+        )
+        # All the options which may change the result.
+        cached = analyzer.load_cached_result(
+            analyze_options['project_files'],
+            visit_doc_string,
+            tuple(exclude_glob),
+            follow_symbolic_links,
+            use_ignore_files,
+            files_from_git,
+            tuple(sorted(experimental_features)),
+            target_python,
+            auto_select,
+            question_answer,
+            index_url,
+            include_prereleases,
+            tuple(sorted(selected_dists)) if check else None,
+        )
+    completed = True
+    if cached:
+        logger.info('nothing changed, the cached result is used')
+    elif question_answer == 'yes':
+        # No need to ask, the unknown imports are searched on PyPI while
+        # the files are being parsed.
+        completed = asyncio.run(
+            analyzer.analyze_requirements_async(
+                search_index=True,
+                pypi_index_url=index_url,
+                include_prereleases=include_prereleases,
+                **analyze_options,
+            )
+        )
+    else:
+        completed = analyzer.analyze_requirements(**analyze_options)
+    if check and not completed:
+        # The requirements file is certainly not up to date.
+        print(Color.RED(f'{requirement_file} is not up to date:'))
+        print('\n'.join(f'+{line}' for line in missing))
+        sys.exit(1)
     if analyzer.has_unknown_imports_or_uninstalled_annotations():
         msgbuf = io.StringIO()
         yes = False
@@ -275,17 +523,19 @@ def generate(
                     )
                 )
             )
+            asked = True
             yes = click.confirm(msgbuf.getvalue(), default=False)
             # msgbuf.close()
         else:
             yes = question_answer == 'yes'
 
         if yes:
-            analyzer.search_unknown_imports_from_index(
-                dists_filter=_dists_filter,
-                pypi_index_url=index_url,
-                include_prereleases=include_prereleases,
-            )
+            if question_answer == 'ask':
+                analyzer.search_unknown_imports_from_index(
+                    dists_filter=_dists_filter,
+                    pypi_index_url=index_url,
+                    include_prereleases=include_prereleases,
+                )
             if analyzer.has_unknown_imports_or_uninstalled_annotations():
                 print(Color.RED('These module(s) are still not found:'))
                 analyzer.format_unknown_imports_or_uninstalled_annotations(
@@ -293,6 +543,33 @@ def generate(
                 )
                 sys.stdout.flush()
                 # print(Color.RED('Maybe or you need update database.'))
+    if not cached and not asked:
+        analyzer.save_cached_result()
+
+    if check:
+        buf = io.StringIO()
+        analyzer.write_requirements(
+            buf,
+            with_ref_comments=with_referenced_comments,
+            comparison_specifier=comparison_specifier,
+            with_banner=True,
+            with_unknown_imports=False
+        )
+        diffs = list(
+            difflib.unified_diff(
+                old_requirement_file_content,
+                buf.getvalue().splitlines(keepends=True),
+                fromfile=requirement_file,
+                tofile=requirement_file,
+                n=0,
+            )
+        )
+        if diffs:
+            print(Color.RED(f'{requirement_file} is not up to date:'))
+            print(''.join(diffs), end='')
+            sys.exit(1)
+        print(Color.GREEN(f'{requirement_file} is up to date.'))
+        return
 
     if dry_run:
         buf = io.StringIO()
@@ -308,12 +585,6 @@ def generate(
         print(buf.getvalue(), end='')
         return
 
-    def _read_requirement_file(path):
-        if not os.path.isfile(path):
-            return None
-        with codecs.open(path, 'rb', 'utf-8') as f:
-            return f.readlines()
-
     old_requirement_file_content = _read_requirement_file(requirement_file)
 
     tmp_requirement_file = requirement_file + ".tmp"
@@ -390,7 +661,18 @@ def generate(
     help=
     'Specify the output structure format. NOTE that `requirements` format can not handle complex cases, such as `abc>=1.2.0,<1.3.0`.',
 )
-def check(requirement_file, index_url, include_prereleases, format):
+@click.option(
+    '--cache-dir',
+    'cache_dir',
+    default=None,
+    envvar='PIGAR_CACHE_DIR',
+    type=click.Path(file_okay=False),
+    help=
+    'The directory to cache the installed distributions across runs, the cache is disabled if not given.',
+)
+def check(
+    requirement_file, index_url, include_prereleases, format, cache_dir
+):
     '''Check latest versions for packages/distributions from requirements.txt.'''
     files = []
     cwd = os.getcwd()
@@ -412,7 +694,8 @@ def check(requirement_file, index_url, include_prereleases, format):
         check_requirements_latest_versions(
             files,
             pypi_index_url=index_url,
-            include_prereleases=include_prereleases
+            include_prereleases=include_prereleases,
+            cache_dir=cache_dir,
         )
     )
     if format == 'requirements':
@@ -466,14 +749,24 @@ def check(requirement_file, index_url, include_prereleases, format):
     type=click.Choice(['table', 'json']),
     help='Specify the output structure format.',
 )
+@click.option(
+    '--cache-dir',
+    'cache_dir',
+    default=None,
+    envvar='PIGAR_CACHE_DIR',
+    type=click.Path(file_okay=False),
+    help=
+    'The directory to cache the installed distributions across runs, the cache is disabled if not given.',
+)
 @click.argument('names', nargs=-1, type=str)
-def search(names, index_url, include_prereleases, format):
+def search(names, index_url, include_prereleases, format, cache_dir):
     '''Search packages/distributions by the top level import/module names'''
     results, not_found = asyncio.run(
         search_distributions_by_top_level_import_names(
             names,
             pypi_index_url=index_url,
             include_prereleases=include_prereleases,
+            cache_dir=cache_dir,
         )
     )
     if format == 'json':
@@ -542,11 +835,65 @@ def indexdb_sync(index_url, concurrency):
     )
 
 
+@click.group(name='env')
+def env():
+    '''Installed distributions environment related operations.'''
+    pass
+
+
+@env.command(name='export')
+@click.option(
+    '-o',
+    '--output',
+    'output',
+    default='-',
+    show_default=True,
+    type=click.File('w', encoding='utf-8'),
+    help='The file to write the snapshot to, `-` means the standard output.',
+)
+@click.option(
+    '--cache-dir',
+    'cache_dir',
+    default=None,
+    envvar='PIGAR_CACHE_DIR',
+    type=click.Path(file_okay=False),
+    help=
+    'The directory to cache the installed distributions across runs, the cache is disabled if not given.',
+)
+@click.option(
+    '--site-packages',
+    'site_packages',
+    default=[],
+    multiple=True,
+    type=click.Path(file_okay=False, exists=True),
+    help=
+    'Scan the installed distributions in the given site-packages directory instead of the running environment, the directories listed in its .pth files are included. This option can be used multiple times.',
+)
+@click.option(
+    '--python',
+    'python',
+    default=None,
+    type=click.Path(dir_okay=False, exists=True),
+    help=
+    'Scan the installed distributions of the given Python interpreter (e.g. venv/bin/python) instead of the running environment, the site-packages directories are found from the layout of its installation without running it.',
+)
+def env_export(output, cache_dir, site_packages, python):
+    '''Export the installed distributions as a snapshot for `pigar generate --env-snapshot`.'''
+    paths, python_version = _target_environment(site_packages, python)
+    dump_env_snapshot(
+        installed_distributions(cache_dir=cache_dir, paths=paths).values(),
+        output,
+        cache_dir=cache_dir,
+        python_version=python_version,
+    )
+
+
 cli.add_command(gohome)
 cli.add_command(generate)
 cli.add_command(check)
 cli.add_command(search)
 cli.add_command(indexdb)
+cli.add_command(env)
 
 
 def main():
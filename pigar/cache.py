@@ -0,0 +1,243 @@
+import os
+import sys
+import time
+import hashlib
+import pickle
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from .log import logger
+from .version import version
+
+
+def cache_file_path(cache_dir: str, kind: str, *key: Any) -> str:
+    """Cache files are keyed by pigar and Python versions besides the key."""
+    digest = hashlib.sha1(
+        repr((version, sys.version_info[:2]) + key).encode("utf-8")
+    ).hexdigest()
+    return os.path.join(cache_dir, f"{kind}-{digest[:16]}.pickle")
+
+
+def load_cache_file(path: str) -> Optional[Any]:
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("ignore broken cache file %s: %r", path, e)
+        return None
+
+
+def dump_cache_file(path: str, obj: Any):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    finally:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def git_blob_digest(data: bytes) -> str:
+    """The same content hash as `git hash-object`."""
+    h = hashlib.sha1(b"blob %d\0" % len(data))
+    h.update(data)
+    return h.hexdigest()
+
+
+def file_digest(fpath: str) -> str:
+    with open(fpath, "rb") as f:
+        return git_blob_digest(f.read())
+
+
+# Timestamps of some file systems have a coarse granularity, a file modified
+# shortly before the cache was saved may change again with the same mtime.
+_RACY_WINDOW_NS = 2 * 10**9
+
+
+class _FileStat(NamedTuple):
+    size: int
+    mtime_ns: int
+
+
+class _ParseCacheEntry(NamedTuple):
+    stat: _FileStat
+    digest: str
+    result: Any
+
+
+class ParseCache(object):
+    """ParseCache stores the per-file parsing results on disk.
+
+    An entry is valid if the size and mtime of the file are unchanged,
+    otherwise the content hash decides.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        project_root: str,
+        visit_doc_str: bool = False,
+        parse_requirement_annotations: bool = False,
+    ):
+        self._path = cache_file_path(
+            cache_dir,
+            "parse",
+            project_root,
+            visit_doc_str,
+            parse_requirement_annotations,
+        )
+        data = load_cache_file(self._path) or {}
+        self._saved_ns: int = data.get("saved_ns", 0)
+        self._entries: Dict[str, _ParseCacheEntry] = data.get("entries", {})
+        self._stats: Dict[str, _FileStat] = {}
+        self._seen: Set[str] = set()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, fpath: str, digest: Optional[str] = None) -> Optional[Any]:
+        """Lookup the result of the file, the digest is the known
+        content hash of the file if given (e.g. from the git index)."""
+        self._seen.add(fpath)
+        try:
+            st = os.stat(fpath)
+        except OSError:
+            return None
+        stat = self._stats[fpath] = _FileStat(st.st_size, st.st_mtime_ns)
+        entry = self._entries.get(fpath, None)
+        if entry is None or entry.stat.size != stat.size:
+            self.misses += 1
+            return None
+        if digest is not None:
+            if digest != entry.digest:
+                self.misses += 1
+                return None
+            if entry.stat != stat:
+                self._entries[fpath] = entry._replace(stat=stat)
+                self._dirty = True
+            self.hits += 1
+            return entry.result
+        # Racily clean entries are verified by the content hash as well.
+        if entry.stat != stat or stat.mtime_ns + _RACY_WINDOW_NS >= self._saved_ns:
+            try:
+                digest = file_digest(fpath)
+            except OSError:
+                return None
+            if digest != entry.digest:
+                self.misses += 1
+                return None
+            # Saving again makes the verified entry no longer racy.
+            self._entries[fpath] = entry._replace(stat=stat)
+            self._dirty = True
+        self.hits += 1
+        return entry.result
+
+    def store(self, fpath: str, digest: str, result: Any):
+        stat = self._stats.get(fpath, None)
+        if stat is None:
+            return
+        self._entries[fpath] = _ParseCacheEntry(stat, digest, result)
+        self._dirty = True
+
+    def save(self):
+        stale = set(self._entries) - self._seen
+        for fpath in stale:
+            del self._entries[fpath]
+        if not self._dirty and not stale:
+            return
+        logger.debug(
+            "parse cache: %d hits, %d misses, saving to %s",
+            self.hits,
+            self.misses,
+            self._path,
+        )
+        try:
+            dump_cache_file(
+                self._path,
+                {"saved_ns": time.time_ns(), "entries": self._entries},
+            )
+        except OSError as e:
+            logger.warning("save parse cache %s failed: %r", self._path, e)
+        self._dirty = False
+
+
+class ResultCache(object):
+    """ResultCache stores a result derived from all the project files on
+    disk, which is valid if the key and the content of the files are
+    unchanged.
+
+    The files are fingerprinted by their content hashes, a hash is computed
+    again only if the size or mtime of the file changed.
+    """
+
+    def __init__(self, cache_dir: str, project_root: str, *key: Any):
+        self._path = cache_file_path(cache_dir, "result", project_root, *key)
+        self._fingerprint: Optional[str] = None
+        self._stats: Dict[str, Tuple[_FileStat, str]] = {}
+
+    def lookup(
+        self, files: List[str], digests: Optional[Dict[str, Optional[str]]] = None
+    ) -> Optional[Any]:
+        """Lookup the result of the files, the digests are the known
+        content hashes of the files if given (e.g. from the git index)."""
+        data = load_cache_file(self._path) or {}
+        saved_ns: int = data.get("saved_ns", 0)
+        stats: Dict[str, Tuple[_FileStat, str]] = data.get("stats", {})
+        digests = digests or {}
+        h = hashlib.sha1()
+        for fpath in files:
+            digest = digests.get(fpath, None)
+            if digest is None:
+                digest = self._file_digest(fpath, stats.get(fpath, None), saved_ns)
+            h.update(f"{fpath}\0{digest}\0".encode("utf-8", "surrogateescape"))
+        self._fingerprint = h.hexdigest()
+        if data.get("fingerprint", None) != self._fingerprint:
+            logger.debug("result cache missed: %s", self._path)
+            return None
+        return data.get("result", None)
+
+    def _file_digest(
+        self, fpath: str, cached: Optional[Tuple[_FileStat, str]], saved_ns: int
+    ) -> str:
+        try:
+            st = os.stat(fpath)
+        except OSError:
+            return ""
+        stat = _FileStat(st.st_size, st.st_mtime_ns)
+        # Racily clean files are hashed again, the same as ParseCache.
+        if (
+            cached is not None
+            and cached[0] == stat
+            and stat.mtime_ns + _RACY_WINDOW_NS < saved_ns
+        ):
+            digest = cached[1]
+        else:
+            try:
+                digest = file_digest(fpath)
+            except OSError:
+                return ""
+        self._stats[fpath] = (stat, digest)
+        return digest
+
+    def store(self, result: Any):
+        """Store the result of the files of the last lookup."""
+        if self._fingerprint is None:
+            return
+        logger.debug("saving result cache to %s", self._path)
+        try:
+            dump_cache_file(
+                self._path,
+                {
+                    "saved_ns": time.time_ns(),
+                    "fingerprint": self._fingerprint,
+                    "stats": self._stats,
+                    "result": result,
+                },
+            )
+        except OSError as e:
+            logger.warning("save result cache %s failed: %r", self._path, e)
@@ -4,33 +4,47 @@ import os
 import io
 import os.path
 import sys
+import array
+import bisect
 import collections
-import contextlib
 import functools
 import importlib
-import importlib.util
 import importlib.machinery
-from typing import NamedTuple, List, Dict, Any, Optional, Tuple
+import threading
+from typing import NamedTuple, List, Dict, Any, Optional, Set, Tuple
 import asyncio
 
 from .db import database
 from .log import logger
 from .helpers import (
-    Color, parse_requirements, PraseRequirementError, trim_prefix, trim_suffix,
-    is_commonpath, determine_python_sys_lib_paths, is_site_packages_path
+    Color, parse_requirements, PraseRequirementError, trim_prefix, trim_suffix
+)
+from .parser import (
+    iter_imports, list_project_files, is_project_file, Module, FileImports,
+    ProjectFiles
+)
+from .walk import IGNORE_FILES, walk_files
+from .gitindex import GitCommandError, git_changed_files, git_rev_parse
+from .stdlib import is_stdlib_module
+from .cache import (
+    ParseCache, ResultCache, cache_file_path, load_cache_file, dump_cache_file
 )
-from .parser import parse_imports, Module
 from .dist import (
     installed_distributions_by_top_level_import_names, installed_distributions,
-    FrozenRequirement, _all_hardcode_import_names, DEFAULT_PYPI_INDEX_URL,
-    PyPIDistributions, PyPIDistributionsIndexSynchronizer, canonicalize_name
+    installed_distributions_fingerprint, DistributionPathIndex,
+    ImportNameIndex, FrozenRequirement,
+    narrow_distributions_by_import_names, _all_hardcode_import_names,
+    DEFAULT_PYPI_INDEX_URL, PyPIDistributions,
+    PyPIDistributionsIndexSynchronizer, canonicalize_name,
+    resolve_editable_requirements
 )
 
 _special_import_names = _all_hardcode_import_names()
 
 
 class _Locations(dict):
-    """_Locations store code locations(file, linenos)."""
+    """_Locations store code locations(file, linenos), the file paths are
+    interned and the line numbers of each file are sorted in an array."""
 
     def __init__(self):
         super(_Locations, self).__init__()
@@ -43,20 +57,31 @@ class _Locations(dict):
         return self
 
     def add(self, file, lineno):
-        if file in self and lineno not in self[file]:
-            self[file].append(lineno)
+        linenos = self.get(file, None)
+        if linenos is None:
+            self[sys.intern(file)] = array.array('I', (lineno, ))
+        elif lineno > linenos[-1]:
+            # Line numbers of a file are mostly added in order.
+            linenos.append(lineno)
         else:
-            self[file] = [lineno]
+            idx = bisect.bisect_left(linenos, lineno)
+            if linenos[idx] != lineno:
+                linenos.insert(idx, lineno)
+        self._sorted = None
 
     def extend(self, obj):
         for file, linenos in obj.items():
+            if file not in self:
+                self[sys.intern(file)] = array.array('I', linenos)
+                self._sorted = None
+                continue
             for lineno in linenos:
                 self.add(file, lineno)
 
     def sorted_items(self):
         if self._sorted is None:
             self._sorted = [
-                '{0}: {1}'.format(f, ','.join([str(n) for n in sorted(ls)]))
+                '{0}: {1}'.format(f, ','.join(map(str, ls)))
                 for f, ls in sorted(self.items())
             ]
         return self._sorted
@@ -130,14 +155,31 @@ class _LocatableRequirements(dict):
         self._sorted = None
 
 
+class _ImportGroups(dict):
+    """_ImportGroups groups the import locations by import names, a name is
+    mapped to its locations and whether any import is guarded by try/except."""
+
+    def add(self, name, file, lineno, try_):
+        group = self.get(name, None)
+        if group is None:
+            group = self[name] = [_Locations(), False]
+        group[0].add(file, lineno)
+        if try_:
+            group[1] = True
+
+
 class RequirementsAnalyzer(object):
 
-    def __init__(self, project_root):
+    def __init__(self, project_root, cache_dir=None, installed_dists=None):
         self._project_root = project_root
-
-        self._installed_dists = installed_distributions()
-        self._installed_dists_by_imports = installed_distributions_by_top_level_import_names(
-            distributions=self._installed_dists.values()
+        self._cache_dir = cache_dir
+
+        # The installed distributions may come from an environment snapshot.
+        if installed_dists is None:
+            installed_dists = installed_distributions(cache_dir=cache_dir)
+        self._installed_dists = installed_dists
+        self._installed_dists_by_imports = ImportNameIndex(
+            self._installed_dists.values()
         )
         self._requirements = _LocatableRequirements()
         self._cached_choices = dict()
@@ -145,10 +187,15 @@ class RequirementsAnalyzer(object):
             _LocatableRequirements
         )  # Multiple requirements for same import name.
         self._unknown_imports = collections.defaultdict(_Locations)
+        # The full import names of each unknown import name.
+        self._unknown_import_names = collections.defaultdict(set)
         self._unknown_imports_from_annotations = dict()
         self._unknown_dists_from_annotaions = collections.defaultdict(
             _Locations
         )
+        self._result_cache = None
+        self._stop_early = None
+        self._stopped = False
 
     def analyze_requirements(
         self,
@@ -157,93 +204,374 @@ class RequirementsAnalyzer(object):
         dists_filter=None,
         follow_symbolic_links=True,
         enable_requirement_annotations=False,
+        use_ignore_files=True,
+        files_from_git=False,
+        jobs=None,
+        executor=None,
+        cache_dir=None,
+        target_python_version=None,
+        project_files=None,
+        since=None,
+        stop_early=None,
     ):
-        imported_modules, annotations = parse_imports(
-            self._project_root,
+        return asyncio.run(
+            self.analyze_requirements_async(
+                visit_doc_str=visit_doc_str,
+                ignores=ignores,
+                dists_filter=dists_filter,
+                follow_symbolic_links=follow_symbolic_links,
+                enable_requirement_annotations=enable_requirement_annotations,
+                use_ignore_files=use_ignore_files,
+                files_from_git=files_from_git,
+                jobs=jobs,
+                executor=executor,
+                cache_dir=cache_dir,
+                target_python_version=target_python_version,
+                project_files=project_files,
+                since=since,
+                stop_early=stop_early,
+            )
+        )
+
+    async def analyze_requirements_async(
+        self,
+        visit_doc_str=False,
+        ignores=None,
+        dists_filter=None,
+        follow_symbolic_links=True,
+        enable_requirement_annotations=False,
+        use_ignore_files=True,
+        files_from_git=False,
+        jobs=None,
+        executor=None,
+        cache_dir=None,
+        target_python_version=None,
+        project_files=None,
+        since=None,
+        search_index=False,
+        pypi_index_url=DEFAULT_PYPI_INDEX_URL,
+        include_prereleases=False,
+        stop_early=None,
+    ):
+        """The same as `analyze_requirements`, but it can be awaited in an
+        existing event loop.
+
+        The stages run as a pipeline: the files are parsed in a thread, the
+        imports of each file are resolved as soon as the file is parsed,
+        and if `search_index` is true, the unknown import names are searched
+        in the index as soon as they are found, as if
+        `search_unknown_imports_from_index` is called after the analysis.
+
+        The files are listed by `list_project_files` unless `project_files`
+        is given.
+
+        If `since` (a git ref) is given with `cache_dir`, only the files
+        changed since the ref are parsed, the imports of the other files and
+        the resolved import names are loaded from the manifest saved by a
+        previous run at the ref. Each run with `since` saves the manifest of
+        the current commit.
+
+        If `stop_early` is given, it is called with each found requirement,
+        the analysis stops as soon as it returns true, e.g. the result is
+        known to be different from an existing requirements file. Returns
+        False if the analysis is stopped, the result is incomplete then.
+        """
+        self._stop_early = stop_early
+        self._stopped = False
+        options = dict(
             visit_doc_str=visit_doc_str,
-            exclude_patterns=ignores,
-            followlinks=follow_symbolic_links,
-            parse_requirement_annotations=enable_requirement_annotations,
+            ignores=ignores,
+            dists_filter=dists_filter,
+            follow_symbolic_links=follow_symbolic_links,
+            enable_requirement_annotations=enable_requirement_annotations,
+            use_ignore_files=use_ignore_files,
+            files_from_git=files_from_git,
+            jobs=jobs,
+            executor=executor,
+            cache_dir=cache_dir,
+            target_python_version=target_python_version,
+            project_files=project_files,
+            since=since,
         )
+        if not search_index:
+            await self._analyze_requirements(None, **options)
+            return not self._stopped
+
+        async with PyPIDistributions(index_url=pypi_index_url) as pypi_dists:
+            searcher = _IndexSearcher(pypi_dists, include_prereleases)
+            try:
+                await self._analyze_requirements(searcher, **options)
+                if not self._stopped:
+                    await self._search_unknown_imports_from_index(
+                        searcher, dists_filter
+                    )
+            finally:
+                await searcher.close()
+        return not self._stopped
 
+    async def _analyze_requirements(
+        self,
+        searcher,
+        visit_doc_str,
+        ignores,
+        dists_filter,
+        follow_symbolic_links,
+        enable_requirement_annotations,
+        use_ignore_files,
+        files_from_git,
+        jobs,
+        executor,
+        cache_dir,
+        target_python_version,
+        project_files,
+        since,
+    ):
+        loop = asyncio.get_running_loop()
+        parse_cache = None
+        if cache_dir is not None:
+            parse_cache = ParseCache(
+                cache_dir,
+                self._project_root,
+                visit_doc_str=visit_doc_str,
+                parse_requirement_annotations=enable_requirement_annotations,
+            )
+        # The imports of the unchanged files and the resolved import names
+        # from the manifest.
+        known_imports = dict()
+        known_resolutions = dict()
+        manifest = None
+        if since is not None and cache_dir is not None:
+            manifest = _ManifestContext(
+                cache_dir,
+                (
+                    self._project_root, visit_doc_str,
+                    enable_requirement_annotations, tuple(ignores or ()),
+                    follow_symbolic_links, use_ignore_files, files_from_git,
+                    target_python_version,
+                    installed_distributions_fingerprint(
+                        self._installed_dists.values()
+                    )
+                ),
+            )
+            loaded = await loop.run_in_executor(
+                None,
+                functools.partial(
+                    manifest.load,
+                    self._project_root,
+                    since,
+                    exclude_patterns=ignores,
+                    use_ignore_files=use_ignore_files,
+                    files_from_git=files_from_git,
+                )
+            )
+            if loaded is not None:
+                project_files, known_imports, known_resolutions = loaded
+                # The parse cache keeps only the parsed files when it is saved.
+                parse_cache = None
+        if project_files is None:
+            project_files = await loop.run_in_executor(
+                None,
+                functools.partial(
+                    list_project_files,
+                    self._project_root,
+                    exclude_patterns=ignores,
+                    followlinks=follow_symbolic_links,
+                    use_ignore_files=use_ignore_files,
+                    files_from_git=files_from_git,
+                )
+            )
+        project_index = ProjectModuleIndex(
+            self._project_root,
+            project_files.files,
+            target_version=target_python_version,
+            installed_imports=self._installed_dists_by_imports,
+            followlinks=follow_symbolic_links,
+        )
         importables = dict()
         tryimports = set()
         importlib.invalidate_caches()
 
-        def _resolve(module: Module, from_annotation: bool):
-            name = module.name
-            if is_user_module(module, self._project_root):
-                logger.debug(
-                    "ignore import name from user module: %s", module.name
-                )
-                return
-            is_stdlib, code_path = check_stdlib(name)
-            if not is_stdlib:
-                is_stdlib, code_path = check_stdlib(name.split('.')[0])
+        def _resolve(name: str, locs: _Locations):
+            """Returns the (import name, requirements, full import name, code
+            path) that the import name is resolved to, the requirements are
+            None if the import name is unknown, and whether the results can
+            be reused without asking `dists_filter` again."""
+            is_stdlib, code_path = check_stdlib(name, target_python_version)
             if is_stdlib:
-                logger.debug("ignore import name from stdlib: %s", module.name)
-                return
+                logger.debug("ignore import name from stdlib: %s", name)
+                return [], True
 
-            names = []
-            special_name = '.'.join(name.split('.')[:2])
             # Flask extension.
             if name.startswith('flask.ext.'):
-                names.append('flask')
-                names.append('flask_' + name.split('.')[2])
-            # Special cases..
-            elif special_name in _special_import_names:
-                names.append(special_name)
-            # Other.
-            elif '.' in name:
-                names.append(name.split('.')[0])
+                names = ['flask', 'flask_' + name.split('.')[2]]
             else:
-                names.append(name)
+                names = [name]
 
+            resolved = []
+            reusable = True
             for name in names:
-                if name in self._installed_dists_by_imports:
-                    reqs = self._installed_dists_by_imports[name]
-                    locs = _Locations.build_from(module.file, module.lineno)
+                # The longest dotted prefix provided by the distributions.
+                import_name, reqs = self._installed_dists_by_imports.lookup(
+                    name
+                )
+                if reqs:
+                    reusable = reusable and len(reqs) == 1
                     reqs = self._maybe_filter_distributions_with_same_import_name(
-                        name, locs, reqs, dists_filter
+                        import_name, locs, reqs, dists_filter
                     )
+                    resolved.append((import_name, reqs, name, None))
+                    continue
+
+                full_name = name
+                special_name = '.'.join(name.split('.')[:2])
+                # Special cases..
+                if special_name in _special_import_names:
+                    name = special_name
+                # Other.
+                elif '.' in name:
+                    name = name.split('.')[0]
+                resolved.append((name, None, full_name, code_path))
+            return resolved, reusable
+
+        # Each import name is resolved once, by the first file importing it,
+        # the locations in the later files are added to the same results.
+        resolutions = dict()
+
+        def _add(name: str, locs: _Locations, try_: bool, from_annotation: bool):
+            resolution = resolutions.get(name, None)
+            if resolution is None:
+                is_user_module, origin = project_index.resolve(name)
+                resolution = resolutions[name] = [is_user_module, origin, None]
+            is_user_module, origin, resolved = resolution
+            if is_user_module:
+                if origin not in locs:
+                    logger.debug("ignore import name from user module: %s", name)
+                    return
+                # Only the module itself imports the distribution.
+                self_locs = _Locations()
+                self_locs[origin] = locs[origin]
+                locs = self_locs
+            if resolved is None:
+                resolved = known_resolutions.get(name, None)
+                if resolved is None:
+                    resolved, reusable = _resolve(name, locs)
+                    if reusable:
+                        known_resolutions[name] = resolved
+                resolution[2] = resolved
+
+            for import_name, reqs, full_name, code_path in resolved:
+                # The locations are owned by the requirements.
+                name_locs = _Locations()
+                name_locs.extend(locs)
+                if reqs is not None:
                     self._record_requirements(
-                        name, locs, reqs, from_annotation
+                        import_name, name_locs, reqs, from_annotation
                     )
-                else:
-                    if code_path is not None:
-                        importables[name] = code_path
-                    if module.try_:
-                        tryimports.add(name)
-                    self._unknown_imports[name].add(module.file, module.lineno)
-                    self._unknown_imports_from_annotations[name
-                                                           ] = from_annotation
-
-        for module in imported_modules:
-            _resolve(module, False)
-        for annotation in annotations:
-            if annotation.top_level_import_name is not None:
-                module = Module(
-                    name=annotation.top_level_import_name,
-                    file=annotation.file,
-                    lineno=annotation.lineno,
-                    try_=False
-                )
-                _resolve(module, True)
-            elif annotation.distribution_name is not None:
-                req = self._installed_dists.get(
-                    canonicalize_name(annotation.distribution_name), None
-                )
-                if req is not None:
-                    locs = _Locations.build_from(
-                        annotation.file, annotation.lineno
+                    continue
+                if code_path is not None:
+                    importables[import_name] = code_path
+                if try_:
+                    tryimports.add(import_name)
+                self._unknown_imports[import_name].extend(name_locs)
+                self._unknown_import_names[import_name].add(full_name)
+                self._unknown_imports_from_annotations[import_name
+                                                       ] = from_annotation
+                if searcher is not None and import_name not in importables:
+                    searcher.prefetch(
+                        import_name, self._unknown_import_names[import_name]
                     )
-                    self._record_requirements(None, locs, [req], True)
-                else:
-                    self._unknown_dists_from_annotaions[
-                        annotation.distribution_name
-                    ].add(annotation.file, annotation.lineno)
+
+        # The files are parsed in a thread, the imports of each file are
+        # resolved while the rest are being parsed.
+        queue = asyncio.Queue()
+        stopped = threading.Event()
+        parse_files = project_files
+        if known_imports:
+            parse_files = ProjectFiles(
+                [
+                    fpath for fpath in project_files.files
+                    if fpath not in known_imports
+                ]
+            )
+
+        def _parse():
+            try:
+                for file_imports in known_imports.values():
+                    if stopped.is_set():
+                        return
+                    loop.call_soon_threadsafe(queue.put_nowait, file_imports)
+                for file_imports in iter_imports(
+                    self._project_root,
+                    visit_doc_str=visit_doc_str,
+                    parse_requirement_annotations=enable_requirement_annotations,
+                    jobs=jobs,
+                    executor=executor,
+                    cache=parse_cache,
+                    project_files=parse_files,
+                ):
+                    if stopped.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, file_imports)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        annotation_imports = _ImportGroups()
+        annotations = []
+        # The imports of all files for the manifest.
+        collected = dict()
+        parsing = loop.run_in_executor(None, _parse)
+        try:
+            while True:
+                file_imports = await queue.get()
+                if file_imports is None:
+                    break
+                if manifest is not None:
+                    collected[file_imports.file] = file_imports
+                imports = _ImportGroups()
+                for module in file_imports.modules:
+                    imports.add(
+                        module.name, module.file, module.lineno, module.try_
+                    )
+                for name, (locs, try_) in imports.items():
+                    _add(name, locs, try_, False)
+                for annotation in file_imports.annotations:
+                    if annotation.top_level_import_name is not None:
+                        annotation_imports.add(
+                            annotation.top_level_import_name, annotation.file,
+                            annotation.lineno, False
+                        )
+                    elif annotation.distribution_name is not None:
+                        annotations.append(annotation)
+                if self._stopped:
+                    logger.debug("the analysis is stopped early")
+                    break
+        finally:
+            stopped.set()
+            await parsing
+        if self._stopped:
+            return
+        logger.debug(
+            "resolved %d unique import names, %d from annotations",
+            len(resolutions), len(annotation_imports)
+        )
+
+        # Annotations are resolved after all imports.
+        for name, (locs, try_) in annotation_imports.items():
+            _add(name, locs, try_, True)
+        for annotation in annotations:
+            req = self._installed_dists.get(
+                canonicalize_name(annotation.distribution_name), None
+            )
+            if req is not None:
+                locs = _Locations.build_from(annotation.file, annotation.lineno)
+                self._record_requirements(None, locs, [req], True)
+            else:
+                self._unknown_dists_from_annotaions[
+                    annotation.distribution_name
+                ].add(annotation.file, annotation.lineno)
 
         resolved = set()
+        dists_by_path = None
         for name, locs in self._unknown_imports.items():
             if name in tryimports:
                 logger.debug(
@@ -256,21 +584,52 @@ class RequirementsAnalyzer(object):
                 # which is importable but it is not in top_level.txt.
                 # Ref: https://docs.python.org/3/library/sys_path_init.html#pth-files
                 code_path = importables[name]
-                # Let's do a brute-force match..
-                for req in self._installed_dists.values():
-                    if req.contains_file(code_path):
-                        # XXX: there is an issue if multiple distributions has the same path..
-                        # reqs = self._maybe_filter_distributions_with_same_import_name( name, locs, reqs, dists_filter)
-                        self._record_requirements(name, locs, [req], False)
+                if dists_by_path is None:
+                    dists_by_path = DistributionPathIndex(
+                        self._installed_dists.values()
+                    )
+                    for path, reqs in dists_by_path.conflicts().items():
                         logger.debug(
-                            "the import name is importable(no top levels contains it): %s",
-                            name
+                            "code path %s is shared by distributions: %s",
+                            path, ", ".join(req.name for req in reqs)
                         )
-                        resolved.add(name)
-                        break
+                reqs = dists_by_path.find(code_path)
+                if not reqs:
+                    continue
+                if len(reqs) > 1:
+                    logger.warning(
+                        "%s is claimed by multiple distributions: %s",
+                        code_path, ", ".join(req.name for req in reqs)
+                    )
+                    reqs = self._maybe_filter_distributions_with_same_import_name(
+                        name, locs, reqs, dists_filter
+                    )
+                self._record_requirements(name, locs, reqs, False)
+                logger.debug(
+                    "the import name is importable(no top levels contains it): %s",
+                    name
+                )
+                resolved.add(name)
 
         for name in resolved:
             del self._unknown_imports[name]
+            # Resolved locally, the prefetched results are useless.
+            if searcher is not None:
+                searcher.discard(name)
+
+        if manifest is not None and not self._stopped:
+            await loop.run_in_executor(
+                None,
+                functools.partial(
+                    manifest.save,
+                    self._project_root,
+                    collected,
+                    {
+                        name: known_resolutions[name]
+                        for name in resolutions if name in known_resolutions
+                    },
+                )
+            )
 
     def _record_requirements(
         self,
@@ -286,6 +645,10 @@ class RequirementsAnalyzer(object):
             requirements.add_locs(req, locs, from_annotation=from_annotation)
             # FIXME: treat this the same as _unknown_imports
             self._unknown_dists_from_annotaions.pop(req.name, None)
+            if self._stop_early is None or self._stopped:
+                continue
+            if self._stop_early(req):
+                self._stopped = True
 
     def search_unknown_imports_from_index(
         self,
@@ -293,82 +656,111 @@ class RequirementsAnalyzer(object):
         pypi_index_url=DEFAULT_PYPI_INDEX_URL,
         include_prereleases=False,
     ):
-        found = set()
 
-        async def _get_latest_version(
-            pypi_dists: PyPIDistributions, dist_name: str
-        ):
-            try:
-                latest = await pypi_dists.get_latest_distribution_version(
-                    dist_name,
-                    include_prereleases=include_prereleases,
-                )
-                return FrozenRequirement(dist_name, latest or '0.0.0')
-            except Exception as e:
-                logger.error('checking %s failed: %r', dist_name, e)
+        async def _main():
+            async with PyPIDistributions(
+                index_url=pypi_index_url
+            ) as pypi_dists:
+                searcher = _IndexSearcher(pypi_dists, include_prereleases)
+                try:
+                    await self._search_unknown_imports_from_index(
+                        searcher, dists_filter
+                    )
+                finally:
+                    await searcher.close()
+
+        asyncio.run(_main())
+
+    async def _search_unknown_imports_from_index(
+        self, searcher: '_IndexSearcher', dists_filter=None
+    ):
+        found = set()
 
         async def _collect(
-            pypi_dists: PyPIDistributions,
             module_name: Optional[str],
             locs: _Locations,
             dist_names: List[str],
             from_annotation: bool,
         ):
             reqs = await asyncio.gather(
-                *[
-                    _get_latest_version(pypi_dists, dist_name)
-                    for dist_name in dist_names
-                ],
-                return_exceptions=True
+                *[searcher.latest_version(dist_name) for dist_name in dist_names]
+            )
+            self._record_requirements(
+                module_name, locs, [req for req in reqs if req is not None],
+                from_annotation
             )
-            self._record_requirements(module_name, locs, reqs, from_annotation)
-
-        async def _main():
-            async with PyPIDistributions(
-                index_url=pypi_index_url
-            ) as pypi_dists:
-                tasks = []
-                for name, locs in self._unknown_imports.items():
-                    from_annotation = self._unknown_imports_from_annotations[
-                        name]
-                    logger.info(
-                        'search distributions for import name %s ...', name
-                    )
-                    with database() as db:
-                        distributions = db.query_distributions_by_top_level_module(
-                            name
-                        )
-                    if distributions is None:
-                        continue
-                    distributions = self._maybe_filter_distributions_with_same_import_name(
-                        name, locs, distributions, dists_filter
-                    )
-                    found.add(name)
-                    tasks.append(
-                        _collect(
-                            pypi_dists,
-                            name,
-                            locs,
-                            [dist.name for dist in distributions],
-                            from_annotation=from_annotation,
-                        )
-                    )
-                for name, locs in self._unknown_dists_from_annotaions.items():
-                    tasks.append(
-                        _collect(
-                            pypi_dists,
-                            None,
-                            locs, [name],
-                            from_annotation=True
-                        )
-                    )
-                await asyncio.gather(*tasks, return_exceptions=True)
 
-        asyncio.run(_main())
+        tasks = []
+        for name, locs in self._unknown_imports.items():
+            from_annotation = self._unknown_imports_from_annotations[name]
+            distributions = searcher.distributions(name)
+            if distributions is None:
+                continue
+            distributions = narrow_distributions_by_import_names(
+                distributions, self._unknown_import_names[name]
+            )
+            distributions = self._maybe_filter_distributions_with_same_import_name(
+                name, locs, distributions, dists_filter
+            )
+            found.add(name)
+            tasks.append(
+                _collect(
+                    name,
+                    locs,
+                    [dist.name for dist in distributions],
+                    from_annotation=from_annotation,
+                )
+            )
+        for name, locs in self._unknown_dists_from_annotaions.items():
+            tasks.append(_collect(None, locs, [name], from_annotation=True))
+        await asyncio.gather(*tasks, return_exceptions=True)
 
         for name in found:
             del self._unknown_imports[name]
 
+    def load_cached_result(self, project_files: ProjectFiles, *key) -> bool:
+        """Load the result of a previous run from the cache, which is valid
+        if the project files, the installed distributions and the key (e.g.
+        the options of the analysis) are unchanged."""
+        if self._cache_dir is None:
+            return False
+        self._result_cache = ResultCache(
+            self._cache_dir,
+            self._project_root,
+            installed_distributions_fingerprint(self._installed_dists.values()),
+            *key,
+        )
+        result = self._result_cache.lookup(
+            project_files.files, project_files.digests
+        )
+        if result is None:
+            return False
+        (
+            self._requirements,
+            self._uncertain_requirements,
+            self._unknown_imports,
+            self._unknown_import_names,
+            self._unknown_imports_from_annotations,
+            self._unknown_dists_from_annotaions,
+        ) = result
+        return True
+
+    def save_cached_result(self):
+        """Save the result for the later runs, `load_cached_result` must be
+        called before the analysis, an incomplete result is not saved."""
+        if self._result_cache is None or self._stopped:
+            return
+        self._result_cache.store(
+            (
+                self._requirements,
+                self._uncertain_requirements,
+                self._unknown_imports,
+                self._unknown_import_names,
+                self._unknown_imports_from_annotations,
+                self._unknown_dists_from_annotaions,
+            )
+        )
+
     def write_requirements(
         self,
         stream: io.IOBase,
@@ -381,6 +773,15 @@ class RequirementsAnalyzer(object):
             trim_suffix(self._project_root, os.sep)
         ) + os.sep
 
+        # Probe the VCS of the editable requirements only when they are written.
+        resolve_editable_requirements(
+            [req.req for req in self._requirements.values()] + [
+                req.req for reqs in self._uncertain_requirements.values()
+                for req in reqs.values()
+            ],
+            cache_dir=self._cache_dir,
+        )
+
         if with_banner:
             stream.write(
                 '# Automatically generated by https://github.com/damnever/pigar.\n\n'
@@ -493,6 +894,213 @@ class RequirementsAnalyzer(object):
         return choosed
 
 
+class _ImportManifest(NamedTuple):
+    # The imports of each project file in the walking order.
+    files: Dict[str, FileImports]
+    # The import names resolved without asking.
+    resolutions: Dict[str, List[Tuple]]
+    # The files changed since the commit when the manifest was saved.
+    dirty: Set[str]
+
+
+class _ManifestContext(object):
+    """_ManifestContext loads the import manifest saved at a git ref, and
+    saves the manifest at the current commit, the manifests are keyed by
+    the commits and the options of the analysis."""
+
+    def __init__(self, cache_dir: str, key: Tuple):
+        self._cache_dir = cache_dir
+        self._key = key
+        self._loaded = None
+
+    def _path(self, commit: str) -> str:
+        return cache_file_path(self._cache_dir, 'manifest', *self._key, commit)
+
+    def load(
+        self,
+        project_root: str,
+        since: str,
+        exclude_patterns=None,
+        use_ignore_files=True,
+        files_from_git=False,
+    ):
+        """Returns the project files, the imports of the files unchanged
+        since the git ref and the resolved import names, or None if the
+        manifest at the ref is unavailable."""
+        try:
+            commit = git_rev_parse(project_root, since)
+            changed, untracked = git_changed_files(project_root, commit)
+        except GitCommandError as e:
+            logger.warning(
+                'can not find the files changed since %s, analyze all files: %s',
+                since, e
+            )
+            return None
+        manifest = load_cache_file(self._path(commit))
+        if manifest is None:
+            logger.info('no import manifest saved at %s, analyze all files', since)
+            return None
+        self._loaded = (commit, manifest)
+
+        changed = set(changed).union(untracked, manifest.dirty)
+        if use_ignore_files and any(
+            os.path.basename(fpath) in IGNORE_FILES for fpath in changed
+        ):
+            logger.info('ignore files changed since %s, analyze all files', since)
+            return None
+        files = [fpath for fpath in manifest.files if fpath not in changed]
+        known_imports = {fpath: manifest.files[fpath] for fpath in files}
+        untracked = set(untracked)
+        for fpath in sorted(changed):
+            if not os.path.isfile(fpath):
+                continue  # Deleted.
+            if fpath in manifest.files or (
+                not (files_from_git and fpath in untracked) and is_project_file(
+                    project_root,
+                    fpath,
+                    exclude_patterns=exclude_patterns,
+                    use_ignore_files=use_ignore_files,
+                    files_from_git=files_from_git,
+                )
+            ):
+                files.append(fpath)
+        logger.info(
+            '%d files changed since %s', len(files) - len(known_imports), since
+        )
+        return ProjectFiles(files), known_imports, dict(manifest.resolutions)
+
+    def save(
+        self,
+        project_root: str,
+        files: Dict[str, FileImports],
+        resolutions: Dict[str, List[Tuple]],
+    ):
+        try:
+            commit = git_rev_parse(project_root, 'HEAD')
+            changed, untracked = git_changed_files(project_root, commit)
+        except GitCommandError as e:
+            logger.warning('save the import manifest failed: %s', e)
+            return
+        manifest = _ImportManifest(
+            files, resolutions,
+            set(changed).union(untracked)
+        )
+        if self._loaded is not None and self._loaded[0] == commit and _is_same_manifest(
+            self._loaded[1], manifest
+        ):
+            return
+        path = self._path(commit)
+        logger.debug('saving import manifest to %s', path)
+        try:
+            dump_cache_file(path, manifest)
+        except OSError as e:
+            logger.warning('save import manifest %s failed: %r', path, e)
+
+
+def _is_same_manifest(a: _ImportManifest, b: _ImportManifest) -> bool:
+    # The unchanged entries are the same objects as the loaded ones, the
+    # comparison only looks into the entries of the files parsed again.
+    return a.dirty == b.dirty and list(a.files) == list(b.files) and all(
+        a.files[fpath] == b.files[fpath] for fpath in a.files
+    ) and a.resolutions == b.resolutions
+
+
+class _IndexSearcher(object):
+    """_IndexSearcher searches the distributions of the unknown import names
+    in the index database and their latest versions on PyPI, the searches
+    can be started before the results are needed.
+
+    At most `max_prefetches` latest versions are looked up speculatively,
+    the other names are searched when the results are needed.
+    """
+
+    def __init__(
+        self,
+        pypi_dists: PyPIDistributions,
+        include_prereleases=False,
+        max_prefetches=128,
+    ):
+        self._pypi_dists = pypi_dists
+        self._include_prereleases = include_prereleases
+        self._distributions = dict()
+        self._latest_versions = dict()
+        # The distribution names prefetched for each import name.
+        self._prefetched = dict()
+        self._prefetches = 0
+        self._max_prefetches = max_prefetches
+        self._discarded = []
+
+    def prefetch(self, name: str, import_names: Set[str]):
+        """Start searching the latest versions of the distributions which
+        may provide the full import names."""
+        if name in self._distributions:
+            return
+        distributions = self.distributions(name)
+        if distributions is None:
+            return
+        dist_names = [
+            dist.name for dist in narrow_distributions_by_import_names(
+                distributions, import_names
+            ) if dist.name not in self._latest_versions
+        ]
+        if self._prefetches + len(dist_names) > self._max_prefetches:
+            logger.debug(
+                'too many prefetches, search import name %s later', name
+            )
+            return
+        self._prefetched[name] = dist_names
+        self._prefetches += len(dist_names)
+        for dist_name in dist_names:
+            self.latest_version(dist_name)
+
+    def discard(self, name: str):
+        """Discard the prefetched results of an import name, e.g. it is
+        resolved locally."""
+        dist_names = self._prefetched.pop(name, None)
+        if dist_names is None:
+            return
+        self._prefetches -= len(dist_names)
+        for dist_name in dist_names:
+            task = self._latest_versions.pop(dist_name, None)
+            if task is not None and not task.done():
+                task.cancel()
+                self._discarded.append(task)
+
+    def distributions(self, name: str):
+        if name not in self._distributions:
+            logger.info('search distributions for import name %s ...', name)
+            with database() as db:
+                self._distributions[
+                    name] = db.query_distributions_by_top_level_module(name)
+        return self._distributions[name]
+
+    def latest_version(self, dist_name: str) -> 'asyncio.Future':
+        task = self._latest_versions.get(dist_name, None)
+        if task is None:
+            task = asyncio.ensure_future(self._get_latest_version(dist_name))
+            self._latest_versions[dist_name] = task
+        return task
+
+    async def _get_latest_version(self, dist_name: str):
+        try:
+            latest = await self._pypi_dists.get_latest_distribution_version(
+                dist_name,
+                include_prereleases=self._include_prereleases,
+            )
+            return FrozenRequirement(dist_name, latest or '0.0.0')
+        except Exception as e:
+            logger.error('checking %s failed: %r', dist_name, e)
+
+    async def close(self):
+        # The unused searches, e.g. for the names imported in try/except.
+        pending = [
+            task for task in self._latest_versions.values() if not task.done()
+        ] + self._discarded
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
 class LocalRequirementWithLatestVersion(NamedTuple):
     name: str
     specifier: str
@@ -507,8 +1115,9 @@ async def check_requirements_latest_versions(
     requirement_files,
     pypi_index_url=DEFAULT_PYPI_INDEX_URL,
     include_prereleases=False,
+    cache_dir=None,
 ) -> List[LocalRequirementWithLatestVersion]:
-    installed_dists = installed_distributions()
+    installed_dists = installed_distributions(cache_dir=cache_dir)
 
     async def _collect(pypi_dists, req):
         local_version = ''
@@ -546,11 +1155,14 @@ async def search_distributions_by_top_level_import_names(
     names: List[str],
     pypi_index_url=DEFAULT_PYPI_INDEX_URL,
     include_prereleases=False,
+    cache_dir=None,
 ) -> Tuple[Dict[str, List[Tuple[str, str, str]]], List[str]]:
     results = collections.defaultdict(list)
     not_found = list()
 
-    installed_dists = installed_distributions_by_top_level_import_names()
+    installed_dists = installed_distributions_by_top_level_import_names(
+        installed_distributions(cache_dir=cache_dir).values()
+    )
 
     async def _get_latest_version(pypi_dists, distribution, import_name):
         try:
@@ -625,118 +1237,197 @@ def sync_distributions_index_from_pypi(
     asyncio.run(_main())
 
 
-@contextlib.contextmanager
-def _exclude_sys_site_paths():
-    origin_sys_path = sys.path.copy()
-    site_paths = []
-    for path in sys.path:
-        if is_site_packages_path(path):
-            site_paths.append(path)
-    for path in site_paths:
-        sys.path.remove(path)
-    yield
-    sys.path.clear()
-    sys.path.extend(origin_sys_path)
-
-
-@contextlib.contextmanager
-def _prepend_sys_path(path: str):
-    sys.path.insert(0, path)
-    parent = os.path.dirname(path)
-    if parent:
-        sys.path.insert(1, parent)
-    yield
-    sys.path.remove(path)
-    if parent:
-        sys.path.remove(parent)
-
-
-@contextlib.contextmanager
-def _keep_sys_modules_clean():
-    orignal_sys_modules = set(sys.modules.keys())
-    yield
-    for name in set(sys.modules.keys()) - orignal_sys_modules:
-        sys.modules.pop(name)
-
-
-# FIXME: this function is full of magic!
-def is_user_module(module: Module, project_root: str):
-    if module.name.startswith("."):
-        return True
-
-    root_module_name = module.name.split('.')[0]
-    try:
-        # FIXME(damnever): isolated environment!!
-        spec = None
-        with _exclude_sys_site_paths():
-            with _prepend_sys_path(project_root):
-                with _keep_sys_modules_clean():
-                    for name in [module.name, root_module_name]:
-                        try:
-                            spec = importlib.util.find_spec(
-                                name, os.path.dirname(module.file)
-                            )
-                            break
-                        except Exception:
-                            pass
-        if spec.origin is None:
-            return False
-        return (
-            spec.origin != module.file
-            and is_commonpath([spec.origin, project_root], project_root)
-        ) or root_module_name == os.path.basename(project_root)
-    except Exception:
-        return False
+# The source, bytecode and extension modules, including the extension modules
+# built for the other platforms and Python versions.
+_MODULE_SUFFIXES = tuple(
+    set(importlib.machinery.all_suffixes()) | {'.py', '.pyc', '.pyd', '.so'}
+)
 
 
-def _cache_check_stdlib(func):
-    checked = dict()
+class ProjectModuleIndex(object):
+    """ProjectModuleIndex indexes the importable modules of the project by
+    the project files, so no `sys.path` changes and import machinery are
+    needed to check whether an import is a user module.
 
-    @functools.wraps(func)
-    def _wrapper(name):
-        if name not in checked:
-            checked[name] = func(name)
-        return checked[name]
+    Besides the given files, the modules under the project layout are indexed
+    on demand for each top level name, regardless of the exclude patterns and
+    ignore files, e.g. the generated `*_pb2.py` and the extension modules.
 
-    return _wrapper
+    The search roots are the project root and its `src` directory (the src
+    layout), the same precedence as the import system applies: a regular
+    package shadows a module, and a module shadows a namespace package.
+    A namespace package in the project is also shadowed by the stdlib and
+    the installed distributions with the same top level name.
+    """
 
+    _PACKAGE, _MODULE, _NAMESPACE = 0, 1, 2
 
-@_cache_check_stdlib
-def check_stdlib(name: str, _sys_lib_paths=determine_python_sys_lib_paths()):
-    """Check whether it is stdlib module."""
-    with _keep_sys_modules_clean():
-        try:
-            spec = importlib.util.find_spec(name)
-        except ImportError:
-            spec = None
-        except Exception as e:
-            logger.error('find_spec(%s) got unexpected error: %r', name, e)
-            spec = None
-        if spec is None:
-            try:
-                # __import__(name)
-                importlib.import_module(name)
-                spec = importlib.util.find_spec(name)
-            except ImportError:
+    def __init__(
+        self,
+        project_root: str,
+        files: List[str],
+        target_version: Optional[Tuple[int, int]] = None,
+        installed_imports: Optional[ImportNameIndex] = None,
+        followlinks: bool = True,
+    ):
+        self._project_root = project_root
+        self._project_name = os.path.basename(project_root)
+        self._target_version = target_version
+        self._installed_imports = installed_imports
+        self._followlinks = followlinks
+        self._roots = [project_root, os.path.join(project_root, 'src')]
+        self._root_entries: List[Optional[List[str]]] = [None, None]
+        self._loaded: Set[str] = set()
+        self._indexes: List[Dict[str, Tuple[int, Optional[str]]]] = []
+        for root in self._roots:
+            prefix = os.path.join(root, '')
+            index = dict()
+            for fpath in files:
+                if fpath.startswith(prefix):
+                    self._add(index, fpath[len(prefix):].split(os.sep), fpath)
+            self._prune(index, list(index.keys()))
+            self._indexes.append(index)
+
+    def _load(self, root_module_name: str):
+        """Index the files of the top level module found in the roots."""
+        if root_module_name in self._loaded:
+            return
+        self._loaded.add(root_module_name)
+        for i, root in enumerate(self._roots):
+            entries = self._root_entries[i]
+            if entries is None:
+                try:
+                    entries = sorted(os.listdir(root))
+                except OSError:
+                    entries = []
+                self._root_entries[i] = entries
+            prefix = os.path.join(root, '')
+            index = self._indexes[i]
+            names = set(index.keys())
+            for entry in entries:
+                if entry.split('.', 1)[0] != root_module_name:
+                    continue
+                path = os.path.join(root, entry)
+                if entry != root_module_name:
+                    self._add(index, [entry], path)
+                elif os.path.isdir(path):
+                    for fpath in walk_files(path, followlinks=self._followlinks):
+                        self._add(
+                            index, fpath[len(prefix):].split(os.sep), fpath
+                        )
+            self._prune(index, [name for name in index if name not in names])
+
+    def _add(self, index, parts: List[str], fpath: str):
+        *dirs, filename = parts
+        if not filename.endswith(_MODULE_SUFFIXES):
+            return
+        for i, dirname in enumerate(dirs):
+            if not dirname.isidentifier():
+                return
+            self._set(index, '.'.join(dirs[:i + 1]), self._NAMESPACE, None)
+        # e.g. mod.py, mod.cpython-312-x86_64-linux-gnu.so, mod.pyd
+        stem = filename.split('.', 1)[0]
+        if stem == '__init__':
+            if dirs:
+                self._set(index, '.'.join(dirs), self._PACKAGE, fpath)
+        elif stem.isidentifier():
+            self._set(index, '.'.join(dirs + [stem]), self._MODULE, fpath)
+
+    @staticmethod
+    def _set(index, name: str, kind: int, origin: Optional[str]):
+        found = index.get(name, None)
+        if found is None or kind < found[0]:
+            index[name] = (kind, origin)
+
+    def _prune(self, index, names: List[str]):
+        # The submodules of a module(not a package) can not be imported.
+        for name in names:
+            parts = name.split('.')
+            for i in range(1, len(parts)):
+                if index['.'.join(parts[:i])][0] == self._MODULE:
+                    del index[name]
+                    break
+
+    def find(self, name: str) -> Tuple[bool, Optional[str]]:
+        """Returns whether the module is in the project and the file
+        of the module, namespace packages have no files."""
+        root_module_name = name.split('.')[0]
+        self._load(root_module_name)
+        if self._find(root_module_name) == (True, None):
+            # A regular package anywhere on `sys.path` wins over the
+            # namespace package, e.g. a `yaml` directory without __init__.py.
+            if is_stdlib_module(root_module_name, self._target_version):
                 return False, None
-            except Exception as e:
-                logger.error('find_spec(%s) got unexpected error: %r', name, e)
+            installed = self._installed_imports
+            if installed is not None and installed.lookup(root_module_name)[1]:
                 return False, None
+        return self._find(name)
+
+    def _find(self, name: str) -> Tuple[bool, Optional[str]]:
+        found = False
+        for index in self._indexes:
+            kind, origin = index.get(name, (None, None))
+            if kind is None:
+                continue
+            if kind != self._NAMESPACE:
+                return True, origin
+            found = True
+        return found, None
+
+    def resolve(self, name: str) -> Tuple[bool, Optional[str]]:
+        """Returns whether the import name is a user module and the file of
+        the module, the file itself does not import the user module but the
+        module with the same name, e.g. a script named `requests.py` imports
+        the distribution `requests`."""
+        if name.startswith('.'):
+            return True, None
+        root_module_name = name.split('.')[0]
+        if root_module_name == self._project_name:
+            return True, None
+        if root_module_name in sys.builtin_module_names:
+            return False, None
+        for name in (name, root_module_name):
+            found, origin = self.find(name)
+            if found:
+                return True, origin
+        return False, None
 
-    module_path = spec.origin
-    if sys.version_info[:2] >= (3, 10) and not {name, name.split('.')[0]} & set(
-        sys.stdlib_module_names
-    ):
-        return False, module_path
+    def is_user_module(self, module: Module) -> bool:
+        is_user_module, origin = self.resolve(module.name)
+        return is_user_module and origin != module.file
 
-    if module_path is None or not os.path.isabs(module_path):
-        return True, None
 
-    if is_site_packages_path(module_path):
-        return False, module_path
+def _cache_check_stdlib(func):
+    checked = dict()
+
+    @functools.wraps(func)
+    def _wrapper(name, target_version=None):
+        key = (name, target_version)
+        if key not in checked:
+            checked[key] = func(name, target_version)
+        return checked[key]
+
+    return _wrapper
 
-    for sys_path in _sys_lib_paths:
-        if is_commonpath([sys_path, module_path], sys_path):
-            return True, None
 
-    return False, module_path
+@_cache_check_stdlib
+def check_stdlib(
+    name: str,
+    target_version: Optional[Tuple[int, int]] = None,
+) -> Tuple[bool, Optional[str]]:
+    """Check whether it is stdlib module of the target Python version,
+    returns the code path of the module if it is not a stdlib module.
+
+    Nothing is imported, the code path is searched in `sys.path`.
+    """
+    name = name.split('.')[0]
+    if is_stdlib_module(name, target_version):
+        return True, None
+    try:
+        spec = importlib.machinery.PathFinder.find_spec(name)
+    except Exception as e:
+        logger.debug('find_spec(%s) got unexpected error: %r', name, e)
+        spec = None
+    if spec is None or not spec.has_location:
+        return False, None
+    return False, spec.origin
@@ -1,10 +1,16 @@
 import os
 import os.path as pathlib
+import sys
+import csv
+import json
+import bisect
+import hashlib
 import re
 import tempfile
 from html.parser import HTMLParser
 from urllib.parse import urljoin, quote, urlparse
-from typing import Mapping, Set, List, NamedTuple, Optional, ValuesView
+from urllib.request import url2pathname
+from typing import Any, Iterable, Mapping, Set, List, NamedTuple, Optional, Tuple, ValuesView
 from html.parser import HTMLParser
 from urllib.parse import urljoin
 from collections import defaultdict
@@ -14,18 +20,17 @@ import asyncio
 from .log import logger
 from .helpers import (
     cmp_to_key,
-    trim_prefix,
     trim_suffix,
     InMemoryOrDiskFile,
-    is_commonpath,
 )
 from .unpack import parse_top_levels
+from .cache import cache_file_path, load_cache_file, dump_cache_file
+from .gitindex import find_git_work_tree, git_common_dir, read_git_head
 from .db import database
 from .version import version
 from ._vendor.distlib.database import DistributionPath, Distribution, EggInfoDistribution
 from ._vendor.distlib.locators import SimpleScrapingLocator
 from ._vendor.distlib.wheel import Wheel
-from ._vendor.pip._internal.vcs.versioncontrol import RemoteNotFoundError, RemoteNotValidError, vcs
 from ._vendor.pip._internal.exceptions import BadCommand, InstallationError
 from ._vendor.pip._vendor.packaging.version import Version, InvalidVersion
 from ._vendor.pip._vendor.packaging.utils import canonicalize_name, NormalizedName
@@ -82,99 +87,133 @@ class FrozenRequirement(object):
         editable: bool = False,
         url: str = "",
         comments: List[str] = [],
-        code_paths: Set[str] = set(),
+        code_paths: Optional[Set[str]] = None,
+        dist_path: str = "",
+        editable_location: str = "",
+        namespaces: Optional[Mapping[str, List[str]]] = None,
     ):
         self.name = name
         self.version = version
         self.canonical_name = canonicalize_name(name)
         self.modules = modules
         self.editable = editable
-        self.url = url
-        self.comments = comments
-        self.code_paths = code_paths
+        self._editable_info = None
+        self._editable_location = editable_location
+        if not editable_location:
+            self._editable_info = _EditableInfo(url, comments)
+        self._code_paths = code_paths
+        self._dist_path = dist_path
+        self._installed_files = None
+        # The known children of the namespace packages, e.g. from a snapshot.
+        self._namespaces = namespaces
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_installed_files"] = None
+        if self._editable_location:
+            # The VCS information is not stable, it is always probed again.
+            state["_editable_info"] = None
+        return state
+
+    @property
+    def editable_location(self) -> str:
+        """The project location of the editable distribution whose
+        requirement is probed from the VCS on first use."""
+        return self._editable_location
+
+    @property
+    def url(self) -> str:
+        return self.editable_info.requirement
+
+    @property
+    def comments(self) -> List[str]:
+        return self.editable_info.comments
+
+    @property
+    def editable_info(self) -> "_EditableInfo":
+        if self._editable_info is None:
+            self.set_editable_info(
+                _probe_editable_info(self._editable_location, self.name, self.version)
+            )
+        return self._editable_info
+
+    def set_editable_info(self, info: "_EditableInfo"):
+        self._editable_info = info
+
+    def _get_installed_files(self) -> List[str]:
+        if self._installed_files is None:
+            self._installed_files = []
+            if self._dist_path:
+                self._installed_files = _read_installed_files(
+                    self.name, self._dist_path, self._is_egg_info()
+                )
+        return self._installed_files
+
+    def _is_egg_info(self) -> bool:
+        return not trim_suffix(self._dist_path, os.sep).endswith(".dist-info")
+
+    @property
+    def code_paths(self) -> Set[str]:
+        """The top level paths of the installed files, they are found
+        from the installed files of the distribution on first use."""
+        if self._code_paths is None:
+            self._code_paths = set()
+            if self._dist_path:
+                self._code_paths = _find_code_paths(
+                    self._dist_path, self._get_installed_files()
+                )
+        return self._code_paths
+
+    def namespace_children(self, namespace: str) -> Set[str]:
+        """The names of the packages and modules installed by the distribution
+        directly under the (namespace) package, e.g. `cloud` for `google`."""
+        if self._namespaces is not None:
+            return set(self._namespaces.get(namespace, ()))
+        # The files of egg-info distributions are relative to the project.
+        if not self._dist_path or self._is_egg_info():
+            return set()
+        prefix = namespace.replace(".", "/") + "/"
+        children = set()
+        for file in self._get_installed_files():
+            file = file.strip().replace(os.sep, "/")
+            if not file.startswith(prefix):
+                continue
+            child, sep, _ = file[len(prefix):].partition("/")
+            if not sep:
+                # Modules, including the extension modules like `foo.cpython-312-x86_64-linux-gnu.so`.
+                child = child.split(".", 1)[0]
+            if child.isidentifier() and child != "__init__":
+                children.add(child)
+        return children
 
     @classmethod
     def from_dist(cls, dist):
         modules = set()
         editable = isinstance(dist, EggInfoDistribution)
-        url = ""
-        comments = []
-        installed_files = []
+        editable_location = ""
         if editable:
-            try:
-                req, comments = _get_editable_info(dist)
-                url = req
-            except Exception as e:
-                logger.error('distribution "%s" may be not editable: %r', dist.name, e)
+            editable_location = dist.path
             top_level_file = pathlib.join(dist.path, "top_level.txt")
             if os.path.exists(top_level_file):
                 with open(top_level_file, "rb") as f:
                     modules = set(f.read().decode("utf-8").splitlines())
-            sources_file = os.path.join(dist.path, "SOURCES.txt")
-            if os.path.exists(sources_file):
-                with open(sources_file, mode="r", encoding="utf-8") as f:
-                    installed_files = f.readlines()
         else:
-            # read from RECORD file
-            try:
-                installed_files = [finfo[0] for finfo in dist.list_installed_files()]
-            except Exception as e:
-                logger.error(
-                    'distribution "%s" seems does not have a RECORD file: %r',
-                    dist.name,
-                    e,
-                )
-                installed_files = []
+            # PEP 610/660 editable installs.
+            editable_location = _read_direct_url_editable_location(dist.path) or ""
+            editable = bool(editable_location)
             modules = set(dist.modules)
             modules = _maybe_include_project_name_as_import_name(modules, dist.name)
             modules |= _get_hardcode_distributions_import_names(dist.name)
 
-        dist_path = trim_suffix(dist.path, os.sep)
-        root_dir = os.path.dirname(dist_path)
-        dist_info_dir = os.path.basename(dist_path)
-        code_paths = set()
-        code_file_dir = os.pardir
-        for file in installed_files:
-            file = file.strip()
-            if not file or os.path.isabs(file):
-                continue
-            if not any(
-                [
-                    is_commonpath(
-                        [code_file_dir, file], code_file_dir
-                    ),  # Fast path to skip the same path prefix.
-                    is_commonpath([dist_info_dir, file], dist_info_dir),
-                    is_commonpath([os.pardir, file], os.pardir),
-                    is_commonpath([os.curdir, file], os.curdir),
-                    file.startswith("__"),
-                ]
-            ):
-                code_file_dir = trim_prefix(file, os.sep).split(os.sep)[0]
-                if not code_file_dir or os.path.isabs(code_file_dir):
-                    code_file_dir = os.pardir
-                    continue
-                code_path = os.path.join(root_dir, code_file_dir)
-                if os.path.exists(code_path):
-                    code_paths.add(code_path)
-
         return cls(
             dist.name,
             dist.version,
             list(modules),
             editable,
-            url,
-            comments=comments,
-            code_paths=code_paths,
+            dist_path=dist.path,
+            editable_location=editable_location,
         )
 
-    def contains_file(self, file):
-        if not self.code_paths or not file:
-            return False
-        for code_path in self.code_paths:
-            if is_commonpath([code_path, file], code_path):
-                return True
-        return False
-
     def as_requirement(
         self, operator: str = "==", spaces_around_operator: str = ""
     ) -> str:
@@ -194,10 +233,56 @@ class FrozenRequirement(object):
 
     def __repr__(self):
         modules = " ".join(self.modules)
-        code_paths = " ".join(self.code_paths or [])
+        code_paths = " ".join(self._code_paths or [])
         return f"<{self.name} {self.version}  [{modules}]  [{code_paths}]>"
 
 
+def _read_installed_files(name: str, dist_path: str, egg_info: bool) -> List[str]:
+    """Read the installed files listed in the RECORD file (SOURCES.txt for
+    egg-info) of the distribution."""
+    files = []
+    if egg_info:
+        sources_file = os.path.join(dist_path, "SOURCES.txt")
+        if os.path.exists(sources_file):
+            with open(sources_file, mode="r", encoding="utf-8") as f:
+                files = f.readlines()
+    else:
+        try:
+            with open(os.path.join(dist_path, "RECORD"), newline="", encoding="utf-8") as f:
+                files = [row[0] for row in csv.reader(f) if row]
+        except Exception as e:
+            logger.error(
+                'distribution "%s" seems does not have a RECORD file: %r',
+                name,
+                e,
+            )
+    return files
+
+
+def _find_code_paths(dist_path: str, files: List[str]) -> Set[str]:
+    """Find the top level paths of the installed files."""
+    dist_path = trim_suffix(dist_path, os.sep)
+    root_dir, dist_info_dir = os.path.split(dist_path)
+
+    # Group the files by the first path component.
+    top_levels = set()
+    for file in files:
+        file = file.strip()
+        if not file or os.path.isabs(file):
+            continue
+        top_levels.add(file.replace(os.sep, "/").lstrip("/").split("/", 1)[0])
+    top_levels -= {"", os.curdir, os.pardir, dist_info_dir}
+
+    code_paths = set()
+    for top_level in top_levels:
+        if top_level.startswith("__"):
+            continue
+        code_path = os.path.join(root_dir, top_level)
+        if os.path.exists(code_path):
+            code_paths.add(code_path)
+    return code_paths
+
+
 def installed_distributions_by_top_level_import_names(
     distributions: Optional[ValuesView[FrozenRequirement]] = None,
 ) -> Mapping[str, List[FrozenRequirement]]:
@@ -211,18 +296,307 @@ def installed_distributions_by_top_level_import_names(
     return mapping
 
 
-def installed_distributions() -> Mapping[NormalizedName, FrozenRequirement]:
+class ImportNameTrie(object):
+    """ImportNameTrie maps dotted import names to values, a name is
+    resolved by its longest dotted prefix in O(depth)."""
+
+    class _Node(object):
+        __slots__ = ("children", "values")
+
+        def __init__(self):
+            self.children = dict()
+            self.values = []
+
+    def __init__(self):
+        self._root = self._Node()
+
+    def insert(self, name: str, value: Any):
+        node = self._root
+        for part in name.split("."):
+            child = node.children.get(part, None)
+            if child is None:
+                child = node.children[part] = self._Node()
+            node = child
+        if value not in node.values:
+            node.values.append(value)
+
+    def longest_prefix(self, name: str) -> Tuple[str, List[Any]]:
+        """Returns the longest dotted prefix of the name in the trie and
+        its values, or an empty prefix if none matches."""
+        node = self._root
+        parts = name.split(".")
+        matched = ("", [])
+        for i, part in enumerate(parts):
+            node = node.children.get(part, None)
+            if node is None:
+                break
+            if node.values:
+                matched = (".".join(parts[:i + 1]), node.values)
+        return matched
+
+
+class ImportNameIndex(object):
+    """ImportNameIndex resolves import names to the installed distributions
+    by the longest dotted prefix of their top level names.
+
+    The names shared by several distributions (namespace packages such as
+    `google` and `azure`) are refined on demand with the packages under them
+    found in the installed files of each distribution, so `google.protobuf`
+    is resolved to protobuf rather than all the distributions of `google`.
+    """
+
+    def __init__(self, distributions: Iterable[FrozenRequirement]):
+        self._trie = ImportNameTrie()
+        self._refined = set()
+        for req in distributions:
+            for module in req.modules:
+                self._trie.insert(module, req)
+
+    def lookup(self, name: str) -> Tuple[str, List[FrozenRequirement]]:
+        """Returns the matched import name and the distributions, or an
+        empty name if no distribution provides the name."""
+        while True:
+            prefix, reqs = self._trie.longest_prefix(name)
+            if len(reqs) <= 1 or prefix == name or prefix in self._refined:
+                return prefix, list(reqs)
+            self._refined.add(prefix)
+            for req in reqs:
+                for child in req.namespace_children(prefix):
+                    self._trie.insert(f"{prefix}.{child}", req)
+
+
+def narrow_distributions_by_import_names(
+    distributions: List[Any], import_names: Iterable[str]
+) -> List[Any]:
+    """Narrow the distributions (from the index database) sharing a top
+    level name down to the ones whose names match the longest dotted prefixes
+    of the import names, e.g. `google-cloud-storage` for
+    `google.cloud.storage`. All of them are returned if any import name
+    matches none of them."""
+    if len(distributions) <= 1:
+        return distributions
+    trie = ImportNameTrie()
+    for dist in distributions:
+        trie.insert(_dotted_name(dist.name), dist)
+    matched = []
+    for import_name in import_names:
+        prefix, dists = trie.longest_prefix(_dotted_name(import_name))
+        # The top level name alone matches nothing specific.
+        if "." not in prefix:
+            return distributions
+        matched.extend(d for d in dists if d not in matched)
+    return matched or distributions
+
+
+def _dotted_name(name: str, _separator_re=re.compile(r"[-_.]+")) -> str:
+    return _separator_re.sub(".", name).lower()
+
+
+class DistributionPathIndex(object):
+    """DistributionPathIndex maps the installed files to the distributions
+    which own them, by the longest code path containing the file.
+
+    The code paths are kept sorted with a trailing separator, so the owning
+    code path of a file is found by a binary search instead of comparing
+    the file against the code paths of every distribution.
+    """
+
+    def __init__(self, distributions: Iterable[FrozenRequirement]):
+        owners = defaultdict(list)
+        for req in distributions:
+            for code_path in req.code_paths or ():
+                owners[self._normalize(code_path)].append(req)
+        self._owners = dict(owners)
+        self._prefixes = sorted(owners)
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        path = os.path.normcase(os.path.abspath(path))
+        return trim_suffix(path, os.sep) + os.sep
+
+    def find(self, file: str) -> List[FrozenRequirement]:
+        """Returns the distributions owning the file, more than one
+        distribution means the file is claimed by all of them."""
+        if not file:
+            return []
+        prefixes = self._prefixes
+        path = self._normalize(file)
+        while path:
+            i = bisect.bisect_right(prefixes, path) - 1
+            if i < 0:
+                break
+            prefix = prefixes[i]
+            if path.startswith(prefix):
+                return list(self._owners[prefix])
+            # The nested code paths are sorted between the owning code path
+            # and the file, retry with their common parent directory.
+            common = os.path.commonprefix([prefix, path])
+            path = common[:common.rfind(os.sep) + 1]
+        return []
+
+    def conflicts(self) -> Mapping[str, List[FrozenRequirement]]:
+        """The code paths claimed by more than one distribution."""
+        return {
+            prefix.rstrip(os.sep) or os.sep: list(reqs)
+            for prefix, reqs in self._owners.items() if len(reqs) > 1
+        }
+
+
+def installed_distributions(
+    cache_dir: Optional[str] = None,
+    paths: Optional[List[str]] = None,
+) -> Mapping[NormalizedName, FrozenRequirement]:
+    """Mapping of canonical name to installed distributions in the paths
+    (sys.path by default), the scanned distributions are cached in the
+    cache directory if given."""
     mapping = dict()
-    dist_path = DistributionPath(include_egg=True)
-    for distribution in dist_path.get_distributions():
-        req = FrozenRequirement.from_dist(distribution)
+    for req in _scan_installed_distributions(
+        sys.path if paths is None else paths, cache_dir
+    ):
         logger.debug("found local distribution: %r", req)
         mapping[req.canonical_name] = req
     return mapping
 
 
-def _format_dist_as_name_version(dist: Distribution):
-    return "{}=={}".format(dist.name, dist.version)
+def installed_distributions_fingerprint(
+    distributions: Iterable[FrozenRequirement],
+) -> str:
+    """A hash of the installed distributions, it changes if a distribution
+    is installed, removed, upgraded or moved."""
+    h = hashlib.sha1()
+    for req in sorted(distributions, key=lambda req: req.canonical_name):
+        state = (
+            req.name,
+            req.version,
+            sorted(req.modules),
+            req.editable,
+            # The VCS information of editable installs is not probed.
+            req.editable_location or (req.url if req.editable else ""),
+            req._dist_path,
+            sorted(req._code_paths) if req._code_paths is not None else None,
+        )
+        h.update(repr(state).encode("utf-8", "surrogateescape"))
+    return h.hexdigest()
+
+
+def _frozen_requirements(dists: Iterable[Distribution]) -> List[FrozenRequirement]:
+    """Build the requirements in threads to overlap the file reads."""
+    dists = list(dists)
+    if len(dists) <= 1:
+        return [FrozenRequirement.from_dist(d) for d in dists]
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(_SCAN_WORKERS, len(dists))
+    ) as executor:
+        return list(executor.map(FrozenRequirement.from_dist, dists))
+
+
+_SCAN_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+
+class _DistributionStat(NamedTuple):
+    ino: int
+    mtime_ns: int
+
+
+class _CachedDistribution(NamedTuple):
+    path: str
+    stat: Optional[_DistributionStat]
+    requirement: FrozenRequirement
+
+
+class _CachedSysPathEntry(NamedTuple):
+    # The sorted listing of a directory, or the stat of a file (zip).
+    state: Any
+    distributions: List[_CachedDistribution]
+
+
+def _sys_path_entry_state(path: str) -> Any:
+    try:
+        if os.path.isdir(path):
+            return tuple(sorted(os.listdir(path)))
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+def _distribution_stat(path: str) -> Optional[_DistributionStat]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        # Distributions inside zip files, the state of the zip file is enough.
+        return None
+    return _DistributionStat(st.st_ino, st.st_mtime_ns)
+
+
+def _scan_installed_distributions(
+    paths: List[str], cache_dir: Optional[str] = None
+) -> List[FrozenRequirement]:
+    """Scan the distributions of the paths in parallel. With the cache, the
+    distributions of a path are rescanned if the listing of the path changes,
+    and a distribution is rebuilt if its metadata directory changes."""
+    paths = list(dict.fromkeys(paths))
+    cache_path = None
+    cached_entries = {}
+    if cache_dir is not None:
+        cache_path = cache_file_path(cache_dir, "dists", tuple(paths))
+        cached_entries = load_cache_file(cache_path) or {}
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, min(_SCAN_WORKERS, len(paths)))
+    ) as executor:
+        entries = list(
+            executor.map(
+                lambda path: _scan_sys_path_entry(path, cached_entries.get(path, None)),
+                paths,
+            )
+        )
+
+    if cache_path is not None:
+        dirty = len(entries) != len(cached_entries) or any(
+            cached_entries.get(path, None) is not entry for path, entry in zip(paths, entries)
+        )
+        if dirty:
+            try:
+                dump_cache_file(cache_path, dict(zip(paths, entries)))
+            except OSError as e:
+                logger.warning("save distributions cache %s failed: %r", cache_path, e)
+    return [d.requirement for entry in entries for d in entry.distributions]
+
+
+def _scan_sys_path_entry(
+    path: str, cached: Optional[_CachedSysPathEntry]
+) -> _CachedSysPathEntry:
+    """Returns the cached entry itself if nothing changes."""
+    state = _sys_path_entry_state(path)
+    previous = {}
+    if cached is not None:
+        previous = {
+            d.path: d for d in cached.distributions
+            if _distribution_stat(d.path) == d.stat
+        }
+        if cached.state == state and len(previous) == len(cached.distributions):
+            return cached
+
+    dists = []
+    rebuilds = []
+    for dist in DistributionPath([path], include_egg=True).get_distributions():
+        cached_dist = previous.get(dist.path, None)
+        if cached_dist is None:
+            rebuilds.append(dist)
+            cached_dist = _CachedDistribution(
+                dist.path, _distribution_stat(dist.path), None
+            )
+        dists.append(cached_dist)
+    rebuilt = iter(_frozen_requirements(rebuilds))
+    for i, cached_dist in enumerate(dists):
+        if cached_dist.requirement is None:
+            dists[i] = cached_dist._replace(requirement=next(rebuilt))
+    return _CachedSysPathEntry(state, dists)
+
+
+def _format_name_version(name: str, version: str):
+    return "{}=={}".format(name, version)
 
 
 class _EditableInfo(NamedTuple):
@@ -230,23 +604,130 @@ class _EditableInfo(NamedTuple):
     comments: List[str]
 
 
-def _get_editable_info(dist: EggInfoDistribution) -> _EditableInfo:
+def _read_direct_url_editable_location(dist_path: str) -> Optional[str]:
+    """Read the project location of an editable install from the
+    direct_url.json (PEP 610) of the distribution."""
+    try:
+        with open(os.path.join(dist_path, "direct_url.json"), "rb") as f:
+            direct_url = json.loads(f.read().decode("utf-8"))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("read direct_url.json in %s failed: %r", dist_path, e)
+        return None
+    if not isinstance(direct_url, dict) or not isinstance(direct_url.get("url"), str):
+        return None
+    dir_info = direct_url.get("dir_info", None)
+    if not isinstance(dir_info, dict) or not dir_info.get("editable", False):
+        return None
+    parsed = urlparse(direct_url["url"])
+    if parsed.scheme != "file":
+        return None
+    return url2pathname(parsed.path)
+
+
+def _git_repository_state(location: str) -> Optional[Tuple[str, int]]:
+    """The HEAD commit and the config mtime of the git repository containing
+    the location, the probed VCS information is unchanged if they are the same."""
+    found = find_git_work_tree(location)
+    if found is None:
+        return None
+    git_dir = found[1]
+    head = read_git_head(git_dir)
+    if head is None:
+        return None
+    try:
+        config_mtime_ns = os.stat(os.path.join(git_common_dir(git_dir), "config")).st_mtime_ns
+    except OSError:
+        return None
+    return head, config_mtime_ns
+
+
+def resolve_editable_requirements(
+    reqs: Iterable[FrozenRequirement], cache_dir: Optional[str] = None
+):
+    """Probe the VCS information of the editable requirements concurrently,
+    the results are cached by the HEADs of the git repositories if the cache
+    directory is given."""
+    pending = {
+        id(req): req for req in reqs
+        if req.editable_location and req._editable_info is None
+    }
+    if not pending:
+        return
+    cache_path = None
+    cached = {}
+    if cache_dir is not None:
+        cache_path = cache_file_path(cache_dir, "editables")
+        cached = load_cache_file(cache_path) or {}
+
+    probes = []
+    for req in pending.values():
+        key = (req.editable_location, req.name, req.version)
+        state = _git_repository_state(req.editable_location)
+        entry = cached.get(key, None)
+        if state is not None and entry is not None and entry[0] == state:
+            req.set_editable_info(entry[1])
+        else:
+            probes.append((req, key, state))
+    if not probes:
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(_SCAN_WORKERS, len(probes))
+    ) as executor:
+        infos = list(
+            executor.map(
+                lambda probe: _probe_editable_info(
+                    probe[0].editable_location, probe[0].name, probe[0].version
+                ),
+                probes,
+            )
+        )
+    for (req, key, state), info in zip(probes, infos):
+        req.set_editable_info(info)
+        if state is not None:
+            cached[key] = (state, info)
+    if cache_path is not None:
+        try:
+            dump_cache_file(cache_path, cached)
+        except OSError as e:
+            logger.warning("save editables cache %s failed: %r", cache_path, e)
+
+
+def _probe_editable_info(location: str, name: str, version: str) -> _EditableInfo:
+    try:
+        return _get_editable_info(location, name, version)
+    except Exception as e:
+        logger.error('distribution "%s" may be not editable: %r', name, e)
+        return _EditableInfo(requirement="", comments=[])
+
+
+def _get_editable_info(
+    editable_project_location: str, name: str, version: str
+) -> _EditableInfo:
     """
     Compute and return values (req, comments) for use in
-    FrozenRequirement.from_dist().
+    FrozenRequirement.editable_info.
 
     Ref: https://github.com/pypa/pip/blob/90f51db1a32592430f2e4f6fbb9efa7a3a249423/src/pip/_internal/operations/freeze.py#L153
     """
-    editable_project_location = dist.path
+    # Importing the VCS backends takes a while, only the editables need them.
+    from ._vendor.pip._internal.vcs.versioncontrol import (
+        RemoteNotFoundError,
+        RemoteNotValidError,
+        vcs,
+    )
+
     assert editable_project_location
     location = pathlib.normcase(pathlib.abspath(editable_project_location))
+    display = _format_name_version(name, version)
     if not pathlib.exists(location):
-        return _EditableInfo(requirement="", comments=[f"# Editable not found: {dist}"])
+        return _EditableInfo(requirement="", comments=[f"# Editable not found: {display}"])
 
     vcs_backend = vcs.get_backend_for_dir(location)
 
     if vcs_backend is None:
-        display = _format_dist_as_name_version(dist)
         logger.debug(
             'No VCS found for editable requirement "%s" in: %r',
             display,
@@ -260,15 +741,13 @@ def _get_editable_info(dist: EggInfoDistribution) -> _EditableInfo:
     vcs_name = type(vcs_backend).__name__
 
     try:
-        req = vcs_backend.get_src_requirement(location, dist.name)
+        req = vcs_backend.get_src_requirement(location, name)
     except RemoteNotFoundError:
-        display = _format_dist_as_name_version(dist)
         return _EditableInfo(
             requirement=location,
             comments=[f"# Editable {vcs_name} install with no remote ({display})"],
         )
     except RemoteNotValidError as ex:
-        display = _format_dist_as_name_version(dist)
         return _EditableInfo(
             requirement=location,
             comments=[
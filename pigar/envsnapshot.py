@@ -0,0 +1,148 @@
+import sys
+import json
+import hashlib
+import collections
+from typing import IO, Any, Dict, Iterable, List, Mapping, Optional
+
+from .dist import FrozenRequirement, resolve_editable_requirements
+from ._vendor.pip._vendor.packaging.utils import NormalizedName
+
+SNAPSHOT_FORMAT = "pigar-env-snapshot"
+SNAPSHOT_VERSION = 2
+
+
+class EnvSnapshotError(Exception):
+    pass
+
+
+def dump_env_snapshot(
+    distributions: Iterable[FrozenRequirement],
+    fp: IO[str],
+    cache_dir: Optional[str] = None,
+    python_version: Optional[str] = None,
+):
+    """Write the installed distributions as a JSON snapshot, which can be
+    loaded by `load_env_snapshot` instead of scanning the environment.
+
+    The VCS information of the editable distributions is probed, so the
+    snapshot has the same requirements as the environment. The children of
+    the namespace packages shared by the distributions are recorded, so the
+    import names are resolved the same as the environment. The Python
+    version is the running one by default.
+    """
+    distributions = sorted(distributions, key=lambda req: req.canonical_name)
+    resolve_editable_requirements(distributions, cache_dir=cache_dir)
+    namespaces = _shared_namespaces(distributions)
+    dists = [
+        _dump_distribution(req, namespaces.get(req.canonical_name, None))
+        for req in distributions
+    ]
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "python": python_version or "{}.{}".format(*sys.version_info[:2]),
+        "hash": _content_hash(dists),
+    }
+    # The header comes first and each distribution takes a line.
+    fp.write(json.dumps(header)[:-1] + ', "distributions": [\n')
+    fp.write(",\n".join(json.dumps(dist) for dist in dists))
+    fp.write("\n]}\n")
+
+
+def load_env_snapshot(fp: IO[str]) -> Mapping[NormalizedName, FrozenRequirement]:
+    """Load the installed distributions from a snapshot written by
+    `dump_env_snapshot`, keyed by the canonical names."""
+    try:
+        snapshot = json.load(fp)
+    except ValueError as e:
+        raise EnvSnapshotError(f"invalid JSON: {e}") from e
+    if not isinstance(snapshot, dict) or snapshot.get("format") != SNAPSHOT_FORMAT:
+        raise EnvSnapshotError("not an environment snapshot")
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        raise EnvSnapshotError(
+            f"unsupported snapshot version: {snapshot.get('version')!r}"
+        )
+    dists = snapshot.get("distributions", None)
+    if not isinstance(dists, list):
+        raise EnvSnapshotError("no distributions")
+    if snapshot.get("hash") != _content_hash(dists):
+        raise EnvSnapshotError("content hash mismatch")
+
+    mapping = dict()
+    for dist in dists:
+        try:
+            req = _load_distribution(dist)
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise EnvSnapshotError(f"invalid distribution {dist!r}: {e!r}") from e
+        mapping[req.canonical_name] = req
+    return mapping
+
+
+def _shared_namespaces(
+    distributions: List[FrozenRequirement],
+) -> Dict[NormalizedName, Dict[str, List[str]]]:
+    """The children of the packages shared by several distributions, which
+    `ImportNameIndex` refines with `FrozenRequirement.namespace_children`."""
+    owners = collections.defaultdict(list)
+    for req in distributions:
+        for module in req.modules:
+            owners[module].append(req)
+    pending = [(name, reqs) for name, reqs in owners.items() if len(reqs) > 1]
+    namespaces = collections.defaultdict(dict)
+    while pending:
+        namespace, reqs = pending.pop()
+        children = collections.defaultdict(list)
+        for req in reqs:
+            names = sorted(req.namespace_children(namespace))
+            namespaces[req.canonical_name][namespace] = names
+            for name in names:
+                children[name].append(req)
+        pending.extend(
+            (f"{namespace}.{name}", reqs)
+            for name, reqs in children.items() if len(reqs) > 1
+        )
+    return namespaces
+
+
+def _dump_distribution(
+    req: FrozenRequirement, namespaces: Optional[Dict[str, List[str]]]
+) -> Dict[str, Any]:
+    dist = {
+        "name": req.name,
+        "version": req.version,
+        "modules": sorted(req.modules),
+        "code_paths": sorted(req.code_paths),
+    }
+    if namespaces:
+        dist["namespaces"] = dict(sorted(namespaces.items()))
+    if req.editable:
+        dist["editable"] = {"url": req.url, "comments": list(req.comments)}
+    return dist
+
+
+def _load_distribution(dist: Dict[str, Any]) -> FrozenRequirement:
+    editable = dist.get("editable", None)
+    return FrozenRequirement(
+        str(dist["name"]),
+        str(dist["version"]),
+        _str_list(dist.get("modules", [])),
+        editable is not None,
+        url=str(editable["url"]) if editable else "",
+        comments=_str_list(editable.get("comments", [])) if editable else [],
+        code_paths=set(_str_list(dist.get("code_paths", []))),
+        namespaces={
+            str(namespace): _str_list(children)
+            for namespace, children in dist.get("namespaces", {}).items()
+        },
+    )
+
+
+def _str_list(value: Any) -> List[str]:
+    if not isinstance(value, list):
+        raise TypeError(f"expecting a list: {value!r}")
+    return [str(v) for v in value]
+
+
+def _content_hash(dists: List[Any]) -> str:
+    content = json.dumps(dists, sort_keys=True, separators=(",", ":"))
+    return "sha256:" + hashlib.sha256(content.encode("utf-8")).hexdigest()
@@ -0,0 +1,280 @@
+import os
+import re
+import struct
+import subprocess
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .log import logger
+
+
+class GitIndexError(Exception):
+    pass
+
+
+class GitCommandError(Exception):
+    pass
+
+
+class IndexEntry(NamedTuple):
+    path: str  # Relative to the root of the work tree, separated by `/`.
+    mode: int
+    size: int
+    mtime_ns: int
+    sha1: str
+
+
+_HEADER = struct.Struct(">4sII")
+# ctime, mtime (seconds and nanoseconds), dev, ino, mode, uid, gid, size, sha1, flags
+_ENTRY = struct.Struct(">IIIIIIIIII20sH")
+_EXTENDED_FLAG = 0x4000
+_STAGE_MASK = 0x3000
+_REGULAR_FILE_MODES = (0o100644, 0o100755)
+_SHA1_regex = re.compile(r"[0-9a-f]{40}")
+
+
+def find_git_work_tree(path: str) -> Optional[Tuple[str, str]]:
+    """Find the git work tree containing the path, returns the root
+    of the work tree and the git directory."""
+    path = os.path.abspath(path)
+    while True:
+        dot_git = os.path.join(path, ".git")
+        if os.path.isdir(dot_git):
+            return path, dot_git
+        if os.path.isfile(dot_git):
+            # Work trees and submodules have a `gitdir: <path>` file.
+            try:
+                with open(dot_git, "r", encoding="utf-8") as f:
+                    content = f.read().strip()
+            except OSError:
+                return None
+            if not content.startswith("gitdir:"):
+                return None
+            git_dir = os.path.join(path, content[len("gitdir:"):].strip())
+            return path, os.path.normpath(git_dir)
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def git_common_dir(git_dir: str) -> str:
+    """The directory shared by all work trees, which has the refs
+    and the config."""
+    try:
+        with open(os.path.join(git_dir, "commondir"), "r", encoding="utf-8") as f:
+            return os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    except OSError:
+        return git_dir
+
+
+def read_git_head(git_dir: str) -> Optional[str]:
+    """Resolve the commit SHA-1 of HEAD without running git, returns None
+    if it can not be resolved (e.g. an unborn branch)."""
+    common_dir = git_common_dir(git_dir)
+    try:
+        with open(os.path.join(git_dir, "HEAD"), "r", encoding="utf-8") as f:
+            head = f.read().strip()
+    except OSError:
+        return None
+    # Symbolic refs may point to other symbolic refs.
+    for _ in range(5):
+        if not head.startswith("ref:"):
+            return head if _SHA1_regex.fullmatch(head) else None
+        head = _read_git_ref(git_dir, common_dir, head[len("ref:"):].strip())
+        if head is None:
+            return None
+    return None
+
+
+def _read_git_ref(git_dir: str, common_dir: str, ref: str) -> Optional[str]:
+    for ref_dir in (git_dir, common_dir):
+        try:
+            with open(os.path.join(ref_dir, *ref.split("/")), "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except OSError:
+            pass
+    try:
+        with open(os.path.join(common_dir, "packed-refs"), "r", encoding="utf-8") as f:
+            for line in f:
+                sha1, _, name = line.strip().partition(" ")
+                if name == ref:
+                    return sha1
+    except OSError:
+        pass
+    return None
+
+
+def read_git_index(index_path: str) -> Iterator[IndexEntry]:
+    """Read the entries from a git index file (versions 2, 3 and 4),
+    the unmerged entries are skipped.
+
+    See https://git-scm.com/docs/index-format for details.
+    """
+    with open(index_path, "rb") as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        raise GitIndexError(f"truncated git index: {index_path}")
+    signature, index_version, count = _HEADER.unpack_from(data, 0)
+    if signature != b"DIRC" or index_version not in (2, 3, 4):
+        raise GitIndexError(
+            f"unsupported git index: {index_path} (version {index_version})"
+        )
+
+    offset = _HEADER.size
+    prev_path = b""
+    for _ in range(count):
+        if offset + _ENTRY.size > len(data):
+            raise GitIndexError(f"truncated git index: {index_path}")
+        fields = _ENTRY.unpack_from(data, offset)
+        mtime_s, mtime_ns, mode, size, sha1, flags = (
+            fields[2], fields[3], fields[6], fields[9], fields[10], fields[11]
+        )
+        entry_start = offset
+        offset += _ENTRY.size
+        if index_version >= 3 and flags & _EXTENDED_FLAG:
+            offset += 2
+
+        if index_version == 4:
+            # The path is prefix compressed against the previous one.
+            strip, offset = _read_offset_varint(data, offset)
+            end = data.index(b"\0", offset)
+            path = prev_path[:len(prev_path) - strip] + data[offset:end]
+            offset = end + 1
+        else:
+            end = data.index(b"\0", offset)
+            path = data[offset:end]
+            # Entries are padded with 1-8 NUL bytes to a multiple of 8 bytes.
+            offset = entry_start + ((end - entry_start) // 8 + 1) * 8
+        prev_path = path
+
+        if flags & _STAGE_MASK:
+            continue
+        yield IndexEntry(
+            path.decode("utf-8", "surrogateescape"),
+            mode,
+            size,
+            mtime_s * 10**9 + mtime_ns,
+            sha1.hex(),
+        )
+
+
+def _read_offset_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    # The variable width integer used by git for offsets.
+    byte = data[offset]
+    offset += 1
+    value = byte & 0x7F
+    while byte & 0x80:
+        byte = data[offset]
+        offset += 1
+        value = ((value + 1) << 7) | (byte & 0x7F)
+    return value, offset
+
+
+def list_tracked_files(
+    root: str, suffixes: Optional[Tuple[str, ...]] = None
+) -> Optional[Dict[str, Optional[str]]]:
+    """List the tracked regular files under the root from the git index,
+    returns None if the root is not inside a git work tree. Only the files
+    with the suffixes are listed if the suffixes are given.
+
+    The files are mapped to their git blob SHA-1s if the files are unchanged
+    since they were staged, otherwise None.
+    """
+    found = find_git_work_tree(root)
+    if found is None:
+        return None
+    work_tree, git_dir = found
+    index_path = os.path.join(git_dir, "index")
+    try:
+        index_mtime = os.stat(index_path).st_mtime
+    except OSError as e:
+        logger.warning("stat git index %s failed: %r", index_path, e)
+        return None
+
+    root = os.path.abspath(root)
+    prefix = os.path.relpath(root, work_tree).replace(os.sep, "/") + "/"
+    if prefix == "./":
+        prefix = ""
+    files: Dict[str, Optional[str]] = {}
+    try:
+        for entry in read_git_index(index_path):
+            if not entry.path.startswith(prefix):
+                continue
+            if entry.mode not in _REGULAR_FILE_MODES:
+                # Symbolic links and submodules.
+                continue
+            if suffixes is not None and not entry.path.endswith(suffixes):
+                continue
+            fpath = os.path.join(root, *entry.path[len(prefix):].split("/"))
+            try:
+                st = os.stat(fpath)
+            except OSError:
+                # Deleted or not checked out (sparse checkout).
+                continue
+            files[fpath] = entry.sha1 if _is_clean(entry, st, index_mtime) else None
+    except (OSError, ValueError, IndexError, GitIndexError) as e:
+        logger.warning("read git index %s failed: %r", index_path, e)
+        return None
+    return files
+
+
+def _is_clean(entry: IndexEntry, st: os.stat_result, index_mtime: float) -> bool:
+    if entry.size != st.st_size:
+        return False
+    mtime_s, mtime_ns = divmod(entry.mtime_ns, 10**9)
+    if mtime_s != int(st.st_mtime):
+        return False
+    # Git may be built without the nanosecond timestamps.
+    if mtime_ns != 0 and mtime_ns != st.st_mtime_ns % 10**9:
+        return False
+    # Same as git, a file modified in the same second after it was staged
+    # is racily clean, the index SHA-1 can not be trusted.
+    return mtime_s < int(index_mtime)
+
+
+def git_rev_parse(root: str, ref: str) -> str:
+    """Resolve the commit SHA-1 of the ref by the git command."""
+    output = _run_git(root, "rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}")
+    return output.decode("utf-8").strip()
+
+
+def git_changed_files(root: str, ref: str) -> Tuple[List[str], List[str]]:
+    """Find the files under the root which are changed in the work tree since
+    the ref (including the deleted files, renames are a deletion and an
+    addition), and the untracked files, by the git command.
+
+    The returned paths are absolute.
+    """
+    changed = _run_git(
+        root, "diff", "--name-only", "--no-renames", "--relative", "-z", ref, "--"
+    )
+    untracked = _run_git(root, "ls-files", "--others", "--exclude-standard", "-z")
+    return _split_paths(root, changed), _split_paths(root, untracked)
+
+
+def _split_paths(root: str, output: bytes) -> List[str]:
+    root = os.path.abspath(root)
+    return [
+        os.path.join(root, *os.fsdecode(path).split("/"))
+        for path in output.split(b"\0")
+        if path
+    ]
+
+
+def _run_git(root: str, *args: str) -> bytes:
+    try:
+        proc = subprocess.run(
+            ("git",) + args,
+            cwd=root,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except OSError as e:
+        raise GitCommandError(f"run git failed: {e!r}") from e
+    if proc.returncode != 0:
+        stderr = proc.stderr.decode("utf-8", "replace").strip()
+        raise GitCommandError(
+            f"git {' '.join(args)} exited with {proc.returncode}: {stderr}"
+        )
+    return proc.stdout
@@ -10,9 +10,6 @@ import contextlib
 import dataclasses
 from typing import Optional, List, Generator, Callable
 
-from ._vendor.pip._internal.req.req_file import get_file_content
-from ._vendor.pip._internal.req.constructors import parse_req_from_line
-from ._vendor.pip._internal.network.session import PipSession
 from ._vendor.pip._internal.exceptions import InstallationError
 
 from ._vendor.pip._vendor.packaging.version import Version
@@ -129,6 +126,11 @@ class ParsedRequirementParts(object):
 
 def parse_requirements(fpath) -> Generator[ParsedRequirementParts, None, None]:
     """Parse requirements file."""
+    # Importing them takes a while, they are not needed by the other commands.
+    from ._vendor.pip._internal.req.req_file import get_file_content
+    from ._vendor.pip._internal.req.constructors import parse_req_from_line
+    from ._vendor.pip._internal.network.session import PipSession
+
     referenced_files = set()
 
     with contextlib.closing(PipSession()) as pip_session:
@@ -0,0 +1,165 @@
+import re
+import json
+from typing import Iterator, List, Optional
+
+from .log import logger
+
+import nbformat
+
+_WHITESPACE_regex = re.compile(rb"[ \t\n\r]*")
+_DELIMITER_regex = re.compile(rb'[\[\]{}"]')
+_SCALAR_regex = re.compile(rb"[^,\]}\s]+")
+
+
+def read_code_cells(raw: bytes) -> List[str]:
+    """Read the sources of the code cells of a Jupyter notebook.
+
+    Only the cell types and sources are decoded, the outputs and other
+    fields are skipped. nbformat is used for the notebooks in older formats
+    or the malformed ones.
+    """
+    try:
+        cells = _scan_code_cells(raw)
+    except (ValueError, IndexError, AttributeError) as e:
+        logger.debug("scan notebook failed, fall back to nbformat: %r", e)
+        cells = None
+    if cells is None:
+        nb = nbformat.reads(raw.decode("utf-8"), as_version=4)
+        cells = [cell.source for cell in nb.cells if cell.cell_type == "code"]
+    return cells
+
+
+def _scan_code_cells(raw: bytes) -> Optional[List[str]]:
+    scanner = _JSONScanner(raw)
+    cells = None
+    nbformat_version = None
+    for key in scanner.members():
+        if key == "nbformat":
+            nbformat_version = scanner.decode()
+        elif key == "cells":
+            cells = []
+            for _ in scanner.items():
+                cell_type, source = None, ""
+                for cell_key in scanner.members():
+                    if cell_key == "cell_type":
+                        cell_type = scanner.decode()
+                    elif cell_key == "source":
+                        source = scanner.decode()
+                    else:
+                        scanner.skip()
+                if cell_type != "code":
+                    continue
+                if isinstance(source, list):
+                    source = "".join(source)
+                if not isinstance(source, str):
+                    raise ValueError(f"invalid cell source: {source!r}")
+                cells.append(source)
+        else:
+            scanner.skip()
+    scanner.end()
+    if nbformat_version != 4:
+        return None
+    return cells
+
+
+class _JSONScanner(object):
+    """_JSONScanner walks through a UTF-8 encoded JSON document, the values
+    are decoded or skipped on demand, so the skipped ones are never decoded."""
+
+    def __init__(self, data: bytes):
+        self._data = data
+        self._pos = 0
+
+    def _skip_whitespace(self):
+        self._pos = _WHITESPACE_regex.match(self._data, self._pos).end()
+
+    def _consume(self, char: bytes) -> bool:
+        self._skip_whitespace()
+        if self._data.startswith(char, self._pos):
+            self._pos += 1
+            return True
+        return False
+
+    def _expect(self, char: bytes):
+        if not self._consume(char):
+            raise ValueError(f"expecting {char!r} at {self._pos}")
+
+    def members(self) -> Iterator[str]:
+        """Iterate the keys of an object, the value of each key must be
+        decoded or skipped before the next iteration."""
+        self._expect(b"{")
+        if self._consume(b"}"):
+            return
+        while True:
+            self._skip_whitespace()
+            key = self.decode()
+            if not isinstance(key, str):
+                raise ValueError(f"invalid key at {self._pos}")
+            self._expect(b":")
+            self._skip_whitespace()
+            yield key
+            if self._consume(b"}"):
+                return
+            self._expect(b",")
+
+    def items(self) -> Iterator[None]:
+        """Iterate the items of an array, each item must be decoded or
+        skipped before the next iteration."""
+        self._expect(b"[")
+        if self._consume(b"]"):
+            return
+        while True:
+            self._skip_whitespace()
+            yield
+            if self._consume(b"]"):
+                return
+            self._expect(b",")
+
+    def decode(self):
+        start = self._pos
+        self.skip()
+        return json.loads(self._data[start:self._pos])
+
+    def skip(self):
+        data, pos = self._data, self._pos
+        char = data[pos:pos + 1]
+        if char == b'"':
+            self._pos = _skip_string(data, pos)
+            return
+        if char not in (b"[", b"{"):
+            self._pos = _SCALAR_regex.match(data, pos).end()
+            return
+        # Only the brackets outside strings count.
+        depth = 0
+        while True:
+            match = _DELIMITER_regex.search(data, pos)
+            char, pos = match.group(), match.start()
+            if char == b'"':
+                pos = _skip_string(data, pos)
+                continue
+            pos += 1
+            depth += 1 if char in b"[{" else -1
+            if depth == 0:
+                break
+        self._pos = pos
+
+    def end(self):
+        self._skip_whitespace()
+        if self._pos != len(self._data):
+            raise ValueError(f"extra data at {self._pos}")
+
+
+def _skip_string(data: bytes, pos: int) -> int:
+    """Returns the end of the string starting at pos, searching the closing
+    quote is much faster than matching by regex for large strings
+    (e.g. base64 encoded images)."""
+    while True:
+        end = data.find(b'"', pos + 1)
+        if end == -1:
+            raise ValueError(f"unterminated string at {pos}")
+        backslash = end - 1
+        while data[backslash] == 0x5C:  # `\`
+            backslash -= 1
+        if (end - 1 - backslash) % 2 == 0:
+            return end + 1
+        pos = end
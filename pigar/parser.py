@@ -5,15 +5,26 @@ import io
 import ast
 import tokenize
 import doctest
+import unicodedata
+import array
 import collections
-import fnmatch
-import os.path as pathlib
-from typing import List, NamedTuple, Optional, Callable, Deque, Tuple, Iterable, Union
+import collections.abc
+import functools
+import concurrent.futures
+from typing import Dict, List, NamedTuple, Optional, Callable, Deque, Tuple, Iterable, Iterator, Union
 
 from .log import logger
-from .helpers import trim_prefix
-
-import nbformat
+from .walk import (
+    IGNORE_FILES,
+    PIGAR_IGNORE_FILE,
+    GlobMatcher,
+    IgnoreFilesMatcher,
+    is_walked,
+    walk_files,
+)
+from .cache import ParseCache, file_digest, git_blob_digest
+from .gitindex import list_tracked_files
+from .notebook import read_code_cells
 
 
 class Module(NamedTuple):
@@ -23,6 +34,68 @@ class Module(NamedTuple):
     lineno: int
 
 
+class ModuleList(collections.abc.Sequence):
+    """ModuleList is a compact list of modules for large projects.
+
+    The modules are stored by columns, the file paths are interned
+    as ids, the line numbers and file ids are stored in arrays.
+    """
+
+    def __init__(self, modules: Iterable[Module] = ()):
+        self._files: List[str] = []
+        self._file_ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._try_flags = bytearray()
+        self._file_id_array = array.array("I")
+        self._lineno_array = array.array("I")
+        self.extend(modules)
+
+    def append(self, module: Module):
+        file_id = self._file_ids.get(module.file, None)
+        if file_id is None:
+            file_id = self._file_ids[module.file] = len(self._files)
+            self._files.append(sys.intern(module.file))
+        self._names.append(sys.intern(module.name))
+        self._try_flags.append(module.try_)
+        self._file_id_array.append(file_id)
+        self._lineno_array.append(module.lineno)
+
+    def extend(self, modules: Iterable[Module]):
+        for module in modules:
+            self.append(module)
+
+    def _get(self, idx: int) -> Module:
+        return Module(
+            self._names[idx],
+            bool(self._try_flags[idx]),
+            self._files[self._file_id_array[idx]],
+            self._lineno_array[idx],
+        )
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self._get(i) for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("ModuleList index out of range")
+        return self._get(idx)
+
+    def __iter__(self) -> Iterator[Module]:
+        return map(self._get, range(len(self)))
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (ModuleList, list)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f"ModuleList({list(self)!r})"
+
+
 class Annotation(NamedTuple):
     distribution_name: Optional[str]
     top_level_import_name: Optional[str]
@@ -30,14 +103,6 @@ class Annotation(NamedTuple):
     lineno: int
 
 
-def _match_exclude_patterns(name: str, patterns: Iterable[str], root: str = "") -> bool:
-    # name = trim_prefix(trim_prefix(name, root), "/")
-    for pattern in patterns:
-        if fnmatch.fnmatch(name, pattern):
-            return True
-    return False
-
-
 DEFAULT_GLOB_EXCLUDE_PATTERNS = (
     "**/.git",
     "**/.hg",
@@ -47,46 +112,389 @@ DEFAULT_GLOB_EXCLUDE_PATTERNS = (
 )
 
 
+class FileImports(NamedTuple):
+    file: str
+    modules: List[Module]
+    annotations: List[Annotation]
+
+
 def parse_imports(
     project_root: str,
     visit_doc_str: bool = False,
     exclude_patterns: Optional[List[str]] = None,
     followlinks: bool = True,
     parse_requirement_annotations: bool = False,
-) -> Tuple[List[Module], List[Annotation]]:
+    use_ignore_files: bool = True,
+    files_from_git: bool = False,
+    jobs: Optional[int] = None,
+    executor: Optional[concurrent.futures.Executor] = None,
+    cache: Optional[ParseCache] = None,
+) -> Tuple[ModuleList, List[Annotation]]:
     """package_root must be a absolute path to package root,
-    e.g. /path/to/pigar/pigar."""
-    exclude_pattern_set = (
-        set(trim_prefix(p, "./") for p in exclude_patterns)
-        if exclude_patterns
-        else set()
-    )
-    exclude_pattern_set |= set(DEFAULT_GLOB_EXCLUDE_PATTERNS)
+    e.g. /path/to/pigar/pigar.
 
-    imported_modules: List[Module] = []
+    See `iter_imports` for details.
+    """
+    imported_modules = ModuleList()
     annotations: List[Annotation] = []
+    for file_imports in iter_imports(
+        project_root,
+        visit_doc_str=visit_doc_str,
+        exclude_patterns=exclude_patterns,
+        followlinks=followlinks,
+        parse_requirement_annotations=parse_requirement_annotations,
+        use_ignore_files=use_ignore_files,
+        files_from_git=files_from_git,
+        jobs=jobs,
+        executor=executor,
+        cache=cache,
+    ):
+        imported_modules.extend(file_imports.modules)
+        annotations.extend(file_imports.annotations)
+    return imported_modules, annotations
+
+
+def iter_imports(
+    project_root: str,
+    visit_doc_str: bool = False,
+    exclude_patterns: Optional[List[str]] = None,
+    followlinks: bool = True,
+    parse_requirement_annotations: bool = False,
+    use_ignore_files: bool = True,
+    files_from_git: bool = False,
+    jobs: Optional[int] = None,
+    executor: Optional[concurrent.futures.Executor] = None,
+    cache: Optional[ParseCache] = None,
+    project_files: Optional["ProjectFiles"] = None,
+) -> Iterator[FileImports]:
+    """Yield the imports of each file as soon as the file is parsed.
+
+    Files are parsed by the given executor, or by a pool with `jobs` workers
+    (0 means the number of CPUs), the results are yielded in the walking order.
+    Unchanged files are served from the cache if given.
+
+    The files are listed by `list_project_files` unless `project_files`
+    is given.
+    """
+    if project_files is None:
+        project_files = list_project_files(
+            project_root,
+            exclude_patterns=exclude_patterns,
+            followlinks=followlinks,
+            use_ignore_files=use_ignore_files,
+            files_from_git=files_from_git,
+        )
+    skipped = 0
+    for fpath, parsed in _parse_files(
+        project_files.files,
+        visit_doc_str=visit_doc_str,
+        parse_requirement_annotations=parse_requirement_annotations,
+        jobs=jobs,
+        executor=executor,
+        cache=cache,
+        digests=project_files.digests,
+    ):
+        skipped += parsed.skipped
+        yield FileImports(fpath, parsed.modules, parsed.annotations)
+    logger.info(
+        "%d of %d files skipped as they can not contain imports",
+        skipped,
+        len(project_files.files),
+    )
+
+
+class ProjectFiles(NamedTuple):
+    files: List[str]
+    # The known content hashes of the files, e.g. from the git index.
+    digests: Optional[Dict[str, Optional[str]]] = None
+
+
+def list_project_files(
+    project_root: str,
+    exclude_patterns: Optional[List[str]] = None,
+    followlinks: bool = True,
+    use_ignore_files: bool = True,
+    files_from_git: bool = False,
+) -> ProjectFiles:
+    """List the files to analyze in the project.
+
+    If `files_from_git` is true, the files tracked by git are listed instead of
+    the walked ones, unless the project is not in a git work tree.
+    """
+    if files_from_git:
+        digests = git_project_files(
+            project_root,
+            exclude_patterns=exclude_patterns,
+            use_ignore_files=use_ignore_files,
+        )
+        if digests is not None:
+            return ProjectFiles(list(digests), digests)
+        logger.info("%s is not in a git work tree, walk it instead", project_root)
+    files = walk_project_files(
+        project_root,
+        exclude_patterns=exclude_patterns,
+        followlinks=followlinks,
+        use_ignore_files=use_ignore_files,
+    )
+    return ProjectFiles(files)
+
+
+def walk_project_files(
+    project_root: str,
+    exclude_patterns: Optional[List[str]] = None,
+    followlinks: bool = True,
+    use_ignore_files: bool = True,
+) -> List[str]:
+    """Collect the Python source files and Jupyter notebooks.
+
+    The exclude patterns are relative to the project root, see `GlobMatcher`.
+    The files ignored by `.gitignore` or `.pigarignore` are skipped if
+    `use_ignore_files` is true.
+    """
+    exclude = GlobMatcher(
+        list(exclude_patterns or []) + list(DEFAULT_GLOB_EXCLUDE_PATTERNS),
+        root=project_root,
+    )
+    return [
+        fpath
+        for fpath in walk_files(
+            project_root,
+            exclude=exclude,
+            followlinks=followlinks,
+            ignore_files=IGNORE_FILES if use_ignore_files else (),
+        )
+        if _is_source_file(fpath)
+    ]
+
+
+def is_project_file(
+    project_root: str,
+    fpath: str,
+    exclude_patterns: Optional[List[str]] = None,
+    use_ignore_files: bool = True,
+    files_from_git: bool = False,
+) -> bool:
+    """Whether the file would be collected by `walk_project_files`, or by
+    `git_project_files` if `files_from_git` is true and the file is tracked."""
+    if not _is_source_file(fpath):
+        return False
+    relpath = os.path.relpath(fpath, project_root)
+    if relpath.startswith(os.pardir + os.sep):
+        return False
+    exclude = GlobMatcher(
+        list(exclude_patterns or []) + list(DEFAULT_GLOB_EXCLUDE_PATTERNS),
+        root=project_root,
+    )
+    return is_walked(
+        project_root,
+        relpath.replace(os.sep, "/"),
+        exclude=exclude,
+        ignore_files=_ignore_files(use_ignore_files, files_from_git),
+    )
+
+
+def _ignore_files(use_ignore_files: bool, files_from_git: bool) -> Tuple[str, ...]:
+    if not use_ignore_files:
+        return ()
+    # The tracked files are not ignored by `.gitignore`.
+    if files_from_git:
+        return (PIGAR_IGNORE_FILE,)
+    return IGNORE_FILES
+
+
+def git_project_files(
+    project_root: str,
+    exclude_patterns: Optional[List[str]] = None,
+    use_ignore_files: bool = True,
+) -> Optional[Dict[str, Optional[str]]]:
+    """Collect the Python source files and Jupyter notebooks tracked by git,
+    see `list_tracked_files` for the returned value.
 
-    for dirpath, subdirs, files in os.walk(project_root, followlinks=followlinks):
-        if _match_exclude_patterns(dirpath, exclude_pattern_set, project_root):
-            logger.debug("excluded by glob patterns: %s", dirpath)
-            subdirs.clear()
+    The files ignored by `.pigarignore` are skipped if `use_ignore_files` is
+    true, `.gitignore` does not apply to the tracked files.
+    """
+    tracked = list_tracked_files(project_root, suffixes=_SOURCE_FILE_SUFFIXES)
+    if tracked is None:
+        return None
+    ignored = None
+    if use_ignore_files:
+        ignored = IgnoreFilesMatcher(
+            project_root, _ignore_files(use_ignore_files, True)
+        )
+    exclude = GlobMatcher(
+        list(exclude_patterns or []) + list(DEFAULT_GLOB_EXCLUDE_PATTERNS),
+        root=project_root,
+    )
+    prefix_len = len(os.path.join(project_root, ""))
+    excluded_dirs: Dict[str, bool] = {}
+
+    def _is_excluded_dir(reldir: str) -> bool:
+        excluded = excluded_dirs.get(reldir, None)
+        if excluded is None:
+            parent, _, _ = reldir.rpartition("/")
+            excluded = (parent != "" and _is_excluded_dir(parent)) or exclude.match(
+                reldir, True
+            )
+            excluded_dirs[reldir] = excluded
+        return excluded
+
+    files: Dict[str, Optional[str]] = {}
+    for fpath, digest in tracked.items():
+        relpath = fpath[prefix_len:].replace(os.sep, "/")
+        reldir, _, _ = relpath.rpartition("/")
+        if (reldir and _is_excluded_dir(reldir)) or exclude.match(relpath):
             continue
+        if ignored is not None and ignored.match(relpath):
+            continue
+        files[fpath] = digest
+    return files
 
-        for fn in files:
-            fpath = pathlib.join(dirpath, fn)
-            if _match_exclude_patterns(fpath, exclude_pattern_set, project_root):
-                logger.debug("excluded by glob patterns: %s", fpath)
-                continue
-            logger.debug("analyzing file: %s", fpath)
 
-            code = _read_code(fpath)
-            if code:
-                imported_modules.extend(
-                    parse_file_imports(fpath, code, visit_doc_str=visit_doc_str)
-                )
-                if parse_requirement_annotations:
-                    annotations.extend(parse_file_comment_annotations(fpath, code))
-    return imported_modules, annotations
+class _ParsedFile(NamedTuple):
+    modules: List[Module]
+    annotations: List[Annotation]
+    errors: List[str]
+    digest: Optional[str]
+    skipped: bool = False
+
+
+def _parse_files(
+    files: List[str],
+    visit_doc_str: bool = False,
+    parse_requirement_annotations: bool = False,
+    jobs: Optional[int] = None,
+    executor: Optional[concurrent.futures.Executor] = None,
+    cache: Optional[ParseCache] = None,
+    digests: Optional[Dict[str, Optional[str]]] = None,
+) -> Iterator[Tuple[str, _ParsedFile]]:
+    parse = functools.partial(
+        _parse_file,
+        visit_doc_str=visit_doc_str,
+        parse_requirement_annotations=parse_requirement_annotations,
+        with_digest=cache is not None and digests is None,
+    )
+    if cache is None:
+        yield from zip(files, _map_files(parse, files, jobs, executor))
+        return
+
+    digests = digests or {}
+    cached = [cache.lookup(fpath, digests.get(fpath, None)) for fpath in files]
+    misses = [fpath for fpath, parsed in zip(files, cached) if parsed is None]
+    logger.debug("parse cache: %d of %d files missed", len(misses), len(files))
+    parsed_misses = iter(_map_files(parse, misses, jobs, executor))
+    for fpath, parsed in zip(files, cached):
+        if parsed is None:
+            parsed = next(parsed_misses)
+            digest = digests.get(fpath, None) or parsed.digest
+            if digest is None:
+                # Changed since it was staged, the index SHA-1 is outdated.
+                try:
+                    digest = file_digest(fpath)
+                except OSError:
+                    digest = None
+            if digest is not None:
+                cache.store(fpath, digest, parsed)
+        else:
+            for error in parsed.errors:
+                logger.warning("%s (cached)", error)
+        yield fpath, parsed
+    cache.save()
+
+
+def _parse_file(
+    fpath: str,
+    visit_doc_str: bool = False,
+    parse_requirement_annotations: bool = False,
+    with_digest: bool = False,
+) -> _ParsedFile:
+    logger.debug("analyzing file: %s", fpath)
+    with open(fpath, "rb") as f:
+        raw = f.read()
+    digest = git_blob_digest(raw) if with_digest else None
+    blocks = _read_code_blocks(fpath, raw)
+    code = blocks[0][0] if len(blocks) == 1 else b"".join(b for b, _ in blocks)
+    if not code:
+        return _ParsedFile([], [], [], digest)
+    modules: List[Module] = []
+    annotations: List[Annotation] = []
+    errors: List[str] = []
+    skipped = True
+    if _may_contain_imports(code):
+        skipped = False
+        modules = _parse_code_blocks(
+            fpath, blocks, visit_doc_str=visit_doc_str, errors=errors
+        )
+    if parse_requirement_annotations and _ANNOTATION_TOKEN in code:
+        skipped = False
+        annotations = parse_file_comment_annotations(fpath, code)
+    if skipped:
+        logger.debug("skip file without import candidates: %s", fpath)
+    return _ParsedFile(modules, annotations, errors, digest, skipped)
+
+
+# Every import the parser can find, including the ones inside the code of
+# eval/exec and doctests, has one of these tokens in the source.
+_import_tokens_regex = re.compile(rb"import|eval|exec")
+_ANNOTATION_TOKEN = b"pigar:"
+
+
+def _may_contain_imports(code: bytes) -> bool:
+    """A conservative pre-filter, so the files that can not contain
+    imports (e.g. generated data modules) do not need to be parsed."""
+    if _import_tokens_regex.search(code) is not None:
+        return True
+    if code.isascii():
+        return False
+    # Identifiers are NFKC normalized, e.g. `ｅｘｅｃ` is the same as `exec`.
+    try:
+        text = unicodedata.normalize("NFKC", code.decode("utf-8"))
+    except UnicodeDecodeError:
+        # Maybe other source encodings, just parse it.
+        return True
+    return _import_tokens_regex.search(text.encode("utf-8")) is not None
+
+
+def _is_free_threaded() -> bool:
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def _map_files(
+    func: Callable,
+    files: List[str],
+    jobs: Optional[int] = None,
+    executor: Optional[concurrent.futures.Executor] = None,
+) -> Iterable:
+    """Apply func to files, results are yielded in the same order as files."""
+    if executor is not None:
+        return executor.map(func, files, chunksize=_chunksize(files, executor))
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if jobs is None or jobs <= 1 or len(files) <= 1:
+        return map(func, files)
+    return _map_files_with_pool(func, files, jobs)
+
+
+def _map_files_with_pool(func: Callable, files: List[str], jobs: int) -> Iterable:
+    # Threads only help if the GIL is disabled, the parsing is CPU bound.
+    if _is_free_threaded():
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+    with executor:
+        try:
+            yield from executor.map(func, files, chunksize=_chunksize(files, executor))
+        except GeneratorExit:
+            # Closed early, the pending files are not parsed.
+            if sys.version_info >= (3, 9):
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+
+def _chunksize(files: List[str], executor: concurrent.futures.Executor) -> int:
+    # Only ProcessPoolExecutor honors chunksize, batching amortizes the IPC cost.
+    workers = getattr(executor, "_max_workers", None) or os.cpu_count() or 1
+    return max(1, min(64, len(files) // (workers * 4)))
 
 
 def parse_file_comment_annotations(fpath: str, code: bytes) -> List[Annotation]:
@@ -146,29 +554,60 @@ def parse_file_comment_annotations(fpath: str, code: bytes) -> List[Annotation]:
 _ipynb_magics_and_commands_regex = re.compile(r"[^#]*\s*(!|%)[{a-zA-Z][a-zA-Z0-9_-]*.*")
 
 
-def _read_code(fpath: str) -> Optional[bytes]:
-    if fpath.endswith(".ipynb"):
-        nb = nbformat.read(fpath, as_version=4)
-        code = ""
-        for cell in nb.cells:
-            if cell.cell_type != "code":
-                continue
-            for line in cell.source.splitlines():
-                match = _ipynb_magics_and_commands_regex.match(line)
-                if not (match and match.group(0) == line):
-                    code += line
-                code += "\n"
-        return code.encode(encoding="utf-8")
-    elif fpath.endswith(".py"):
+def _read_code_blocks(
+    fpath: str, raw: Optional[bytes] = None
+) -> List[Tuple[bytes, int]]:
+    """Read the code blocks with their first line numbers, each code cell
+    of a notebook is a block, the line numbers are counted as if the blocks
+    are concatenated."""
+    if not _is_source_file(fpath):
+        return []
+    if raw is None:
         with open(fpath, "rb") as f:
-            return f.read()
-    return None
+            raw = f.read()
+    if not fpath.endswith(".ipynb"):
+        return [(raw, 1)]
+    blocks = []
+    lineno = 1
+    for source in read_code_cells(raw):
+        lines = []
+        for line in source.splitlines():
+            match = _ipynb_magics_and_commands_regex.match(line)
+            lines.append("" if match and match.group(0) == line else line)
+        if not lines:
+            continue
+        lines.append("")
+        blocks.append(("\n".join(lines).encode("utf-8"), lineno))
+        lineno += len(lines) - 1
+    return blocks
+
+
+_SOURCE_FILE_SUFFIXES = (".py", ".ipynb")
+
+
+def _is_source_file(fpath: str) -> bool:
+    return fpath.endswith(_SOURCE_FILE_SUFFIXES)
 
 
 def parse_file_imports(
-    fpath: str, content: bytes, visit_doc_str: bool = False
+    fpath: str,
+    content: bytes,
+    visit_doc_str: bool = False,
+    errors: Optional[List[str]] = None,
+) -> List[Module]:
+    return _parse_code_blocks(
+        fpath, [(content, 1)], visit_doc_str=visit_doc_str, errors=errors
+    )
+
+
+def _parse_code_blocks(
+    fpath: str,
+    blocks: List[Tuple[bytes, int]],
+    visit_doc_str: bool = False,
+    errors: Optional[List[str]] = None,
 ) -> List[Module]:
-    py_codes: Deque[Tuple[bytes, int]] = collections.deque([(content, 1)])
+    # A syntax error only drops the block (e.g. a notebook cell) containing it.
+    py_codes: Deque[Tuple[bytes, int]] = collections.deque(blocks)
     parser = ImportsParser(
         lambda code, lineno: py_codes.append((code, lineno)),  # noqa
         doc_str_enabled=visit_doc_str,
@@ -181,9 +620,29 @@ def parse_file_imports(
         except SyntaxError as e:
             # Ignore SyntaxError in Python code.
             logger.warn("parse %s:%d failed: %r", fpath, lineno, e)
+            if errors is not None:
+                errors.append(f"parse {fpath}:{lineno} failed: {e!r}")
     return parser.modules
 
 
+def _statement_fields():
+    """Mapping of node types to the fields that contain statements."""
+    fields = ("body", "handlers", "orelse", "finalbody", "cases")
+    node_types = [ast.Module, ast.Interactive, ast.ExceptHandler]
+    node_types.extend(ast.stmt.__subclasses__())
+    if hasattr(ast, "match_case"):  # Python 3.10+
+        node_types.append(ast.match_case)
+    mapping = dict()
+    for node_type in node_types:
+        stmt_fields = tuple(f for f in node_type._fields if f in fields)
+        if stmt_fields:
+            mapping[node_type] = stmt_fields
+    return mapping
+
+
+_STATEMENT_FIELDS = _statement_fields()
+
+
 class ImportsParser(object):
 
     def __init__(
@@ -194,6 +653,14 @@ class ImportsParser(object):
         self._modules: List[Module] = []
         self._rawcode_callback = rawcode_callback
         self._doc_str_enabled = doc_str_enabled
+        self._visitors = {
+            ast.Import: self.visit_Import,
+            ast.ImportFrom: self.visit_ImportFrom,
+            ast.Try: self.visit_Try,
+            ast.Expr: self.visit_Expr,
+            ast.FunctionDef: self.visit_FunctionDef,
+            ast.ClassDef: self.visit_ClassDef,
+        }
 
     def parse(self, content: bytes, fpath: str, lineno: int):
         parsed = ast.parse(content)
@@ -246,14 +713,12 @@ class ImportsParser(object):
         maybe them come from other Python version.
         """
         for ipt in node.body:
-            if ipt.__class__.__name__.startswith("Import"):
-                method = "visit_" + ipt.__class__.__name__
-                getattr(self, method)(ipt, True)
+            if isinstance(ipt, (ast.Import, ast.ImportFrom)):
+                self._visitors[type(ipt)](ipt, True)
         for handler in node.handlers:
             for ipt in handler.body:
-                if ipt.__class__.__name__.startswith("Import"):
-                    method = "visit_" + ipt.__class__.__name__
-                    getattr(self, method)(ipt, True)
+                if isinstance(ipt, (ast.Import, ast.ImportFrom)):
+                    self._visitors[type(ipt)](ipt, True)
 
     # For Python 3.3+
     visit_Try = visit_TryExcept
@@ -326,10 +791,21 @@ class ImportsParser(object):
             self._add_rawcode(docstring, node.lineno + self._lineno + 2)
 
     def visit(self, node: ast.AST):
-        """Visit a node, no recursively."""
-        for node in ast.walk(node):
-            method = "visit_" + node.__class__.__name__
-            getattr(self, method, lambda x: x)(node)
+        """Visit a node, no recursively.
+
+        Only statements are visited (in the same order as `ast.walk`),
+        imports can not appear in the expressions.
+        """
+        visitors = self._visitors
+        nodes: Deque[ast.AST] = collections.deque([node])
+        while nodes:
+            node = nodes.popleft()
+            node_type = type(node)
+            visitor = visitors.get(node_type, None)
+            if visitor is not None:
+                visitor(node)
+            for field in _STATEMENT_FIELDS.get(node_type, ()):
+                nodes.extend(getattr(node, field))
 
     @staticmethod
     def _get_ast_literal_str(node):
@@ -0,0 +1,175 @@
+import sys
+from typing import FrozenSet, Optional, Tuple
+
+# The names of the top level stdlib modules, including the private and platform
+# specific ones, the same as `sys.stdlib_module_names`. The tables of Python
+# 3.10+ are generated from `sys.stdlib_module_names`, Python 3.8 and 3.9 are
+# listed from their stdlib directories, Python 3.14 is based on its release
+# notes. The modules added by patch releases are included as well, e.g.
+# `_apple_support` since 3.13.1.
+_COMMON_STDLIB_MODULE_NAMES = frozenset(
+    (
+        "__future__", "_abc", "_ast", "_asyncio", "_bisect", "_blake2", "_bz2",
+        "_codecs", "_codecs_cn", "_codecs_hk", "_codecs_iso2022", "_codecs_jp",
+        "_codecs_kr", "_codecs_tw", "_collections", "_collections_abc",
+        "_compat_pickle", "_compression", "_contextvars", "_csv", "_ctypes",
+        "_curses", "_curses_panel", "_datetime", "_dbm", "_decimal",
+        "_elementtree", "_frozen_importlib", "_frozen_importlib_external",
+        "_functools", "_gdbm", "_hashlib", "_heapq", "_imp", "_io", "_json",
+        "_locale", "_lsprof", "_lzma", "_markupbase", "_md5",
+        "_multibytecodec", "_multiprocessing", "_opcode", "_operator",
+        "_osx_support", "_overlapped", "_pickle", "_posixshmem",
+        "_posixsubprocess", "_py_abc", "_pydecimal", "_pyio", "_queue",
+        "_random", "_scproxy", "_sha1", "_sha3", "_signal", "_sitebuiltins",
+        "_socket", "_sqlite3", "_sre", "_ssl", "_stat", "_statistics",
+        "_string", "_strptime", "_struct", "_symtable", "_thread",
+        "_threading_local", "_tkinter", "_tracemalloc", "_uuid", "_warnings",
+        "_weakref", "_weakrefset", "_winapi", "abc", "antigravity", "argparse",
+        "array", "ast", "asyncio", "atexit", "base64", "bdb", "binascii",
+        "bisect", "builtins", "bz2", "cProfile", "calendar", "cmath", "cmd",
+        "code", "codecs", "codeop", "collections", "colorsys", "compileall",
+        "concurrent", "configparser", "contextlib", "contextvars", "copy",
+        "copyreg", "csv", "ctypes", "curses", "dataclasses", "datetime", "dbm",
+        "decimal", "difflib", "dis", "doctest", "email", "encodings",
+        "ensurepip", "enum", "errno", "faulthandler", "fcntl", "filecmp",
+        "fileinput", "fnmatch", "fractions", "ftplib", "functools", "gc",
+        "genericpath", "getopt", "getpass", "gettext", "glob", "grp", "gzip",
+        "hashlib", "heapq", "hmac", "html", "http", "idlelib", "imaplib",
+        "importlib", "inspect", "io", "ipaddress", "itertools", "json",
+        "keyword", "linecache", "locale", "logging", "lzma", "mailbox",
+        "marshal", "math", "mimetypes", "mmap", "modulefinder", "msvcrt",
+        "multiprocessing", "netrc", "nt", "ntpath", "nturl2path", "numbers",
+        "opcode", "operator", "optparse", "os", "pathlib", "pdb", "pickle",
+        "pickletools", "pkgutil", "platform", "plistlib", "poplib", "posix",
+        "posixpath", "pprint", "profile", "pstats", "pty", "pwd", "py_compile",
+        "pyclbr", "pydoc", "pydoc_data", "pyexpat", "queue", "quopri",
+        "random", "re", "readline", "reprlib", "resource", "rlcompleter",
+        "runpy", "sched", "secrets", "select", "selectors", "shelve", "shlex",
+        "shutil", "signal", "site", "smtplib", "socket", "socketserver",
+        "sqlite3", "sre_compile", "sre_constants", "sre_parse", "ssl", "stat",
+        "statistics", "string", "stringprep", "struct", "subprocess",
+        "symtable", "sys", "sysconfig", "syslog", "tabnanny", "tarfile",
+        "tempfile", "termios", "textwrap", "this", "threading", "time",
+        "timeit", "tkinter", "token", "tokenize", "trace", "traceback",
+        "tracemalloc", "tty", "turtle", "turtledemo", "types", "typing",
+        "unicodedata", "unittest", "urllib", "uuid", "venv", "warnings",
+        "wave", "weakref", "webbrowser", "winreg", "winsound", "wsgiref",
+        "xml", "xmlrpc", "zipapp", "zipfile", "zipimport", "zlib"
+    )
+)
+
+_VERSION_SPECIFIC_STDLIB_MODULE_NAMES = {
+    (3, 8): frozenset(
+        (
+            "_bootlocale", "_crypt", "_dummy_thread", "_msi", "_sha256",
+            "_sha512", "aifc", "asynchat", "asyncore", "audioop", "binhex",
+            "cgi", "cgitb", "chunk", "crypt", "distutils", "dummy_threading",
+            "formatter", "imghdr", "imp", "lib2to3", "mailcap", "msilib",
+            "nis", "nntplib", "ossaudiodev", "parser", "pipes", "smtpd",
+            "sndhdr", "spwd", "sunau", "symbol", "telnetlib", "uu", "xdrlib"
+        )
+    ),
+    (3, 9): frozenset(
+        (
+            "_aix_support", "_bootlocale", "_bootsubprocess", "_crypt", "_msi",
+            "_peg_parser", "_sha256", "_sha512", "_zoneinfo", "aifc",
+            "asynchat", "asyncore", "audioop", "binhex", "cgi", "cgitb",
+            "chunk", "crypt", "distutils", "formatter", "graphlib", "imghdr",
+            "imp", "lib2to3", "mailcap", "msilib", "nis", "nntplib",
+            "ossaudiodev", "parser", "pipes", "smtpd", "sndhdr", "spwd",
+            "sunau", "symbol", "telnetlib", "uu", "xdrlib", "zoneinfo"
+        )
+    ),
+    (3, 10): frozenset(
+        (
+            "_aix_support", "_bootsubprocess", "_crypt", "_msi", "_sha256",
+            "_sha512", "_zoneinfo", "aifc", "asynchat", "asyncore", "audioop",
+            "binhex", "cgi", "cgitb", "chunk", "crypt", "distutils",
+            "graphlib", "imghdr", "imp", "lib2to3", "mailcap", "msilib", "nis",
+            "nntplib", "ossaudiodev", "pipes", "smtpd", "sndhdr", "spwd",
+            "sunau", "telnetlib", "uu", "xdrlib", "zoneinfo"
+        )
+    ),
+    (3, 11): frozenset(
+        (
+            "_aix_support", "_bootsubprocess", "_crypt", "_msi", "_sha256",
+            "_sha512", "_tokenize", "_typing", "_zoneinfo", "aifc", "asynchat",
+            "asyncore", "audioop", "cgi", "cgitb", "chunk", "crypt",
+            "distutils", "graphlib", "imghdr", "imp", "lib2to3", "mailcap",
+            "msilib", "nis", "nntplib", "ossaudiodev", "pipes", "smtpd",
+            "sndhdr", "spwd", "sunau", "telnetlib", "tomllib", "uu", "xdrlib",
+            "zoneinfo"
+        )
+    ),
+    (3, 12): frozenset(
+        (
+            "_aix_support", "_crypt", "_msi", "_pydatetime", "_pylong",
+            "_sha2", "_tokenize", "_typing", "_zoneinfo", "aifc", "audioop",
+            "cgi", "cgitb", "chunk", "crypt", "graphlib", "imghdr", "lib2to3",
+            "mailcap", "msilib", "nis", "nntplib", "ossaudiodev", "pipes",
+            "sndhdr", "spwd", "sunau", "telnetlib", "tomllib", "uu", "xdrlib",
+            "zoneinfo"
+        )
+    ),
+    (3, 13): frozenset(
+        (
+            "_aix_support", "_android_support", "_apple_support", "_colorize",
+            "_interpchannels", "_interpqueues", "_interpreters",
+            "_ios_support", "_opcode_metadata", "_pydatetime", "_pylong",
+            "_pyrepl", "_sha2", "_suggestions", "_sysconfig", "_tokenize",
+            "_typing", "_wmi", "_zoneinfo", "graphlib", "tomllib", "zoneinfo"
+        )
+    ),
+    (3, 14): frozenset(
+        (
+            "_aix_support", "_android_support", "_apple_support", "_colorize",
+            "_hmac", "_interpchannels", "_interpqueues", "_interpreters",
+            "_ios_support", "_opcode_metadata", "_pydatetime", "_pylong",
+            "_pyrepl", "_remote_debugging", "_sha2", "_suggestions",
+            "_sysconfig", "_tokenize", "_typing", "_wmi", "_zoneinfo", "_zstd",
+            "annotationlib", "compression", "graphlib", "tomllib", "zoneinfo"
+        )
+    ),
+}
+
+TARGET_PYTHON_VERSIONS = tuple(
+    "{0}.{1}".format(*version)
+    for version in sorted(_VERSION_SPECIFIC_STDLIB_MODULE_NAMES)
+)
+
+
+def parse_python_version(version: str) -> Tuple[int, int]:
+    """Parse the version like `3.12` into `(3, 12)`."""
+    try:
+        major, minor = version.strip().split(".")
+        return int(major), int(minor)
+    except ValueError:
+        raise ValueError(f"invalid Python version: {version!r}") from None
+
+
+def stdlib_module_names(
+    target_version: Optional[Tuple[int, int]] = None
+) -> FrozenSet[str]:
+    """The names of the top level stdlib modules of the target Python version,
+    the running Python version by default."""
+    if target_version is None or tuple(target_version) == sys.version_info[:2]:
+        names = getattr(sys, "stdlib_module_names", None)  # Python 3.10+
+        if names is not None:
+            return names
+        target_version = sys.version_info[:2]
+    specific_names = _VERSION_SPECIFIC_STDLIB_MODULE_NAMES.get(
+        tuple(target_version), None
+    )
+    if specific_names is None:
+        raise ValueError(
+            "unsupported target Python version: {0}.{1}".format(*target_version)
+        )
+    return _COMMON_STDLIB_MODULE_NAMES | specific_names
+
+
+def is_stdlib_module(
+    name: str, target_version: Optional[Tuple[int, int]] = None
+) -> bool:
+    """Whether the module (e.g. `os.path`) belongs to the stdlib, nothing is
+    imported."""
+    return name.split(".")[0] in stdlib_module_names(target_version)
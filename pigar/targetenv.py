@@ -0,0 +1,165 @@
+import os
+import re
+import glob
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .log import logger
+
+_LIB_DIR_regex = re.compile(r"python(\d+)\.(\d+)t?")
+
+
+class TargetEnvironment(NamedTuple):
+    # The site-packages directories and the paths added by their .pth files.
+    paths: List[str]
+    python_version: Optional[Tuple[int, int]]
+
+
+def site_packages_paths(site_packages: List[str]) -> List[str]:
+    """Expand the site-packages directories with the directories listed
+    in their .pth files, in the same order as the `site` module."""
+    paths = []
+    for site_dir in site_packages:
+        site_dir = os.path.abspath(site_dir)
+        if site_dir in paths:
+            continue
+        paths.append(site_dir)
+        for pth in sorted(glob.glob(os.path.join(glob.escape(site_dir), "*.pth"))):
+            try:
+                with open(pth, "r", encoding="utf-8") as f:
+                    lines = f.read().splitlines()
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning("read %s failed: %r", pth, e)
+                continue
+            for line in lines:
+                line = line.strip()
+                # Lines starting with `import` are executed by the `site` module.
+                if not line or line.startswith(("#", "import ", "import\t")):
+                    continue
+                path = os.path.normpath(os.path.join(site_dir, line))
+                if path not in paths and os.path.isdir(path):
+                    paths.append(path)
+    return paths
+
+
+def find_python_environment(python: str) -> TargetEnvironment:
+    """Find the site-packages directories of a Python interpreter from the
+    layout of its installation, the interpreter is never executed."""
+    python = os.path.abspath(python)
+    bin_dir = os.path.dirname(python)
+    # Windows puts the interpreter in the prefix or the Scripts directory of venvs.
+    prefix = bin_dir
+    if os.path.basename(bin_dir).lower() in ("bin", "scripts"):
+        prefix = os.path.dirname(bin_dir)
+    version = _parse_lib_dir_version(os.path.basename(python))
+
+    prefixes = [prefix]
+    pyvenv_cfg = _read_pyvenv_cfg(os.path.join(prefix, "pyvenv.cfg"))
+    if pyvenv_cfg is not None:
+        if version is None:
+            version = _parse_version(pyvenv_cfg.get("version_info", "")) or _parse_version(
+                pyvenv_cfg.get("version", "")
+            )
+        if pyvenv_cfg.get("include-system-site-packages", "").lower() == "true":
+            home = pyvenv_cfg.get("home", "")
+            if home:
+                prefixes.append(_prefix_of_bin_dir(home))
+    else:
+        real_python = os.path.realpath(python)
+        if real_python != python:
+            prefixes = [_prefix_of_bin_dir(os.path.dirname(real_python))]
+            version = version or _parse_lib_dir_version(os.path.basename(real_python))
+
+    site_packages = []
+    for prefix in prefixes:
+        dirs, found_version = _prefix_site_packages(prefix, version)
+        site_packages.extend(dirs)
+        version = version or found_version
+    if not site_packages:
+        logger.warning("no site-packages directory found for %s", python)
+    return TargetEnvironment(site_packages_paths(site_packages), version)
+
+
+def _prefix_of_bin_dir(bin_dir: str) -> str:
+    if os.path.basename(bin_dir).lower() in ("bin", "scripts"):
+        return os.path.dirname(bin_dir)
+    return bin_dir
+
+
+def _read_pyvenv_cfg(path: str) -> Optional[Dict[str, str]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    cfg = {}
+    for line in lines:
+        key, sep, value = line.partition("=")
+        if sep:
+            cfg[key.strip().lower()] = value.strip()
+    return cfg
+
+
+def _parse_version(version: str) -> Optional[Tuple[int, int]]:
+    match = re.match(r"(\d+)\.(\d+)", version)
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def _parse_lib_dir_version(name: str) -> Optional[Tuple[int, int]]:
+    # e.g. python3.12, python3.13t, python3.12.exe
+    match = _LIB_DIR_regex.match(name)
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def _prefix_site_packages(
+    prefix: str, version: Optional[Tuple[int, int]]
+) -> Tuple[List[str], Optional[Tuple[int, int]]]:
+    """Returns the site-packages directories under the prefix, and the Python
+    version from the library directory names if the version is unknown."""
+    # Windows.
+    dirs = [os.path.join(prefix, "Lib", "site-packages")]
+
+    candidates = []
+    for lib in ("lib", "lib64"):
+        lib_dir = os.path.join(prefix, lib)
+        try:
+            names = sorted(os.listdir(lib_dir))
+        except OSError:
+            continue
+        for name in names:
+            lib_version = _parse_lib_dir_version(name)
+            if lib_version is None or (version is not None and lib_version != version):
+                continue
+            candidates.append((lib_version, os.path.join(lib_dir, name)))
+    versions = sorted(set(v for v, _ in candidates))
+    if version is None and len(versions) > 1:
+        logger.warning(
+            "multiple Python versions found in %s, the latest one is used: %s",
+            prefix,
+            ", ".join("{}.{}".format(*v) for v in versions),
+        )
+    if versions:
+        version = versions[-1]
+    for lib_version, lib_dir in candidates:
+        if lib_version != version:
+            continue
+        dirs.append(os.path.join(lib_dir, "site-packages"))
+        dirs.append(os.path.join(lib_dir, "dist-packages"))
+    # Debian and Ubuntu.
+    if version is not None and version[0] == 3:
+        dirs.append(
+            os.path.join(prefix, "local", "lib", "python{}.{}".format(*version), "dist-packages")
+        )
+        dirs.append(os.path.join(prefix, "lib", "python3", "dist-packages"))
+
+    # lib64 is usually a symbolic link to lib.
+    found, seen = [], set()
+    for path in dirs:
+        real_path = os.path.realpath(path)
+        if os.path.isdir(path) and real_path not in seen:
+            seen.add(real_path)
+            found.append(path)
+    return found, version
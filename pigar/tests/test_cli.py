@@ -58,6 +58,47 @@ class CliTests(unittest.TestCase):
                     self.assertEqual(len(parts1), len(parts2))
                     self.assertEqual(parts1[0], parts2[0])
 
+    def test_generate_check(self):
+        project_path = os.path.join(self._pigar_project_root, "pigar")
+        requirement_file = "requirements.txt"
+        options = [
+            "gen",
+            "--exclude-glob",
+            "**/tests/data/*",
+            "--exclude-glob",
+            "**/_vendor/*",
+            "-f",
+            requirement_file,
+            project_path,
+        ]
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            result = runner.invoke(cli, options + ["--check"])
+            self.assertEqual(result.exit_code, 1, result.output)
+            self.assertIn("does not exist", result.output)
+
+            result = runner.invoke(cli, options + ["--dont-show-differences"])
+            self.assertEqual(result.exit_code, 0, result.output)
+            result = runner.invoke(cli, options + ["--check"])
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertIn("is up to date", result.output)
+
+            lines = self._read_filelines(requirement_file)
+            name = lines[-1].split("==")[0]
+            # A requirement with another version stops the analysis early.
+            with open(requirement_file, "w", encoding="utf-8") as f:
+                f.writelines(lines[:-1] + [f"{name}==0.0.0\n"])
+            result = runner.invoke(cli, options + ["--check"])
+            self.assertEqual(result.exit_code, 1, result.output)
+            self.assertIn(f"+{name}==", result.output)
+
+            # A stale requirement is found after the analysis.
+            with open(requirement_file, "w", encoding="utf-8") as f:
+                f.writelines(lines + ["stale-dist==1.0\n"])
+            result = runner.invoke(cli, options + ["--check"])
+            self.assertEqual(result.exit_code, 1, result.output)
+            self.assertIn("\n-stale-dist==1.0\n", result.output)
+
     def test_check(self):
         expected_requirements = self._pigar_requirements
         runner = CliRunner()
@@ -1,9 +1,18 @@
 import os
 import os.path
+import sys
+import asyncio
 import unittest
-
-from ..core import RequirementsAnalyzer, check_stdlib, _LocatableRequirements, _Locations
-from ..dist import FrozenRequirement
+import unittest.mock
+import tempfile
+
+from ..core import RequirementsAnalyzer, ProjectModuleIndex, check_stdlib, _LocatableRequirements, _Locations, _IndexSearcher
+from ..db import Distribution
+from ..dist import FrozenRequirement, ImportNameIndex
+from ..parser import Module, list_project_files
+from ..stdlib import (
+    TARGET_PYTHON_VERSIONS, parse_python_version, stdlib_module_names
+)
 from .helper import py_version
 
 from .._vendor.pip._vendor.packaging.version import Version
@@ -13,22 +22,32 @@ class RequirementsAnalyzerTests(unittest.TestCase):
 
     def setUp(self):
         self._installed_dists_by_imports = {
-            'foo': [FrozenRequirement('Foo', '0.1.0')],
-            'bar': [FrozenRequirement('Bar', '1.1.1')],
-            'baz': [FrozenRequirement('Baz', '2.2.2')],
-            'foobaz': [FrozenRequirement('FooBaz', '20151110')],
-            'mod': [FrozenRequirement('Mod', '1.0.0')],
-            'name': [FrozenRequirement('Name', '1.0.0')],
+            'foo': [FrozenRequirement('Foo', '0.1.0', ['foo'])],
+            'bar': [FrozenRequirement('Bar', '1.1.1', ['bar'])],
+            'baz': [FrozenRequirement('Baz', '2.2.2', ['baz'])],
+            'foobaz': [FrozenRequirement('FooBaz', '20151110', ['foobaz'])],
+            'mod': [FrozenRequirement('Mod', '1.0.0', ['mod'])],
+            'name': [FrozenRequirement('Name', '1.0.0', ['name'])],
             'pkg': [
-                FrozenRequirement('Pkg', '1.0.0'),
-                FrozenRequirement('Pkg-fork', '1.1.0')
+                FrozenRequirement('Pkg', '1.0.0', ['pkg']),
+                FrozenRequirement('Pkg-fork', '1.1.0', ['pkg'])
+            ],
+            'notebook': [FrozenRequirement('Notebook', '0.9.0', ['notebook'])],
+            'mainfoobar': [
+                FrozenRequirement('min-foo-bar', '0.10.0rc0', ['mainfoobar'])
+            ],
+            'annotations': [
+                FrozenRequirement('annotations', '0.0.1', ['annotations'])
+            ],
+            'annotationsa': [
+                FrozenRequirement('annotations-a', '0.0.1', ['annotationsa'])
+            ],
+            'annotationsb': [
+                FrozenRequirement('annotations-b', '0.0.1', ['annotationsb'])
+            ],
+            'annotationsc': [
+                FrozenRequirement('annotations-c', '0.0.1', ['annotationsc'])
             ],
-            'notebook': [FrozenRequirement('Notebook', '0.9.0')],
-            'mainfoobar': [FrozenRequirement('min-foo-bar', '0.10.0rc0')],
-            'annotations': [FrozenRequirement('annotations', '0.0.1')],
-            'annotationsa': [FrozenRequirement('annotations-a', '0.0.1')],
-            'annotationsb': [FrozenRequirement('annotations-b', '0.0.1')],
-            'annotationsc': [FrozenRequirement('annotations-c', '0.0.1')],
         }
         self._path = os.path.abspath(
             os.path.join(os.path.dirname(__file__), 'data/imports_example/')
@@ -73,15 +92,19 @@ class RequirementsAnalyzerTests(unittest.TestCase):
     def tearDown(self):
         pass
 
-    def test_analyze_requirements(self):
-        analyzer = RequirementsAnalyzer(self._path)
+    def _new_analyzer(self):
         dist_mapping = {
             req.name: req
             for reqs in self._installed_dists_by_imports.values()
             for req in reqs
         }
-        analyzer._installed_dists = dist_mapping
-        analyzer._installed_dists_by_imports = self._installed_dists_by_imports
+        analyzer = RequirementsAnalyzer(
+            self._path, installed_dists=dist_mapping
+        )
+        return analyzer, dist_mapping
+
+    def test_analyze_requirements(self):
+        analyzer, dist_mapping = self._new_analyzer()
         analyzer.analyze_requirements(
             visit_doc_str=True, enable_requirement_annotations=True
         )
@@ -121,6 +144,252 @@ class RequirementsAnalyzerTests(unittest.TestCase):
             self.assertIsNotNone(expected_locs)
             self.assertEqual(locs.sorted_items(), expected_locs)
 
+    def test_analyze_requirements_async(self):
+        expected, _ = self._new_analyzer()
+        expected.analyze_requirements(
+            visit_doc_str=True, enable_requirement_annotations=True
+        )
+        analyzer, _ = self._new_analyzer()
+
+        async def _main():
+            # Awaited in the running event loop.
+            await analyzer.analyze_requirements_async(
+                visit_doc_str=True, enable_requirement_annotations=True, jobs=2
+            )
+
+        asyncio.run(_main())
+        for attr in (
+            '_requirements', '_uncertain_requirements', '_unknown_imports'
+        ):
+            self.assertEqual(
+                repr(getattr(analyzer, attr)), repr(getattr(expected, attr))
+            )
+
+    def test_analyze_requirements_stop_early(self):
+        analyzer, _ = self._new_analyzer()
+        self.assertTrue(
+            analyzer.analyze_requirements(stop_early=lambda req: False)
+        )
+
+        found = []
+
+        def _stop_early(req):
+            found.append(req.name)
+            return True
+
+        analyzer, _ = self._new_analyzer()
+        self.assertFalse(analyzer.analyze_requirements(stop_early=_stop_early))
+        self.assertEqual(len(found), 1)
+        self.assertLess(
+            len(analyzer._requirements), len(self._certain_requirements)
+        )
+
+    def test_cached_result(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+
+            def _load(installed_dists, *key):
+                analyzer = RequirementsAnalyzer(
+                    self._path,
+                    cache_dir=cache_dir,
+                    installed_dists=installed_dists
+                )
+                loaded = analyzer.load_cached_result(
+                    list_project_files(self._path), *key
+                )
+                return analyzer, loaded
+
+            analyzer, dist_mapping = self._new_analyzer()
+            expected, loaded = _load(dist_mapping, True)
+            self.assertFalse(loaded)
+            expected.analyze_requirements(
+                visit_doc_str=True, enable_requirement_annotations=True
+            )
+            expected.save_cached_result()
+
+            analyzer, loaded = _load(dist_mapping, True)
+            self.assertTrue(loaded)
+            for attr in (
+                '_requirements', '_uncertain_requirements', '_unknown_imports'
+            ):
+                self.assertEqual(
+                    repr(getattr(analyzer, attr)),
+                    repr(getattr(expected, attr))
+                )
+            self.assertFalse(_load(dist_mapping, False)[1])
+            dist_mapping = dict(dist_mapping)
+            dist_mapping['Foo'] = FrozenRequirement('Foo', '0.2.0', ['foo'])
+            self.assertFalse(_load(dist_mapping, True)[1])
+
+    def test_analyze_requirements_with_index_search(self):
+        analyzer, _ = self._new_analyzer()
+        db = unittest.mock.MagicMock()
+        db.query_distributions_by_top_level_module.side_effect = (
+            lambda name: [Distribution('foo-bar', '1.0')]
+            if name == 'foobar' else None
+        )
+        versions = []
+
+        async def _get_latest_version(pypi_dists, name, **kwargs):
+            versions.append(name)
+            return '1.1'
+
+        with unittest.mock.patch(
+            'pigar.core.database'
+        ) as database, unittest.mock.patch(
+            'pigar.core.PyPIDistributions.get_latest_distribution_version',
+            _get_latest_version
+        ):
+            database.return_value.__enter__.return_value = db
+            asyncio.run(
+                analyzer.analyze_requirements_async(
+                    visit_doc_str=True,
+                    enable_requirement_annotations=True,
+                    search_index=True,
+                )
+            )
+
+        self.assertEqual(versions, ['foo-bar'])
+        self.assertEqual(analyzer._unknown_imports, {})
+        req = analyzer._requirements['foo-bar']
+        self.assertEqual(req.req.version, '1.1')
+        self.assertEqual(req.locations.sorted_items(), self._guess['foobar'])
+
+
+class IndexSearcherTests(unittest.TestCase):
+
+    def test_prefetch_and_discard(self):
+        db = unittest.mock.MagicMock()
+        db.query_distributions_by_top_level_module.side_effect = (
+            lambda name: [
+                Distribution(f'{name}-a', '1.0'),
+                Distribution(f'{name}-b', '1.0'),
+            ]
+        )
+        pypi_dists = unittest.mock.MagicMock()
+        requested = []
+
+        async def _get_latest_version(name, **kwargs):
+            requested.append(name)
+            await asyncio.sleep(0.1)
+            return '2.0'
+
+        pypi_dists.get_latest_distribution_version = _get_latest_version
+
+        async def _main():
+            searcher = _IndexSearcher(pypi_dists, max_prefetches=3)
+            searcher.prefetch('foo', {'foo'})
+            # Out of the budget.
+            searcher.prefetch('bar', {'bar'})
+            self.assertEqual(
+                sorted(searcher._latest_versions), ['foo-a', 'foo-b']
+            )
+            searcher.discard('foo')
+            self.assertEqual(searcher._latest_versions, {})
+            req = await searcher.latest_version('bar-a')
+            await searcher.close()
+            return req
+
+        with unittest.mock.patch('pigar.core.database') as database:
+            database.return_value.__enter__.return_value = db
+            req = asyncio.run(_main())
+        self.assertEqual((req.name, req.version), ('bar-a', '2.0'))
+        self.assertEqual(requested, ['bar-a'])
+
+
+class ProjectModuleIndexTests(unittest.TestCase):
+
+    def test_is_user_module(self):
+        root = os.path.join(os.sep, 'path', 'to', 'project')
+        files = [
+            os.path.join(root, *path.split('/')) for path in [
+                'script.py', 'pkg/__init__.py', 'pkg/sub.py', 'nspkg/mod.py',
+                'shadowed.py', 'shadowed/sub.py', 'src/srcpkg/__init__.py',
+                'bad-name/mod.py', 'json/mod.py', 'requests.py', 'sys.py',
+                'notebook.ipynb', 'main.py', 'localns/mod.py'
+            ]
+        ]
+        installed_imports = ImportNameIndex(
+            [FrozenRequirement('NsPkg', '1.0', ['nspkg'])]
+        )
+        index = ProjectModuleIndex(
+            root, files, installed_imports=installed_imports
+        )
+        importer = os.path.join(root, 'main.py')
+        for name, expected in [
+            ('.relative', True),
+            ('project.foo', True),
+            ('script', True),
+            ('pkg', True),
+            ('pkg.sub', True),
+            ('pkg.missing', True),
+            ('nspkg', False),
+            ('nspkg.mod', False),
+            ('localns', True),
+            ('localns.mod', True),
+            ('shadowed', True),
+            ('shadowed.sub', True),
+            ('srcpkg', True),
+            ('src.srcpkg', True),
+            ('mod', False),
+            ('json', False),
+            ('sys', False),
+            ('notebook', False),
+            ('requests', True),
+            ('foo', False),
+        ]:
+            module = Module(name, False, importer, 1)
+            self.assertEqual(index.is_user_module(module), expected, name)
+
+        self.assertEqual(
+            index.find('shadowed'),
+            (True, os.path.join(root, 'shadowed.py'))
+        )
+        self.assertEqual(index.find('shadowed.sub'), (False, None))
+        self.assertEqual(index.find('nspkg'), (False, None))
+        self.assertEqual(index.find('localns'), (True, None))
+
+        # Import the distribution with the same name as the file.
+        module = Module('requests', False, os.path.join(root, 'requests.py'), 1)
+        self.assertFalse(index.is_user_module(module))
+
+    def test_excluded_and_ignored_user_modules(self):
+        with tempfile.TemporaryDirectory() as root:
+            for path, code in [
+                ('.gitignore', '*_pb2.py\n'),
+                ('api_pb2.py', 'import os\n'),
+                (os.path.join('gen', 'helper.py'), 'import os\n'),
+                ('fast.cpython-312-x86_64-linux-gnu.so', ''),
+                ('main.py', 'import api_pb2\nimport gen.helper\nimport fast\n'),
+            ]:
+                path = os.path.join(root, path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'w') as f:
+                    f.write(code)
+            analyzer = RequirementsAnalyzer(root, installed_dists={})
+            analyzer.analyze_requirements(ignores=['gen'])
+            self.assertEqual(dict(analyzer._unknown_imports), {})
+            self.assertEqual(dict(analyzer._requirements), {})
+
+    def test_namespace_package_shadowed_by_distribution(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, 'yaml'))
+            for path, code in [
+                (os.path.join('yaml', 'helper.py'), 'import os\n'),
+                ('main.py', 'import yaml\n'),
+            ]:
+                with open(os.path.join(root, path), 'w') as f:
+                    f.write(code)
+            pyyaml = FrozenRequirement('PyYAML', '6.0.3', ['yaml'])
+            analyzer = RequirementsAnalyzer(
+                root, installed_dists={'pyyaml': pyyaml}
+            )
+            analyzer.analyze_requirements()
+            self.assertEqual(list(analyzer._requirements.keys()), ['PyYAML'])
+            self.assertEqual(
+                analyzer._requirements['PyYAML'].locations.sorted_items(),
+                [os.path.join(root, 'main.py') + ': 1']
+            )
+
 
 class StdlibTest(unittest.TestCase):
 
@@ -153,6 +422,47 @@ class StdlibTest(unittest.TestCase):
         for lib in ['asynchat', 'asyncore', 'smtpd']:
             self.assertTrue(self._is_stdlib(lib), lib)
 
+    def test_stdlibs_of_target_python_versions(self):
+        for name, versions in [
+            ('os', TARGET_PYTHON_VERSIONS),
+            ('os.path', TARGET_PYTHON_VERSIONS),
+            ('tomllib', ['3.11', '3.12', '3.13', '3.14']),
+            ('zoneinfo', ['3.9', '3.10', '3.11', '3.12', '3.13', '3.14']),
+            ('asyncore', ['3.8', '3.9', '3.10', '3.11']),
+            ('distutils', ['3.8', '3.9', '3.10', '3.11']),
+            ('annotationlib', ['3.14']),
+            ('_apple_support', ['3.13', '3.14']),
+            ('requests', []),
+        ]:
+            for version in TARGET_PYTHON_VERSIONS:
+                yes, _ = check_stdlib(name, parse_python_version(version))
+                self.assertEqual(yes, version in versions, (name, version))
+
+    @unittest.skipIf(Version(py_version()) < Version('3.10'), '< Py3.10')
+    def test_stdlib_table_of_running_python(self):
+        version = '{0}.{1}'.format(*sys.version_info[:2])
+        if version not in TARGET_PYTHON_VERSIONS:
+            self.skipTest(f'no table for Python {version}')
+        # Hide the names of the running Python to check the table.
+        with unittest.mock.patch.object(
+            sys, 'stdlib_module_names', None, create=True
+        ):
+            names = stdlib_module_names(parse_python_version(version))
+        self.assertTrue(names.issuperset(sys.stdlib_module_names))
+
+    def test_check_stdlib_does_not_import(self):
+        with tempfile.TemporaryDirectory() as path:
+            with open(os.path.join(path, 'pigar_boom.py'), 'w') as f:
+                f.write('raise RuntimeError("imported")\n')
+            sys.path.insert(0, path)
+            try:
+                yes, code_path = check_stdlib('pigar_boom.sub')
+            finally:
+                sys.path.remove(path)
+            self.assertFalse(yes)
+            self.assertEqual(code_path, os.path.join(path, 'pigar_boom.py'))
+            self.assertNotIn('pigar_boom', sys.modules)
+
     def _is_stdlib(self, name):
         yes, _ = check_stdlib(name)
         return yes
@@ -175,11 +485,15 @@ class LocationsTests(unittest.TestCase):
             if file not in loc:
                 self.fail('add "{0}" failed'.format(file))
             else:
-                self.assertEqual(loc[file], [self._data[file]])
+                self.assertEqual(list(loc[file]), [self._data[file]])
 
         loc.add('oo/xx.py', 2)
         self.assertListEqual(sorted(loc['oo/xx.py']), [2, 33])
 
+        for lineno in (40, 2, 33, 5, 40):
+            loc.add('oo/xx.py', lineno)
+        self.assertListEqual(list(loc['oo/xx.py']), [2, 5, 33, 40])
+
     def test_extend(self):
         loc1 = _Locations()
         loc2 = _Locations()
@@ -190,7 +504,7 @@ class LocationsTests(unittest.TestCase):
         loc1.extend(loc2)
 
         self.assertListEqual(
-            sorted(loc1.items()),
+            sorted((k, list(v)) for k, v in loc1.items()),
             sorted([(k, [v]) for k, v in self._data.items()])
         )
 
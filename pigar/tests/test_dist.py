@@ -1,7 +1,19 @@
 import unittest
+import unittest.mock
 import os
+import json
+import shutil
+import tempfile
+import subprocess
 
-from ..dist import _parse_urls_from_html, _URLElement
+from .. import dist as dist_module
+from ..dist import (
+    _parse_urls_from_html, _URLElement, FrozenRequirement,
+    DistributionPathIndex, _scan_installed_distributions,
+    resolve_editable_requirements, ImportNameIndex,
+    narrow_distributions_by_import_names
+)
+from ..db import Distribution
 
 
 class HTMLParserTest(unittest.TestCase):
@@ -25,3 +37,282 @@ class HTMLParserTest(unittest.TestCase):
         self.assertEqual(len(expect), len(names))
         for i, e in enumerate(expect):
             self.assertEqual(str(e), str(names[i]))
+
+
+class DistributionPathIndexTest(unittest.TestCase):
+
+    def _req(self, name, *code_paths):
+        root = os.path.join(os.sep, 'site-packages')
+        return FrozenRequirement(
+            name, '1.0',
+            code_paths=set(os.path.join(root, p) for p in code_paths)
+        )
+
+    def test_find(self):
+        foo = self._req('foo', 'foo', 'foo_ext')
+        bar = self._req('bar', 'bar')
+        bar_plugin = self._req('bar-plugin', os.path.join('bar', 'plugin'))
+        index = DistributionPathIndex([foo, bar, bar_plugin])
+
+        def _find(*parts):
+            file = os.path.join(os.sep, 'site-packages', *parts)
+            return [req.name for req in index.find(file)]
+
+        self.assertEqual(_find('foo', '__init__.py'), ['foo'])
+        self.assertEqual(_find('foo_ext'), ['foo'])
+        self.assertEqual(_find('foo-1.0.dist-info', 'RECORD'), [])
+        self.assertEqual(_find('bar', 'plugin', 'x.py'), ['bar-plugin'])
+        self.assertEqual(_find('bar', 'pluginx.py'), ['bar'])
+        self.assertEqual(_find('bar', 'z', 'y.py'), ['bar'])
+        self.assertEqual(_find('baz.py'), [])
+        self.assertEqual(index.find(''), [])
+        self.assertEqual(index.conflicts(), {})
+
+    def test_conflicts(self):
+        a = self._req('a', 'ns')
+        b = self._req('b', 'ns', 'b')
+        index = DistributionPathIndex([a, b])
+        file = os.path.join(os.sep, 'site-packages', 'ns', 'x.py')
+        self.assertEqual([req.name for req in index.find(file)], ['a', 'b'])
+        self.assertEqual(
+            {
+                path: [req.name for req in reqs]
+                for path, reqs in index.conflicts().items()
+            },
+            {os.path.join(os.sep, 'site-packages', 'ns'): ['a', 'b']},
+        )
+
+
+class InstalledDistributionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._site = os.path.join(self._tmpdir.name, 'site-packages')
+        self._cache_dir = os.path.join(self._tmpdir.name, 'cache')
+        os.makedirs(self._site)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _install(
+        self, name, version, records=(), direct_url=None, top_level=None
+    ):
+        dist_info = os.path.join(self._site, f'{name}-{version}.dist-info')
+        os.makedirs(dist_info)
+        os.makedirs(os.path.join(self._site, name), exist_ok=True)
+        files = {
+            'METADATA':
+                f'Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n',
+            'RECORD':
+                f'{name}/__init__.py,,\n{name}-{version}.dist-info/RECORD,,\n' +
+                ''.join(f'{r},,\n' for r in records),
+            'top_level.txt': f'{top_level or name}\n',
+        }
+        if direct_url is not None:
+            files['direct_url.json'] = json.dumps(direct_url)
+        for fname, content in files.items():
+            with open(os.path.join(dist_info, fname), 'w') as f:
+                f.write(content)
+        with open(os.path.join(self._site, name, '__init__.py'), 'w'):
+            pass
+        return dist_info
+
+    def _scan(self):
+        from_dist = FrozenRequirement.from_dist
+        with unittest.mock.patch.object(
+            FrozenRequirement, 'from_dist', side_effect=from_dist
+        ) as mocked:
+            reqs = _scan_installed_distributions(
+                [self._site], self._cache_dir
+            )
+        built = sorted(call.args[0].name for call in mocked.call_args_list)
+        return sorted((r.name, r.version) for r in reqs), built
+
+    def test_code_paths(self):
+        self._install(
+            'foo',
+            '1.0',
+            records=[
+                '../../bin/foo', '__pycache__/foo.cpython.pyc', 'foo/sub/a.py',
+                '"foo_ext.py"', 'missing/b.py', '/abs/c.py'
+            ],
+        )
+        with open(os.path.join(self._site, 'foo_ext.py'), 'w'):
+            pass
+        os.makedirs(os.path.join(self._site, '__pycache__'))
+        reqs = _scan_installed_distributions([self._site], self._cache_dir)
+        self.assertEqual(len(reqs), 1)
+        self.assertIsNone(reqs[0]._code_paths)
+        self.assertEqual(
+            reqs[0].code_paths, {
+                os.path.join(self._site, 'foo'),
+                os.path.join(self._site, 'foo_ext.py')
+            }
+        )
+
+    def test_import_name_index_with_namespace_packages(self):
+        self._install(
+            'google-cloud-storage',
+            '2.0',
+            records=['google/cloud/storage/__init__.py'],
+            top_level='google'
+        )
+        self._install(
+            'google-cloud-core',
+            '2.0',
+            records=[
+                'google/cloud/client.py', 'google/cloud/_helpers.py',
+                'google/cloud/__pycache__/client.cpython-312.pyc'
+            ],
+            top_level='google'
+        )
+        self._install(
+            'protobuf',
+            '5.0',
+            records=[
+                'google/protobuf/__init__.py',
+                'google/_upb/_message.abi3.so',
+            ],
+            top_level='google'
+        )
+        index = ImportNameIndex(
+            _scan_installed_distributions([self._site])
+        )
+
+        def _lookup(name):
+            import_name, reqs = index.lookup(name)
+            return import_name, sorted(req.name for req in reqs)
+
+        all_google = ['google-cloud-core', 'google-cloud-storage', 'protobuf']
+        self.assertEqual(_lookup('google'), ('google', all_google))
+        self.assertEqual(_lookup('google.auth'), ('google', all_google))
+        self.assertEqual(
+            _lookup('google.cloud.storage.blob'),
+            ('google.cloud.storage', ['google-cloud-storage'])
+        )
+        self.assertEqual(
+            _lookup('google.cloud.client'),
+            ('google.cloud.client', ['google-cloud-core'])
+        )
+        self.assertEqual(
+            _lookup('google.cloud'),
+            ('google.cloud', ['google-cloud-core', 'google-cloud-storage'])
+        )
+        self.assertEqual(
+            _lookup('google.protobuf.message'),
+            ('google.protobuf', ['protobuf'])
+        )
+        self.assertEqual(
+            _lookup('google._upb._message'), ('google._upb', ['protobuf'])
+        )
+        self.assertEqual(_lookup('foo'), ('', []))
+
+    def test_narrow_distributions_by_import_names(self):
+        dists = [
+            Distribution('google-cloud-storage', '2.0'),
+            Distribution('google_cloud_bigquery_storage', '2.0'),
+            Distribution('google-auth', '2.0'),
+        ]
+
+        def _narrow(*import_names):
+            return [
+                d.name
+                for d in narrow_distributions_by_import_names(
+                    dists, import_names
+                )
+            ]
+
+        self.assertEqual(
+            _narrow('google.cloud.storage.blob'), ['google-cloud-storage']
+        )
+        self.assertEqual(
+            _narrow('google.auth', 'google.cloud.bigquery_storage'),
+            ['google-auth', 'google_cloud_bigquery_storage']
+        )
+        all_names = [d.name for d in dists]
+        self.assertEqual(_narrow('google.protobuf'), all_names)
+        self.assertEqual(_narrow('google.auth', 'google'), all_names)
+
+    def test_cache_invalidation(self):
+        foo_dist_info = self._install('foo', '1.0')
+        self.assertEqual(self._scan(), ([('foo', '1.0')], ['foo']))
+        self.assertEqual(self._scan(), ([('foo', '1.0')], []))
+
+        self._install('bar', '2.0')
+        self.assertEqual(
+            self._scan(), ([('bar', '2.0'), ('foo', '1.0')], ['bar'])
+        )
+
+        # Reinstall the same version, the inode may be reused, and the
+        # mtime is moved forward in case of coarse timestamps.
+        st = os.stat(foo_dist_info)
+        shutil.rmtree(foo_dist_info)
+        self._install('foo', '1.0')
+        os.utime(foo_dist_info, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertEqual(
+            self._scan(), ([('bar', '2.0'), ('foo', '1.0')], ['foo'])
+        )
+        reqs, _ = self._scan()
+        self.assertEqual(reqs, [('bar', '2.0'), ('foo', '1.0')])
+
+        shutil.rmtree(foo_dist_info)
+        self.assertEqual(self._scan(), ([('bar', '2.0')], []))
+
+    @unittest.skipIf(shutil.which('git') is None, 'git is not installed')
+    def test_editable_from_direct_url(self):
+        project = os.path.join(self._tmpdir.name, 'project')
+        os.makedirs(project)
+        self._install(
+            'foo',
+            '1.0',
+            direct_url={
+                'url': 'file://' + project,
+                'dir_info': {
+                    'editable': True
+                }
+            }
+        )
+        self._install('bar', '1.0', direct_url={'url': 'file://' + project})
+
+        def _git(*args):
+            subprocess.check_call(
+                [
+                    'git', '-c', 'user.name=pigar', '-c',
+                    'user.email=pigar@localhost', *args
+                ],
+                cwd=project,
+            )
+
+        _git('init', '-q')
+        _git('commit', '-q', '--allow-empty', '-m', 'init')
+
+        def _resolve():
+            reqs = {
+                r.name: r
+                for r in _scan_installed_distributions(
+                    [self._site], self._cache_dir
+                )
+            }
+            self.assertFalse(reqs['bar'].editable)
+            foo = reqs['foo']
+            self.assertTrue(foo.editable)
+            self.assertIsNone(foo._editable_info)
+            with unittest.mock.patch(
+                'pigar.dist._get_editable_info',
+                side_effect=dist_module._get_editable_info
+            ) as mocked:
+                resolve_editable_requirements(
+                    reqs.values(), cache_dir=self._cache_dir
+                )
+            return foo, mocked.call_count
+
+        foo, probes = _resolve()
+        self.assertEqual(probes, 1)
+        self.assertEqual(
+            foo.as_requirement(), '# Editable Git install with no remote '
+            f'(foo==1.0)\n-e {os.path.normcase(project)}'
+        )
+        # The cached VCS information is reused until HEAD changes.
+        self.assertEqual(_resolve()[1], 0)
+        _git('commit', '-q', '--allow-empty', '-m', 'next')
+        self.assertEqual(_resolve()[1], 1)
@@ -0,0 +1,123 @@
+import io
+import os
+import json
+import tempfile
+import unittest
+
+from ..dist import (
+    FrozenRequirement, ImportNameIndex, _scan_installed_distributions
+)
+from ..envsnapshot import (
+    EnvSnapshotError, dump_env_snapshot, load_env_snapshot
+)
+
+
+class EnvSnapshotTests(unittest.TestCase):
+
+    def _dump(self, dists):
+        buf = io.StringIO()
+        dump_env_snapshot(dists, buf)
+        return buf.getvalue()
+
+    def test_dump_and_load(self):
+        dists = [
+            FrozenRequirement(
+                'Foo.Bar', '1.0', ['foo'], code_paths={'/site/foo'}
+            ),
+            FrozenRequirement(
+                'baz',
+                '2.0', ['baz', 'baz_ext'],
+                editable=True,
+                url='git+https://example.com/baz@abc#egg=baz',
+                comments=['# Editable install'],
+                code_paths=set()
+            ),
+        ]
+        content = self._dump(dists)
+        self.assertTrue(
+            content.startswith('{"format": "pigar-env-snapshot", "version": 2')
+        )
+        self.assertEqual(content, self._dump(reversed(dists)))
+
+        loaded = load_env_snapshot(io.StringIO(content))
+        self.assertEqual(sorted(loaded), ['baz', 'foo-bar'])
+        foo, baz = loaded['foo-bar'], loaded['baz']
+        self.assertEqual(
+            (foo.name, foo.version, foo.modules, foo.code_paths, foo.editable),
+            ('Foo.Bar', '1.0', ['foo'], {'/site/foo'}, False),
+        )
+        self.assertEqual(str(foo), 'Foo.Bar==1.0')
+        self.assertEqual(
+            str(baz), '# Editable install\n'
+            '-e git+https://example.com/baz@abc#egg=baz'
+        )
+
+    def test_load_invalid(self):
+        content = self._dump([FrozenRequirement('foo', '1.0', ['foo'])])
+        snapshot = json.loads(content)
+        for mutate, error in [
+            (lambda s: s.update(format='other'), 'not an environment'),
+            (lambda s: s.update(version=100), 'unsupported snapshot version'),
+            (
+                lambda s: s['distributions'][0].update(version='2.0'),
+                'content hash mismatch'
+            ),
+        ]:
+            invalid = json.loads(content)
+            mutate(invalid)
+            with self.assertRaisesRegex(EnvSnapshotError, error):
+                load_env_snapshot(io.StringIO(json.dumps(invalid)))
+        with self.assertRaisesRegex(EnvSnapshotError, 'invalid JSON'):
+            load_env_snapshot(io.StringIO(content[:-3]))
+        self.assertEqual(
+            list(load_env_snapshot(io.StringIO(json.dumps(snapshot)))),
+            ['foo']
+        )
+
+    def test_namespace_packages(self):
+        with tempfile.TemporaryDirectory() as site:
+            for name, top_level, records in [
+                (
+                    'protobuf', 'google',
+                    ['google/protobuf/__init__.py', 'google/_upb/_m.abi3.so']
+                ),
+                (
+                    'google-cloud-storage', 'google',
+                    ['google/cloud/storage/__init__.py']
+                ),
+                ('google-cloud-core', 'google', ['google/cloud/client.py']),
+                ('foo', 'foo', ['foo/__init__.py']),
+            ]:
+                dist_info = os.path.join(site, f'{name}-1.0.dist-info')
+                os.makedirs(dist_info)
+                for fname, content in [
+                    (
+                        'METADATA',
+                        f'Metadata-Version: 2.1\nName: {name}\nVersion: 1.0\n'
+                    ),
+                    ('RECORD', ''.join(f'{r},,\n' for r in records)),
+                    ('top_level.txt', f'{top_level}\n'),
+                ]:
+                    with open(os.path.join(dist_info, fname), 'w') as f:
+                        f.write(content)
+            live = _scan_installed_distributions([site])
+            content = self._dump(live)
+        loaded = load_env_snapshot(io.StringIO(content))
+        self.assertNotIn('namespaces', json.loads(content)['distributions'][0])
+
+        for name in [
+            'google', 'google.protobuf', 'google._upb._m', 'google.cloud',
+            'google.cloud.storage.blob', 'google.cloud.client', 'google.auth',
+            'foo.bar'
+        ]:
+            expected = ImportNameIndex(live).lookup(name)
+            actual = ImportNameIndex(loaded.values()).lookup(name)
+            self.assertEqual(
+                (actual[0], sorted(req.name for req in actual[1])),
+                (expected[0], sorted(req.name for req in expected[1])),
+                name,
+            )
+        self.assertEqual(
+            ImportNameIndex(loaded.values()).lookup('google.protobuf')[0],
+            'google.protobuf'
+        )
@@ -0,0 +1,279 @@
+import os
+import os.path
+import shutil
+import subprocess
+import unittest
+import unittest.mock
+import tempfile
+
+from ..gitindex import (
+    find_git_work_tree, read_git_index, list_tracked_files, read_git_head,
+    git_changed_files, git_rev_parse, GitCommandError
+)
+from ..core import RequirementsAnalyzer
+from ..log import logger
+from ..parser import parse_imports, is_project_file
+from ..cache import ParseCache, file_digest, dump_cache_file
+
+
+@unittest.skipIf(shutil.which('git') is None, 'git is not installed')
+class GitIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._repo = os.path.join(self._tmpdir.name, 'repo')
+        self._project = os.path.join(self._repo, 'project')
+        for path, content in [
+            ('top.py', 'import top\n'),
+            ('project/a.py', 'import foo\n'),
+            ('project/pkg/b.py', 'import bar\n'),
+            ('project/venv/c.py', 'import venv_only\n'),
+            ('project/notes.txt', 'import nothing\n'),
+        ]:
+            self._write(path, content)
+        self._git('init', '-q')
+        self._git('add', '.')
+        self._write('project/untracked.py', 'import untracked\n')
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _write(self, path, content):
+        path = os.path.join(self._repo, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def _git(self, *args):
+        subprocess.check_call(['git', *args], cwd=self._repo)
+
+    def _commit(self):
+        self._git(
+            '-c', 'user.name=pigar', '-c', 'user.email=pigar@localhost',
+            'commit', '-q', '--allow-empty', '-m', 'commit'
+        )
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=self._repo).decode().strip()
+
+    def test_read_git_index(self):
+        for index_version in ('2', '3', '4'):
+            self._git('update-index', '--index-version', index_version)
+            entries = list(
+                read_git_index(os.path.join(self._repo, '.git', 'index'))
+            )
+            self.assertEqual(
+                [e.path for e in entries], [
+                    'project/a.py', 'project/notes.txt', 'project/pkg/b.py',
+                    'project/venv/c.py', 'top.py'
+                ]
+            )
+            for entry in entries:
+                self.assertEqual(
+                    entry.sha1,
+                    file_digest(os.path.join(self._repo, entry.path))
+                )
+
+    def test_find_git_work_tree_with_gitdir_file(self):
+        self.assertEqual(
+            find_git_work_tree(self._project),
+            (self._repo, os.path.join(self._repo, '.git'))
+        )
+        worktree = os.path.join(self._tmpdir.name, 'worktree')
+        os.makedirs(worktree)
+        with open(os.path.join(worktree, '.git'), 'w') as f:
+            f.write('gitdir: ../repo/.git\n')
+        self.assertEqual(
+            find_git_work_tree(worktree),
+            (worktree, os.path.join(self._repo, '.git'))
+        )
+
+    def test_list_tracked_files(self):
+        files = list_tracked_files(self._project)
+        self.assertEqual(
+            sorted(os.path.relpath(f, self._project) for f in files),
+            ['a.py', 'notes.txt', 'pkg/b.py', 'venv/c.py'],
+        )
+        files = list_tracked_files(self._project, suffixes=('.py', ))
+        self.assertEqual(
+            sorted(os.path.relpath(f, self._project) for f in files),
+            ['a.py', 'pkg/b.py', 'venv/c.py'],
+        )
+        self.assertIsNone(list_tracked_files(self._tmpdir.name))
+
+    def test_parse_imports_from_git(self):
+        modules, _ = parse_imports(self._project, files_from_git=True)
+        self.assertEqual(sorted(m.name for m in modules), ['bar', 'foo'])
+        modules, _ = parse_imports(
+            self._project, exclude_patterns=['pkg'], files_from_git=True
+        )
+        self.assertEqual([m.name for m in modules], ['foo'])
+
+        # Fall back to walking outside a git work tree.
+        shutil.rmtree(os.path.join(self._repo, '.git'))
+        modules, _ = parse_imports(self._project, files_from_git=True)
+        self.assertEqual(
+            sorted(m.name for m in modules), ['bar', 'foo', 'untracked']
+        )
+
+    def test_ignore_files_with_files_from_git(self):
+        # The tracked files are not ignored by .gitignore.
+        self._write('project/.gitignore', 'a.py\n')
+        self._write('project/.pigarignore', 'pkg/\n')
+        modules, _ = parse_imports(self._project, files_from_git=True)
+        self.assertEqual([m.name for m in modules], ['foo'])
+        modules, _ = parse_imports(
+            self._project, use_ignore_files=False, files_from_git=True
+        )
+        self.assertEqual(sorted(m.name for m in modules), ['bar', 'foo'])
+        modules, _ = parse_imports(self._project)
+        self.assertEqual(sorted(m.name for m in modules), ['untracked'])
+
+        for path, expected in [('a.py', True), ('pkg/b.py', False)]:
+            fpath = os.path.join(self._project, path)
+            self.assertEqual(
+                is_project_file(self._project, fpath, files_from_git=True),
+                expected, path
+            )
+        self.assertFalse(
+            is_project_file(
+                self._project, os.path.join(self._project, 'a.py')
+            )
+        )
+
+    def test_parse_cache_with_index_digests(self):
+        cache_dir = os.path.join(self._tmpdir.name, 'cache')
+        for expected in [(0, 2), (2, 0)]:
+            cache = ParseCache(cache_dir, self._project)
+            parse_imports(self._project, files_from_git=True, cache=cache)
+            self.assertEqual((cache.hits, cache.misses), expected)
+
+        # A fresh checkout changes mtimes but not the staged content.
+        fpath = os.path.join(self._project, 'a.py')
+        st = os.stat(fpath)
+        os.utime(fpath, ns=(st.st_atime_ns, st.st_mtime_ns - 10**10))
+        self._git('add', fpath)
+        cache = ParseCache(cache_dir, self._project)
+        modules, _ = parse_imports(
+            self._project, files_from_git=True, cache=cache
+        )
+        self.assertEqual((cache.hits, cache.misses), (2, 0))
+        self.assertEqual(sorted(m.name for m in modules), ['bar', 'foo'])
+
+    def test_read_git_head(self):
+        git_dir = os.path.join(self._repo, '.git')
+        self.assertIsNone(read_git_head(git_dir))
+        head = self._commit()
+        self.assertEqual(read_git_head(git_dir), head)
+        self._git('pack-refs', '--all')
+        head = self._commit()
+        self.assertEqual(read_git_head(git_dir), head)
+        self._git('pack-refs', '--all')
+        self.assertEqual(read_git_head(git_dir), head)
+
+        worktree = os.path.join(self._tmpdir.name, 'worktree')
+        self._git('worktree', 'add', '-q', '--detach', worktree)
+        self.assertEqual(read_git_head(find_git_work_tree(worktree)[1]), head)
+
+    def test_git_changed_files(self):
+        head = self._commit()
+        self.assertEqual(git_rev_parse(self._project, 'HEAD'), head)
+        with self.assertRaises(GitCommandError):
+            git_rev_parse(self._project, 'no-such-ref')
+
+        self._write('project/a.py', 'import foobar\n')
+        self._git('mv', 'project/pkg/b.py', 'project/pkg/c.py')
+        changed, untracked = git_changed_files(self._project, head)
+        self.assertEqual(
+            sorted(changed), [
+                os.path.join(self._project, 'a.py'),
+                os.path.join(self._project, 'pkg', 'b.py'),
+                os.path.join(self._project, 'pkg', 'c.py'),
+            ]
+        )
+        self.assertEqual(
+            untracked, [os.path.join(self._project, 'untracked.py')]
+        )
+
+    def test_analyze_requirements_since(self):
+        cache_dir = os.path.join(self._tmpdir.name, 'cache')
+
+        def _analyze(since=None):
+            analyzer = RequirementsAnalyzer(self._project, installed_dists={})
+            analyzer.analyze_requirements(cache_dir=cache_dir, since=since)
+            return {
+                name: locs.sorted_items()
+                for name, locs in analyzer._unknown_imports.items()
+            }
+
+        self._commit()
+        self._git('tag', 'base')
+        # No manifest, all files are analyzed and the manifest is saved.
+        self.assertEqual(
+            sorted(_analyze(since='base')), ['bar', 'foo', 'untracked']
+        )
+
+        self._write('project/a.py', 'import foobar\n')
+        self._git('mv', 'project/pkg/b.py', 'project/pkg/c.py')
+        self._write('project/pkg/d.py', 'import bar\nimport baz\n')
+        self._write('project/venv/e.py', 'import excluded\n')
+        os.remove(os.path.join(self._project, 'untracked.py'))
+        with self.assertLogs(logger, 'INFO') as logs:
+            incremental = _analyze(since='base')
+        self.assertIn('3 files changed since base', '\n'.join(logs.output))
+        self.assertEqual(incremental, _analyze())
+        self._commit()
+        self.assertEqual(_analyze(since='base'), _analyze())
+        self.assertEqual(sorted(_analyze()), ['bar', 'baz', 'foobar'])
+
+    def test_analyze_requirements_since_dirty_and_ignore_files(self):
+        cache_dir = os.path.join(self._tmpdir.name, 'cache')
+
+        def _analyze(since=None):
+            analyzer = RequirementsAnalyzer(self._project, installed_dists={})
+            with unittest.mock.patch(
+                'pigar.core.dump_cache_file', wraps=dump_cache_file
+            ) as dump:
+                analyzer.analyze_requirements(cache_dir=cache_dir, since=since)
+            imports = {
+                name: locs.sorted_items()
+                for name, locs in analyzer._unknown_imports.items()
+            }
+            return imports, dump.call_count
+
+        self._commit()
+        self._git('tag', 'base')
+        self.assertEqual(_analyze(since='base')[1], 1)
+        # The untracked file is parsed again and moved after the unchanged
+        # files, then nothing changes and the manifest is not rewritten.
+        self.assertEqual(_analyze(since='base'), (_analyze()[0], 1))
+        self.assertEqual(_analyze(since='base'), (_analyze()[0], 0))
+
+        # Changed, deleted and untracked files are saved as dirty files in
+        # the manifest at the same commit.
+        self._write('project/a.py', 'import foobar\n')
+        os.remove(os.path.join(self._project, 'pkg', 'b.py'))
+        self._write('project/pkg/d.py', 'import baz\n')
+        imports, dumped = _analyze(since='base')
+        self.assertEqual(imports, _analyze()[0])
+        self.assertEqual(sorted(imports), ['baz', 'foobar', 'untracked'])
+        self.assertEqual(dumped, 1)
+
+        # The reverted files are not changed since the ref any more, they
+        # are parsed again as the dirty files of the manifest.
+        self._git('checkout', '-q', '--', '.')
+        os.remove(os.path.join(self._project, 'pkg', 'd.py'))
+        with self.assertLogs(logger, 'INFO') as logs:
+            imports, dumped = _analyze(since='base')
+        self.assertIn('3 files changed since base', '\n'.join(logs.output))
+        self.assertEqual(imports, _analyze()[0])
+        self.assertEqual(sorted(imports), ['bar', 'foo', 'untracked'])
+        self.assertEqual(dumped, 1)
+
+        self._write('project/.gitignore', 'pkg/\n')
+        with self.assertLogs(logger, 'INFO') as logs:
+            imports, _ = _analyze(since='base')
+        self.assertIn(
+            'ignore files changed since base', '\n'.join(logs.output)
+        )
+        self.assertEqual(imports, _analyze()[0])
+        self.assertEqual(sorted(imports), ['foo', 'untracked'])
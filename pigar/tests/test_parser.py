@@ -0,0 +1,220 @@
+import os
+import os.path
+import unittest
+import json
+import tempfile
+import concurrent.futures
+
+import nbformat
+
+from ..parser import parse_imports, iter_imports, _parse_file, _may_contain_imports
+from ..cache import ParseCache, ResultCache
+from ..notebook import read_code_cells
+
+
+class ParseImportsTests(unittest.TestCase):
+
+    def setUp(self):
+        self._path = os.path.abspath(
+            os.path.join(os.path.dirname(__file__), 'data/imports_example/')
+        )
+
+    def _parse_imports(self, **kwargs):
+        return parse_imports(
+            self._path,
+            visit_doc_str=True,
+            parse_requirement_annotations=True,
+            **kwargs
+        )
+
+    def test_parse_imports_in_parallel(self):
+        expected = self._parse_imports()
+        self.assertGreater(len(expected[0]), 0)
+        self.assertGreater(len(expected[1]), 0)
+        self.assertEqual(self._parse_imports(jobs=2), expected)
+
+    def test_iter_imports(self):
+        modules, annotations = self._parse_imports()
+        files = []
+        streamed_modules, streamed_annotations = [], []
+        for file_imports in iter_imports(
+            self._path, visit_doc_str=True, parse_requirement_annotations=True
+        ):
+            files.append(file_imports.file)
+            for module in file_imports.modules:
+                self.assertEqual(module.file, file_imports.file)
+            streamed_modules.extend(file_imports.modules)
+            streamed_annotations.extend(file_imports.annotations)
+        self.assertEqual(len(files), len(set(files)))
+        self.assertEqual(streamed_modules, modules)
+        self.assertEqual(streamed_annotations, annotations)
+
+    def test_parse_imports_with_executor(self):
+        expected = self._parse_imports()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(self._parse_imports(executor=executor), expected)
+
+
+class ParseCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._project = os.path.join(self._tmpdir.name, 'project')
+        self._cache_dir = os.path.join(self._tmpdir.name, 'cache')
+        os.makedirs(self._project)
+        self._write('a.py', 'import foo\n')
+        self._write('broken.py', 'import bar\nif\n')
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _write(self, name, content):
+        with open(os.path.join(self._project, name), 'w') as f:
+            f.write(content)
+
+    def _parse_imports(self):
+        cache = ParseCache(self._cache_dir, self._project)
+        modules, _ = parse_imports(self._project, cache=cache)
+        return sorted(m.name for m in modules), cache
+
+    def test_unchanged_files_are_served_from_cache(self):
+        names, cache = self._parse_imports()
+        self.assertEqual(names, ['foo'])
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+        names, cache = self._parse_imports()
+        self.assertEqual(names, ['foo'])
+        self.assertEqual((cache.hits, cache.misses), (2, 0))
+
+    def test_changed_files_are_parsed_again(self):
+        self._parse_imports()
+        self._write('a.py', 'import foobaz\n')
+        names, cache = self._parse_imports()
+        self.assertEqual(names, ['foobaz'])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_result_cache(self):
+        files = [os.path.join(self._project, 'a.py')]
+
+        def _lookup(key='key', files=files, digests=None):
+            cache = ResultCache(self._cache_dir, self._project, key)
+            return cache, cache.lookup(files, digests)
+
+        cache, result = _lookup()
+        self.assertIsNone(result)
+        cache.store(['foo'])
+        self.assertEqual(_lookup()[1], ['foo'])
+        self.assertIsNone(_lookup(key='other')[1])
+        self.assertIsNone(
+            _lookup(files=files + [os.path.join(self._project, 'broken.py')])[1]
+        )
+        self.assertIsNone(_lookup(digests={files[0]: 'x' * 40})[1])
+
+        self._write('a.py', 'import foobaz\n')
+        cache, result = _lookup()
+        self.assertIsNone(result)
+        cache.store(['foobaz'])
+        self.assertEqual(_lookup()[1], ['foobaz'])
+
+
+class PreFilterTests(unittest.TestCase):
+
+    def test_may_contain_imports(self):
+        for code in [
+            b'import os',
+            b'from . import foo',
+            b'__import__("os")',
+            b'importlib.import_module("os")',
+            b'exec(code)',
+            b'eval(code)',
+            '# -*- coding: utf-8 -*-\nｅｘｅｃ("\\x69mport os")'.encode('utf-8'),
+            '# -*- coding: latin-1 -*-\nx = "é"'.encode('latin-1'),
+        ]:
+            self.assertTrue(_may_contain_imports(code), code)
+
+        for code in [
+            b'',
+            b'CONSTANTS = {"a": 1, "b": 2}',
+            '# 中文注释\nx = 1'.encode('utf-8'),
+        ]:
+            self.assertFalse(_may_contain_imports(code), code)
+
+    def test_skip_files_without_import_candidates(self):
+        with tempfile.TemporaryDirectory() as project:
+            fpath = os.path.join(project, 'data.py')
+            with open(fpath, 'w') as f:
+                f.write('DATA = [1, 2, 3]\n')
+            parsed = _parse_file(fpath, parse_requirement_annotations=True)
+            self.assertTrue(parsed.skipped)
+            self.assertEqual(parsed.modules, [])
+
+            with open(fpath, 'w') as f:
+                f.write('DATA = [1, 2, 3]  # pigar: required-imports=foo\n')
+            parsed = _parse_file(fpath, parse_requirement_annotations=True)
+            self.assertFalse(parsed.skipped)
+            self.assertEqual(len(parsed.annotations), 1)
+
+
+class NotebookTests(unittest.TestCase):
+
+    def _read_with_nbformat(self, raw):
+        nb = nbformat.reads(raw.decode('utf-8'), as_version=4)
+        return [cell.source for cell in nb.cells if cell.cell_type == 'code']
+
+    def test_read_code_cells(self):
+        path = os.path.join(
+            os.path.dirname(__file__), 'data/imports_example/notebook.ipynb'
+        )
+        with open(path, 'rb') as f:
+            raw = f.read()
+        self.assertEqual(read_code_cells(raw), self._read_with_nbformat(raw))
+
+        nb = nbformat.v4.new_notebook()
+        nb.cells = [
+            nbformat.v4.new_code_cell('import foo\nx = "\\"[{"\n'),
+            nbformat.v4.new_markdown_cell('import bar'),
+            nbformat.v4.new_code_cell(''),
+            nbformat.v4.new_code_cell('import 中文'),
+        ]
+        nb.cells[0].outputs = [
+            nbformat.v4.new_output(
+                'display_data',
+                data={'text/plain': '"}]\\', 'image/png': 'AAAA' * 1024}
+            )
+        ]
+        raw = nbformat.writes(nb).encode('utf-8')
+        self.assertEqual(read_code_cells(raw), self._read_with_nbformat(raw))
+        self.assertEqual(
+            read_code_cells(json.dumps(nb, separators=(',', ':')).encode()),
+            self._read_with_nbformat(raw),
+        )
+
+    def test_read_code_cells_fallback_to_nbformat(self):
+        nb = nbformat.v3.new_notebook(
+            worksheets=[
+                nbformat.v3.new_worksheet(
+                    cells=[nbformat.v3.new_code_cell(input='import foo')]
+                )
+            ]
+        )
+        raw = nbformat.writes(nb, version=3).encode('utf-8')
+        self.assertEqual(read_code_cells(raw), ['import foo'])
+
+    def test_syntax_errors_are_isolated_in_cells(self):
+        nb = nbformat.v4.new_notebook()
+        nb.cells = [
+            nbformat.v4.new_code_cell('import foo\n\nimport bar'),
+            nbformat.v4.new_code_cell('if\nimport baz'),
+            nbformat.v4.new_code_cell('!pip install qux\nimport qux'),
+        ]
+        with tempfile.TemporaryDirectory() as project:
+            fpath = os.path.join(project, 'nb.ipynb')
+            with open(fpath, 'w') as f:
+                nbformat.write(nb, f)
+            parsed = _parse_file(fpath)
+        self.assertEqual(
+            [(m.name, m.lineno) for m in parsed.modules],
+            [('foo', 1), ('bar', 3), ('qux', 7)],
+        )
+        self.assertEqual(len(parsed.errors), 1)
+        self.assertIn(':4 failed', parsed.errors[0])
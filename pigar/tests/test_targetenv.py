@@ -0,0 +1,100 @@
+import os
+import os.path
+import unittest
+import tempfile
+
+from ..dist import installed_distributions
+from ..targetenv import find_python_environment, site_packages_paths
+
+
+class TargetEnvironmentTests(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._root = self._tmpdir.name
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _write(self, path, content=''):
+        path = os.path.join(self._root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def _path(self, *parts):
+        return os.path.join(self._root, *parts)
+
+    def test_venv(self):
+        self._write(
+            'base/lib/python3.12/site-packages/base.pth', 'import os\n'
+        )
+        self._write(
+            'venv/pyvenv.cfg',
+            f'home = {self._path("base", "bin")}\n'
+            'include-system-site-packages = false\n'
+            'version = 3.12.1\n',
+        )
+        python = self._write('venv/bin/python')
+        self._write('venv/lib/python3.11/site-packages/old.txt')
+        self._write('venv/lib/python3.12/site-packages/foo.txt')
+        venv_site = self._path('venv', 'lib', 'python3.12', 'site-packages')
+        base_site = self._path('base', 'lib', 'python3.12', 'site-packages')
+        self.assertEqual(
+            find_python_environment(python), ([venv_site], (3, 12))
+        )
+
+        self._write(
+            'venv/pyvenv.cfg',
+            f'home = {self._path("base", "bin")}\n'
+            'include-system-site-packages = true\n'
+            'version_info = 3.12.1.final.0\n',
+        )
+        self.assertEqual(
+            find_python_environment(python),
+            ([venv_site, base_site], (3, 12)),
+        )
+
+    def test_installation(self):
+        python = self._write('prefix/bin/python3.13')
+        os.symlink(python, self._path('prefix', 'bin', 'python3'))
+        self._write('prefix/lib/python3.12/site-packages/a.txt')
+        self._write('prefix/lib/python3.13t/site-packages/b.txt')
+        self._write('prefix/lib/python3/dist-packages/c.txt')
+        self.assertEqual(
+            find_python_environment(self._path('prefix', 'bin', 'python3')),
+            (
+                [
+                    self._path('prefix', 'lib', 'python3.13t', 'site-packages'),
+                    self._path('prefix', 'lib', 'python3', 'dist-packages'),
+                ],
+                (3, 13),
+            ),
+        )
+
+    def test_site_packages_paths_with_pth_files(self):
+        site = self._path('site-packages')
+        os.makedirs(self._path('project', 'src'))
+        self._write(
+            'site-packages/a.pth',
+            '# comment\n\n../project/src\nimport sys\nmissing\n',
+        )
+        self._write('site-packages/b.pth', f'{self._path("project")}\n')
+        self.assertEqual(
+            site_packages_paths([site, site]),
+            [site, self._path('project', 'src'),
+             self._path('project')],
+        )
+
+    def test_installed_distributions_in_paths(self):
+        site = self._path('site-packages')
+        self._write(
+            'site-packages/foo-1.0.dist-info/METADATA',
+            'Metadata-Version: 2.1\nName: foo\nVersion: 1.0\n',
+        )
+        self._write('site-packages/foo-1.0.dist-info/RECORD', '')
+        dists = installed_distributions(paths=[site])
+        self.assertEqual(
+            [(d.name, d.version) for d in dists.values()], [('foo', '1.0')]
+        )
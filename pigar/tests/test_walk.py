@@ -0,0 +1,165 @@
+import os
+import os.path
+import unittest
+import tempfile
+
+from ..walk import IGNORE_FILES, GlobMatcher, IgnoreRules, walk_files
+
+
+class GlobMatcherTests(unittest.TestCase):
+
+    def test_match(self):
+        matcher = GlobMatcher(
+            [
+                '**/.git', '*venv*', '**/tests/data/*', 'build/', 'docs/*.py',
+                '/top.py', '/project/abs/**'
+            ],
+            root='/project',
+        )
+        for path, is_dir, expected in [
+            ('.git', True, True),
+            ('a/b/.git', True, True),
+            ('venv', True, True),
+            ('a/.venv', True, True),
+            ('pigar/tests/data/foo.py', False, True),
+            ('pigar/tests/data/foo/bar.py', False, False),
+            ('pigar/tests/foo.py', False, False),
+            ('build', True, True),
+            ('a/build', True, True),
+            ('build', False, False),
+            ('docs/foo.py', False, True),
+            ('docs/foo/bar.py', False, False),
+            ('a/docs/foo.py', False, False),
+            ('top.py', False, True),
+            ('a/top.py', False, False),
+            ('abs/foo/bar.py', False, True),
+            ('foo.py', False, False),
+        ]:
+            self.assertEqual(
+                matcher.match(path, is_dir), expected, (path, is_dir)
+            )
+
+
+class IgnoreRulesTests(unittest.TestCase):
+
+    def test_match(self):
+        rules = IgnoreRules(
+            [
+                '# comment\n', '\n', '*.py\n', '!keep.py\n', 'build/\n',
+                '/top\n', 'docs/**/gen_*.py\n', '\\#hash.py\n',
+                'space.py\\ \n', 'trailing.py  \n'
+            ]
+        )
+        for path, is_dir, expected in [
+            ('a.py', False, True),
+            ('a/b.py', False, True),
+            ('keep.py', False, False),
+            ('a/keep.py', False, False),
+            ('build', True, True),
+            ('build', False, None),
+            ('a/build', True, True),
+            ('top', True, True),
+            ('a/top', True, None),
+            ('docs/gen_a.py', False, True),
+            ('#hash.py', False, True),
+            ('space.py ', False, True),
+            ('trailing.py', False, True),
+            ('README', False, None),
+        ]:
+            self.assertEqual(
+                rules.match(path, is_dir), expected, (path, is_dir)
+            )
+
+
+class WalkFilesTests(unittest.TestCase):
+
+    def test_walk_files(self):
+        with tempfile.TemporaryDirectory() as root:
+            for path in [
+                'a.py', 'pkg/b.py', 'pkg/sub/c.py', 'venv/lib/d.py',
+                'pkg/__pycache__/b.pyc'
+            ]:
+                path = os.path.join(root, path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                open(path, 'w').close()
+            os.symlink(
+                os.path.join(root, 'pkg'), os.path.join(root, 'pkg', 'loop')
+            )
+
+            matcher = GlobMatcher(['*venv*', '**/__pycache__'], root=root)
+            files = [
+                os.path.relpath(f, root)
+                for f in walk_files(root, exclude=matcher, followlinks=False)
+            ]
+            self.assertEqual(
+                sorted(files), ['a.py', 'pkg/b.py', 'pkg/sub/c.py']
+            )
+
+            files = list(walk_files(root, exclude=matcher, followlinks=True))
+            self.assertIn(os.path.join(root, 'pkg', 'loop', 'b.py'), files)
+            self.assertEqual(len(files), len(set(files)))
+
+    def test_walk_files_with_ignore_files(self):
+        with tempfile.TemporaryDirectory() as repo:
+            os.makedirs(os.path.join(repo, '.git', 'info'))
+            root = os.path.join(repo, 'project')
+            files = {
+                '.git/info/exclude': 'excluded.py\n',
+                '.gitignore': 'generated/\n*.tmp.py\n',
+                'project/.gitignore': '/build\n*_pb2.py\n',
+                'project/.pigarignore': '!api_pb2.py\n',
+                'project/pkg/.gitignore': 'local.py\n!keep.tmp.py\n',
+                'project/a.py': '',
+                'project/excluded.py': '',
+                'project/x.tmp.py': '',
+                'project/build/b.py': '',
+                'project/generated/c.py': '',
+                'project/api_pb2.py': '',
+                'project/foo_pb2.py': '',
+                'project/pkg/local.py': '',
+                'project/pkg/keep.tmp.py': '',
+                'project/pkg/build/d.py': '',
+                'project/local.py': '',
+            }
+            for path, content in files.items():
+                path = os.path.join(repo, path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'w') as f:
+                    f.write(content)
+
+            files = [
+                os.path.relpath(f, root)
+                for f in walk_files(root, ignore_files=IGNORE_FILES)
+                if f.endswith('.py')
+            ]
+            self.assertEqual(
+                sorted(files), [
+                    'a.py', 'api_pb2.py', 'local.py', 'pkg/build/d.py',
+                    'pkg/keep.tmp.py'
+                ]
+            )
+            self.assertEqual(
+                len([f for f in walk_files(root) if f.endswith('.py')]), 11
+            )
+
+    def test_walk_files_at_git_root(self):
+        with tempfile.TemporaryDirectory() as repo:
+            os.makedirs(os.path.join(repo, '.git', 'info'))
+            files = {
+                '.git/info/exclude': '/build\n',
+                'a.py': '',
+                'build/b.py': '',
+                'pkg/build/c.py': '',
+            }
+            for path, content in files.items():
+                path = os.path.join(repo, path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'w') as f:
+                    f.write(content)
+
+            files = [
+                os.path.relpath(f, repo)
+                for f in walk_files(repo, ignore_files=IGNORE_FILES)
+                if f.endswith('.py')
+            ]
+            self.assertEqual(sorted(files), ['a.py', 'pkg/build/c.py'])
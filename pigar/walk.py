@@ -0,0 +1,369 @@
+import os
+import re
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from .log import logger
+
+
+def translate_glob(pattern: str) -> str:
+    """Translate a glob pattern to a regular expression.
+
+    `**` matches any number of directories, `*`, `?` and `[...]`
+    do not match the path separator `/`.
+    """
+    i, n = 0, len(pattern)
+    res: List[str] = []
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c == "*":
+            star_start = i - 1
+            while i < n and pattern[i] == "*":
+                i += 1
+            is_double_star = i - star_start >= 2
+            at_start = star_start == 0 or pattern[star_start - 1] == "/"
+            at_end = i == n or pattern[i] == "/"
+            if not (is_double_star and at_start and at_end):
+                res.append("[^/]*")
+            elif i == n:
+                res.append(".*")
+            else:
+                # `**/` matches zero or more directories.
+                res.append("(?:.*/)?")
+                i += 1
+        elif c == "?":
+            res.append("[^/]")
+        elif c == "[":
+            j = i
+            if j < n and pattern[j] == "!":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            while j < n and pattern[j] != "]":
+                j += 1
+            if j >= n:
+                res.append("\\[")
+            else:
+                stuff = pattern[i:j].replace("\\", "\\\\")
+                i = j + 1
+                if stuff.startswith("!"):
+                    stuff = "^/" + stuff[1:]
+                elif stuff.startswith("^"):
+                    stuff = "\\" + stuff
+                res.append(f"[{stuff}]")
+        elif c == "\\" and i < n:
+            res.append(re.escape(pattern[i]))
+            i += 1
+        else:
+            res.append(re.escape(c))
+    return "".join(res)
+
+
+def _translate_pattern(pattern: str) -> Tuple[str, bool]:
+    """Translate a pattern relative to the root, returns the regex and
+    whether it only matches directories.
+
+    Patterns without a slash match the names at any level, a leading slash
+    anchors the pattern to the root, a trailing slash only matches directories.
+    """
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    if "/" not in pattern:
+        return "(?:.*/)?" + translate_glob(pattern), dir_only
+    return translate_glob(pattern.lstrip("/")), dir_only
+
+
+class GlobMatcher(object):
+    """GlobMatcher matches paths relative to the root (separated by `/`)
+    against all patterns at once."""
+
+    def __init__(self, patterns: Iterable[str], root: str = ""):
+        root = root.rstrip(os.sep).replace(os.sep, "/") + "/"
+        any_regexes, dir_regexes = [], []
+        for pattern in patterns:
+            pattern = pattern.replace(os.sep, "/")
+            # Absolute patterns are accepted for backward compatibility.
+            if root != "/" and pattern.startswith(root):
+                pattern = "/" + pattern[len(root):]
+            elif pattern.startswith("./"):
+                pattern = pattern[2:]
+            if not pattern.strip("/"):
+                continue
+            regex, dir_only = _translate_pattern(pattern)
+            (dir_regexes if dir_only else any_regexes).append(regex)
+        self._regex = self._compile(any_regexes)
+        self._dir_regex = self._compile(any_regexes + dir_regexes)
+
+    @staticmethod
+    def _compile(regexes: List[str]) -> Optional["re.Pattern"]:
+        if not regexes:
+            return None
+        return re.compile("|".join(f"(?:{r})" for r in regexes), re.DOTALL)
+
+    def match(self, path: str, is_dir: bool = False) -> bool:
+        regex = self._dir_regex if is_dir else self._regex
+        return regex is not None and regex.fullmatch(path) is not None
+
+
+PIGAR_IGNORE_FILE = ".pigarignore"
+IGNORE_FILES = (".gitignore", PIGAR_IGNORE_FILE)
+
+
+class IgnoreRules(object):
+    """IgnoreRules are the rules of an ignore file in gitignore format,
+    paths are relative to the directory of the ignore file."""
+
+    def __init__(self, lines: Iterable[str]):
+        self._rules: List[Tuple["re.Pattern", bool, bool]] = []
+        regexes = []
+        for line in lines:
+            pattern = self._strip(line)
+            if not pattern or pattern.startswith("#"):
+                continue
+            negated = pattern.startswith("!")
+            if negated:
+                pattern = pattern[1:]
+            if not pattern.strip("/"):
+                continue
+            regex, dir_only = _translate_pattern(pattern)
+            self._rules.append((re.compile(regex, re.DOTALL), negated, dir_only))
+            regexes.append(regex)
+        self._any_regex = GlobMatcher._compile(regexes)
+
+    @staticmethod
+    def _strip(line: str) -> str:
+        line = line.rstrip("\r\n")
+        stripped = line.rstrip(" ")
+        # Trailing spaces are ignored unless they are escaped.
+        if stripped.endswith("\\") and len(stripped) < len(line):
+            stripped += " "
+        return stripped
+
+    @classmethod
+    def from_file(cls, path: str) -> Optional["IgnoreRules"]:
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                rules = cls(f)
+        except OSError as e:
+            logger.warning("read ignore file %s failed: %r", path, e)
+            return None
+        return rules if rules._rules else None
+
+    def match(self, path: str, is_dir: bool = False) -> Optional[bool]:
+        """Returns whether the path is ignored, or None if no rules match,
+        the last matching rule decides."""
+        if self._any_regex is None or self._any_regex.fullmatch(path) is None:
+            return None
+        for regex, negated, dir_only in reversed(self._rules):
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(path) is not None:
+                return not negated
+        return None
+
+
+class _ScopedIgnoreRules(NamedTuple):
+    rules: IgnoreRules
+    # Convert a path relative to the walking root to a path relative to
+    # the directory of the ignore file.
+    strip: int
+    prepend: str
+
+
+def _is_ignored(
+    scopes: Tuple[_ScopedIgnoreRules, ...], relpath: str, is_dir: bool
+) -> bool:
+    # The ignore files in deeper directories take precedence.
+    for scope in reversed(scopes):
+        ignored = scope.rules.match(scope.prepend + relpath[scope.strip:], is_dir)
+        if ignored is not None:
+            return ignored
+    return False
+
+
+def _parent_ignore_rules(
+    root: str, ignore_files: Iterable[str]
+) -> Tuple[_ScopedIgnoreRules, ...]:
+    """The rules from the directories between the root of the git work tree
+    and the walking root, the root itself is excluded."""
+    root = os.path.abspath(root)
+    parents = []
+    parent = root
+    while True:
+        if os.path.exists(os.path.join(parent, ".git")):
+            break
+        next_parent = os.path.dirname(parent)
+        if next_parent == parent:
+            return ()  # Not in a git work tree.
+        parent = next_parent
+        parents.append(parent)
+
+    scopes = []
+    git_dir = os.path.join(parent, ".git")
+    candidates = []
+    if os.path.isdir(git_dir):
+        candidates.append((parent, os.path.join(git_dir, "info", "exclude")))
+    for directory in reversed(parents):
+        for name in ignore_files:
+            candidates.append((directory, os.path.join(directory, name)))
+    for directory, path in candidates:
+        if not os.path.isfile(path):
+            continue
+        rules = IgnoreRules.from_file(path)
+        if rules is not None:
+            prefix = os.path.relpath(root, directory).replace(os.sep, "/") + "/"
+            if prefix == "./":
+                prefix = ""
+            scopes.append(_ScopedIgnoreRules(rules, 0, prefix))
+    return tuple(scopes)
+
+
+def walk_files(
+    root: str,
+    exclude: Optional[GlobMatcher] = None,
+    followlinks: bool = True,
+    ignore_files: Iterable[str] = (),
+) -> Iterator[str]:
+    """Walk the files under the root top-down in the same order as `os.walk`,
+    excluded directories are pruned before they are listed.
+
+    The ignore files (e.g. `.gitignore`) found in the walked directories and
+    their parent directories in the same git work tree are honored as well.
+    """
+    ignore_files = tuple(ignore_files)
+    match_seconds = 0.0
+    matched = 0
+    visited_links: Set[Tuple[int, int]] = set()
+    root_scopes = _parent_ignore_rules(root, ignore_files) if ignore_files else ()
+    stack: List[Tuple[str, str, Tuple[_ScopedIgnoreRules, ...]]] = [
+        (root, "", root_scopes)
+    ]
+    while stack:
+        dirpath, reldir, scopes = stack.pop()
+        try:
+            with os.scandir(dirpath) as it:
+                entries = list(it)
+        except OSError as e:
+            logger.warning("list directory %s failed: %r", dirpath, e)
+            continue
+
+        if ignore_files:
+            names = {entry.name: entry for entry in entries}
+            for name in ignore_files:
+                if name not in names:
+                    continue
+                rules = IgnoreRules.from_file(names[name].path)
+                if rules is not None:
+                    scopes += (_ScopedIgnoreRules(rules, len(reldir), ""),)
+
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            relpath = reldir + entry.name
+            if exclude is not None or scopes:
+                start = time.perf_counter()
+                excluded = (
+                    exclude is not None and exclude.match(relpath, is_dir)
+                ) or (scopes and _is_ignored(scopes, relpath, is_dir))
+                match_seconds += time.perf_counter() - start
+                matched += 1
+                if excluded:
+                    logger.debug("excluded or ignored: %s", entry.path)
+                    continue
+            if not is_dir:
+                yield entry.path
+            elif not entry.is_symlink():
+                subdirs.append((entry.path, relpath + "/", scopes))
+            elif followlinks:
+                try:
+                    st = os.stat(entry.path)
+                except OSError:
+                    continue
+                if (st.st_dev, st.st_ino) in visited_links:
+                    logger.debug("skip symbolic link loop: %s", entry.path)
+                    continue
+                visited_links.add((st.st_dev, st.st_ino))
+                subdirs.append((entry.path, relpath + "/", scopes))
+        stack.extend(reversed(subdirs))
+
+    logger.debug(
+        "matched %d paths against exclude patterns and ignore files in %.3fms",
+        matched,
+        match_seconds * 1000,
+    )
+
+
+class IgnoreFilesMatcher(object):
+    """IgnoreFilesMatcher checks whether the files listed in other ways (e.g.
+    from the git index) are skipped by `walk_files` for the ignore files, the
+    ignore files of each directory are read once."""
+
+    def __init__(self, root: str, ignore_files: Iterable[str]):
+        self._root = root
+        self._ignore_files = tuple(ignore_files)
+        # The rules for the entries of each directory, None if it is ignored.
+        self._dirs: Dict[str, Optional[Tuple[_ScopedIgnoreRules, ...]]] = {}
+
+    def _scopes(self, reldir: str) -> Optional[Tuple[_ScopedIgnoreRules, ...]]:
+        if reldir in self._dirs:
+            return self._dirs[reldir]
+        if not reldir:
+            scopes = _parent_ignore_rules(self._root, self._ignore_files)
+        else:
+            parent, _, _ = reldir.rpartition("/")
+            scopes = self._scopes(parent)
+            if scopes and _is_ignored(scopes, reldir, True):
+                scopes = None
+        if scopes is not None:
+            dirpath = os.path.join(self._root, *reldir.split("/"))
+            strip = len(reldir) + 1 if reldir else 0
+            for name in self._ignore_files:
+                path = os.path.join(dirpath, name)
+                if not os.path.isfile(path):
+                    continue
+                rules = IgnoreRules.from_file(path)
+                if rules is not None:
+                    scopes += (_ScopedIgnoreRules(rules, strip, ""),)
+        self._dirs[reldir] = scopes
+        return scopes
+
+    def match(self, relpath: str) -> bool:
+        """Whether the file is ignored, the path is relative to the root and
+        separated by `/`."""
+        reldir, _, _ = relpath.rpartition("/")
+        scopes = self._scopes(reldir)
+        return scopes is None or (bool(scopes) and _is_ignored(scopes, relpath, False))
+
+
+def is_walked(
+    root: str,
+    relpath: str,
+    exclude: Optional[GlobMatcher] = None,
+    ignore_files: Iterable[str] = (),
+) -> bool:
+    """Whether the file would be yielded by `walk_files`, the path is relative
+    to the root and separated by `/`, symbolic links are not resolved."""
+    ignore_files = tuple(ignore_files)
+    scopes = _parent_ignore_rules(root, ignore_files) if ignore_files else ()
+    parts = relpath.split("/")
+    dirpath, reldir = root, ""
+    for idx, name in enumerate(parts):
+        for ignore_file in ignore_files:
+            path = os.path.join(dirpath, ignore_file)
+            if not os.path.isfile(path):
+                continue
+            rules = IgnoreRules.from_file(path)
+            if rules is not None:
+                scopes += (_ScopedIgnoreRules(rules, len(reldir), ""),)
+        is_dir = idx < len(parts) - 1
+        path = reldir + name
+        if (exclude is not None and exclude.match(path, is_dir)) or (
+            scopes and _is_ignored(scopes, path, is_dir)
+        ):
+            return False
+        dirpath, reldir = os.path.join(dirpath, name), path + "/"
+    return True